@@ -0,0 +1,91 @@
+"""
+Compare saving the articles of a run one by one with the single transaction path.
+
+Run it from the root of the project:
+
+    python -m benchmarks.bulk_save --sizes 1000 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from loguru import logger
+
+from src.db.database import Database
+from src.domain.article import Article
+from src.services.article_service import ArticleService
+from src.services.category_service import CategoryService
+
+CATEGORIES = ["sport", "german politics", "international politics", "economy"]
+
+
+def generate_articles(size: int, prefix: str) -> list[Article]:
+    """
+    Return synthetic articles with unique titles
+    """
+    return [
+        Article(
+            title=f"{prefix} headline number {i}",
+            description=f"Description of the synthetic headline {i}",
+            category=CATEGORIES[i % len(CATEGORIES)],
+            english_translation=f"Translation of headline {i}",
+        )
+        for i in range(size)
+    ]
+
+
+def save_one_by_one(db: Database, articles: list[Article]) -> None:
+    """
+    Previous save path: one lookup per category and one commit per article
+    """
+    category_service = CategoryService(db)
+    article_service = ArticleService(db)
+    for article in articles:
+        category_id = category_service.save_category(article.category)
+        article_service.save_article(article, category_id, 1)
+
+
+def save_in_bulk(db: Database, articles: list[Article]) -> None:
+    """
+    Bulk save path: upsert of the categories and executemany in one transaction
+    """
+    with db.transaction():
+        category_ids = CategoryService(db).save_categories(
+            sorted(set(x.category for x in articles))
+        )
+        ArticleService(db).save_articles(articles, category_ids, 1)
+
+
+def measure(size: int) -> None:
+    """
+    Print the time of both save paths for the given number of articles
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        db = Database(os.path.join(folder, "benchmark.db"))
+
+        start = time.perf_counter()
+        save_one_by_one(db, generate_articles(size, "loop"))
+        loop_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        save_in_bulk(db, generate_articles(size, "bulk"))
+        bulk_seconds = time.perf_counter() - start
+
+        db.close()
+
+    print(
+        f"{size:>8} articles: one by one {loop_seconds:8.3f}s, "
+        f"bulk {bulk_seconds:8.3f}s, speedup x{loop_seconds / bulk_seconds:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    args = parser.parse_args()
+
+    logger.remove()
+    for benchmark_size in args.sizes:
+        measure(benchmark_size)
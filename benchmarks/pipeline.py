@@ -0,0 +1,432 @@
+"""
+Measure a complete run of the pipeline offline: the newspapers are pages served
+by a local HTTP server, and the AI and Telegram are local fake APIs. It
+reports the latency percentiles of every stage, the throughput, the peak memory
+and the size of the database, and compares them with a baseline.
+
+Run it from the root of the project:
+
+    python -m benchmarks.pipeline --newspapers 5 --headlines 100 --chats 10
+    python -m benchmarks.pipeline --newspaper-pages
+    python -m benchmarks.pipeline --newspaper-pages --browser
+    python -m benchmarks.pipeline --save-baseline
+
+`--newspaper-pages` scrapes the pages of benchmarks/pages with the real extraction
+specs of the newspapers of main, and `--browser` loads every page with Playwright
+instead of the static fast path (run `playwright install` first).
+
+The pages of benchmarks/pages are synthetic, not saved copies of the sites: they
+were written by a seeded script that combines subjects, verbs and objects in the
+language of every newspaper into headlines, and wraps them in the markup matched by
+its extraction spec (the headline classes of Nord Bayern, the `h1` links of 20
+Minutos) together with decoys the spec has to skip, a long navigation, an inline
+state script, teaser texts and images, so that every page has around 90 headlines
+and the size of a real front page. Save a real page under the same name, e.g.
+nord_bayern.html, to measure it instead.
+
+The timings depend on the machine, so the committed baseline is only an example:
+save the baseline of every scenario with `--save-baseline` on the machine where the
+benchmark is compared, before the change being measured.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import string
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+
+import main
+from src.ai.provider.cached import CachedAIModel
+from src.ai.provider.openai import OpenAIModel
+from src.db.database import Database
+from src.domain.headline_extraction import HeadlineExtractionSpec
+from src.domain.newspaper import Newspaper
+from src.services.broadcast_service import BroadcastService
+from src.services.category_service import CategoryService
+from src.services.concurrent_scraper_service import ConcurrentScraperService
+from src.services.newspaper_service import NewspaperService
+from src.services.outbox_service import OutboxService
+from src.telegram.bot import TelegramBot
+from src.testing.fakes import FakeOpenAIServer, FakeTelegramServer, NewspaperSiteServer
+from src.utils.rate_limiter import RateLimiter
+
+BASELINE_FILE = os.path.join("benchmarks", "baseline.json")
+# Synthetic front pages shaped like the newspapers of main, named after them
+PAGES_DIR = os.path.join("benchmarks", "pages")
+HEADLINE_XPATH = "//article/h2/a"
+# Metrics where a higher value is an improvement, the rest are costs
+HIGHER_IS_BETTER = {"articles_per_second"}
+
+
+def generate_words(size: int, seed: int) -> list[str]:
+    """
+    Return a vocabulary of random words
+    """
+    generator = random.Random(seed)
+    return [
+        "".join(generator.choices(string.ascii_lowercase, k=generator.randint(3, 10)))
+        for _ in range(size)
+    ]
+
+
+def generate_pages(
+    folder: str,
+    site_url: str,
+    newspapers: int,
+    headlines: int,
+    shared_ratio: float,
+    static_mode: bool = True,
+    seed: int = 0,
+) -> list[Newspaper]:
+    """
+    Write the front page of every newspaper. A part of the headlines are the same
+    stories in all the newspapers with a different wording.
+    """
+    generator = random.Random(seed)
+    words = generate_words(5000, seed)
+    shared_stories = [
+        generator.choices(words, k=generator.randint(8, 12))
+        for _ in range(int(headlines * shared_ratio))
+    ]
+
+    result = []
+    for number in range(newspapers):
+        page_headlines = [
+            " ".join(story + [generator.choice(words)]) for story in shared_stories
+        ]
+        page_headlines += [
+            " ".join(generator.choices(words, k=generator.randint(8, 12)))
+            for _ in range(headlines - len(page_headlines))
+        ]
+        generator.shuffle(page_headlines)
+
+        articles = "\n".join(
+            f'<article><h2><a href="/news/{number}/{i}">{x.capitalize()}</a></h2>'
+            f"<p>Teaser of the news {i}</p></article>"
+            for i, x in enumerate(page_headlines)
+        )
+        Path(folder, f"paper-{number}.html").write_text(
+            f"<html><head><title>Paper {number}</title></head>"
+            f"<body><header>Menu</header>{articles}</body></html>",
+            encoding="utf8",
+        )
+        result.append(
+            Newspaper(
+                name=f"Benchmark paper {number}",
+                url=f"{site_url}/paper-{number}.html",
+                extraction=HeadlineExtractionSpec(xpath=HEADLINE_XPATH),
+                static_mode=static_mode,
+                persist_storage_state=False,
+            )
+        )
+
+    return result
+
+
+def saved_pages(
+    folder: str, site_url: str, xpath: str, static_mode: bool = True
+) -> list[Newspaper]:
+    """
+    Newspapers of the pages saved in a folder
+    """
+    return [
+        Newspaper(
+            name=x.stem,
+            url=f"{site_url}/{x.name}",
+            extraction=HeadlineExtractionSpec(xpath=xpath),
+            static_mode=static_mode,
+            persist_storage_state=False,
+        )
+        for x in sorted(Path(folder).glob("*.html"))
+    ]
+
+
+def page_file_name(newspaper: Newspaper) -> str:
+    """
+    Name of the page of a newspaper, e.g. nord_bayern.html
+    """
+    return re.sub(r"[^a-z0-9]+", "_", newspaper.name.lower()).strip("_") + ".html"
+
+
+def newspaper_pages(site_url: str, static_mode: bool = True) -> list[Newspaper]:
+    """
+    Newspapers of main pointing to their pages in benchmarks/pages. The access
+    hooks are skipped, the pages have no consent dialog.
+    """
+    result = []
+    for newspaper in main.NEWSPAPERS:
+        file_name = page_file_name(newspaper)
+        if not os.path.exists(os.path.join(PAGES_DIR, file_name)):
+            logger.warning(f"{newspaper.name} has no page in {PAGES_DIR}")
+            continue
+
+        result.append(
+            newspaper.model_copy(
+                update={
+                    "url": f"{site_url}/{file_name}",
+                    "access_hook": None,
+                    "static_mode": static_mode and newspaper.extraction is not None,
+                    "persist_storage_state": False,
+                }
+            )
+        )
+
+    return result
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    """
+    Median, 95th percentile and maximum of the values
+    """
+    if len(values) == 0:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+
+    values = sorted(values)
+    return {
+        "p50": values[len(values) // 2],
+        "p95": values[min(int(len(values) * 0.95), len(values) - 1)],
+        "max": values[-1],
+    }
+
+
+def site_folder(args: argparse.Namespace, folder: str) -> str:
+    """
+    Folder with the pages served as the newspapers
+    """
+    if args.newspaper_pages:
+        return PAGES_DIR
+    return args.html_dir or folder
+
+
+def scenario_name(args: argparse.Namespace) -> str:
+    """
+    Key of the scenario in the baseline file, e.g. 5x100x10 for 5 generated
+    newspapers of 100 headlines sent to 10 chats
+    """
+    scenario = f"{args.newspapers}x{args.headlines}x{args.chats}"
+    if args.newspaper_pages:
+        scenario = f"newspapers_x{args.chats}"
+    elif args.html_dir is not None:
+        scenario = f"{Path(args.html_dir).name}x{args.chats}"
+    if args.browser:
+        scenario += "_browser"
+    return scenario
+
+
+def run(args: argparse.Namespace, folder: str) -> dict[str, float]:
+    """
+    Run the newspapers through the stages of main and return the metrics
+    """
+    os.environ["TELEGRAM_BOT_API_KEY"] = "1:benchmark"
+    os.environ["TELEGRAM_USER_CHAT_ID"] = ",".join(
+        str(100 + x) for x in range(args.chats)
+    )
+    os.environ["MAX_NEWS_PER_NEWSPAPER"] = str(args.max_news)
+    os.environ.pop("FILTER_CATEGORIES", None)
+
+    with (
+        NewspaperSiteServer(site_folder(args, folder)) as site,
+        FakeOpenAIServer(args.ai_first_token_seconds, args.ai_tokens_per_second) as ai,
+        FakeTelegramServer(args.telegram_latency_seconds) as telegram,
+    ):
+        static_mode = not args.browser
+        if args.newspaper_pages:
+            newspapers = newspaper_pages(site.url, static_mode)
+        elif args.html_dir is not None:
+            newspapers = saved_pages(args.html_dir, site.url, args.xpath, static_mode)
+        else:
+            newspapers = generate_pages(
+                folder,
+                site.url,
+                args.newspapers,
+                args.headlines,
+                args.shared_ratio,
+                static_mode,
+            )
+
+        database_name = os.path.join(folder, "news.db")
+        main.METRICS_FILE = os.path.join(folder, "metrics.prom")
+        main.RUN_SUMMARY_FILE = os.path.join(folder, "run_summary.json")
+        model = CachedAIModel(
+            OpenAIModel(api_key="benchmark", base_url=ai.url + "/v1"),
+            os.path.join(folder, "ai_cache.db"),
+        )
+        bot = TelegramBot(
+            api_url=telegram.api_url,
+            messages_per_second=args.messages_per_second,
+            messages_per_chat_per_second=args.messages_per_chat_per_second,
+        )
+        db = Database(database_name)
+        outbox_service = OutboxService(db, bot)
+        broadcast_service = BroadcastService(bot, outbox_service=outbox_service)
+        NewspaperService(db).warm_cache()
+        CategoryService(db).warm_cache()
+        scraper_service = ConcurrentScraperService(
+            max_concurrency=main.MAX_CONCURRENT_SCRAPERS,
+            timeout_seconds=main.SCRAPE_TIMEOUT_SECONDS,
+            storage_state_dir=None,
+        )
+
+        start = time.perf_counter()
+        try:
+            outbox_service.start()
+            stats = main.run_newspapers(
+                db,
+                model,
+                RateLimiter(main.AI_REQUESTS_PER_MINUTE, main.AI_TOKENS_PER_MINUTE),
+                broadcast_service,
+                scraper_service,
+                newspapers,
+            )
+            pipeline_seconds = time.perf_counter() - start
+            outbox_service.stop(drain=True)
+            total_seconds = time.perf_counter() - start
+            with db.get_connection() as conn:
+                saved_articles = conn.execute("SELECT COUNT(*) FROM news").fetchone()[0]
+        finally:
+            scraper_service.close()
+            db.close()
+            model.close()
+
+        telegram_stats = bot.get_stats()
+        delivered = sum(len(x) for x in telegram.messages.values())
+        ai_requests = ai.requests
+
+    database_size = sum(
+        os.path.getsize(x)
+        for x in (database_name, database_name + "-wal")
+        if os.path.exists(x)
+    )
+    metrics = {
+        "total_seconds": total_seconds,
+        "pipeline_seconds": pipeline_seconds,
+        "delivery_seconds": total_seconds - pipeline_seconds,
+        "articles_per_second": saved_articles / total_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "db_size_mb": database_size / 1024 / 1024,
+        "saved_articles": saved_articles,
+        "ai_requests": ai_requests,
+        "telegram_messages": delivered,
+        "telegram_failed": telegram_stats["failed"],
+        "telegram_send_p50_seconds": telegram_stats.get("latency_p50_seconds", 0.0),
+        "telegram_send_p95_seconds": telegram_stats.get("latency_p95_seconds", 0.0),
+    }
+    for name, stage_stats in stats.items():
+        for percentile, value in percentiles(stage_stats.item_seconds).items():
+            metrics[f"{name}_{percentile}_seconds"] = value
+        metrics[f"{name}_errors"] = stage_stats.errors
+
+    return metrics
+
+
+def compare(
+    metrics: dict[str, float], baseline: dict[str, float], tolerance: float
+) -> list[str]:
+    """
+    Print the metrics next to the baseline and return the ones that regressed more
+    than the tolerance
+    """
+    regressions = []
+    for name, value in metrics.items():
+        previous = baseline.get(name)
+        line = f"{name:<32} {value:>12.3f}"
+        if previous is not None:
+            change = (value - previous) / previous if previous else 0.0
+            line += f" {previous:>12.3f} {change:>+8.1%}"
+            worse = -change if name in HIGHER_IS_BETTER else change
+            # Tiny durations are dominated by noise
+            if worse > tolerance and abs(value - previous) > 0.01:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--newspapers", type=int, default=5)
+    parser.add_argument("--headlines", type=int, default=100)
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument(
+        "--shared-ratio",
+        type=float,
+        default=0.2,
+        help="part of the headlines that every newspaper reports",
+    )
+    parser.add_argument(
+        "--html-dir", help="folder with saved front pages instead of generated ones"
+    )
+    parser.add_argument("--xpath", default=HEADLINE_XPATH)
+    parser.add_argument(
+        "--newspaper-pages",
+        action="store_true",
+        help=f"newspapers of main with their saved pages in {PAGES_DIR}",
+    )
+    parser.add_argument(
+        "--browser",
+        action="store_true",
+        help="load the pages with the browser instead of the static fast path",
+    )
+    parser.add_argument(
+        "--max-news",
+        type=int,
+        default=10000,
+        help="headlines of a newspaper that are classified",
+    )
+    parser.add_argument("--ai-first-token-seconds", type=float, default=0.3)
+    parser.add_argument("--ai-tokens-per-second", type=float, default=500)
+    parser.add_argument("--telegram-latency-seconds", type=float, default=0.02)
+    # The real limits of Telegram would make the benchmark measure the waits
+    parser.add_argument("--messages-per-second", type=float, default=1000)
+    parser.add_argument("--messages-per-chat-per-second", type=float, default=100)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store the metrics as the baseline of the scenario",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="relative change of a metric that is reported as a regression",
+    )
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    scenario = scenario_name(args)
+
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        result = run(args, temporary_folder)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf8") as baseline_file:
+            baselines = json.load(baseline_file)
+
+    print(f"Scenario {scenario}")
+    if args.baseline == BASELINE_FILE and not args.save_baseline:
+        print("The baseline is only comparable if it was saved on this machine")
+    print(f"{'metric':<32} {'value':>12} {'baseline':>12} {'change':>8}")
+    regressed = compare(result, baselines.get(scenario, {}), args.tolerance)
+
+    if args.save_baseline:
+        baselines[scenario] = {k: round(v, 4) for k, v in result.items()}
+        with open(args.baseline, "w", encoding="utf8") as baseline_file:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+        print(f"Baseline of {scenario} saved in {args.baseline}")
+    elif len(regressed) > 0:
+        print(f"{len(regressed)} metrics regressed: {', '.join(regressed)}")
+        sys.exit(1)
@@ -4,6 +4,13 @@
 # to be able to source env variables with spaces
 printenv | sed 's/^\([^=]*\)=\(.*\)$/export \1="\2"/' > /etc/environment
 
+# The daemon keeps the browser and the connections warm between runs and
+# schedules the newspapers itself
+if [ "${RUN_MODE}" = "daemon" ]; then
+    cd /app
+    exec /usr/local/bin/python /app/main.py --daemon
+fi
+
 # Set cron
 echo "${CRON_PATTERN} /bin/bash -c 'source /etc/environment && cd /app && /usr/local/bin/python /app/main.py' > /proc/1/fd/1 2>/proc/1/fd/2" > /etc/cron.d/news-summarizer
 chmod 0644 /etc/cron.d/news-summarizer
@@ -2,33 +2,72 @@
 Main module to execute this project
 """
 
+import argparse
+import json
 import os
+import sys
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Iterator
 
 from dotenv import load_dotenv
 from loguru import logger
 
+from src.ai.batcher import TokenBudgetBatcher
 from src.ai.provider.base import AIModelProtocol
+from src.ai.provider.cached import CachedAIModel
 from src.ai.provider.openai import OpenAIModel
 from src.db.database import Database
 from src.domain.news import Article
 from src.domain.newspaper import Newspaper
+from src.domain.story_cluster import ClusteredHeadline, StoryCluster
 from src.scraper.custom.nord_bayern import (
+    NORD_BAYERN_HEADLINES,
     accept_nord_bayern_cookies,
-    extract_nord_bayern_headlines,
-)
-from src.scraper.custom.twenty_minutes import (
-    extract_20_minutes_headlines,
 )
+from src.scraper.custom.twenty_minutes import TWENTY_MINUTES_HEADLINES
 from src.services.ai_service import AiService
 from src.services.article_service import ArticleService
 from src.services.broadcast_service import BroadcastService
 from src.services.category_service import CategoryService
+from src.services.clustering_service import ClusteringService
+from src.services.concurrent_scraper_service import ConcurrentScraperService
 from src.services.newspaper_service import NewspaperService
-from src.services.scraper_service import ScraperService
+from src.services.outbox_service import OutboxService
+from src.services.scheduler_service import SchedulerService
 from src.telegram.bot import TelegramBot
+from src.utils.metrics import metrics
+from src.utils.pipeline import Pipeline, Stage, StageStats
+from src.utils.process_lock import LockHeldError, process_lock
+from src.utils.rate_limiter import RateLimiter
 
 HEADED_BROWSER = False
-BATCH_SIZE = 10
+# Number of navigations and JS heap size (MB) after which a browser page is replaced
+MAX_NAVIGATIONS_PER_PAGE = 20
+MAX_PAGE_MEMORY_MB = 512
+# Number of newspapers scraped at the same time and seconds a single site may take
+MAX_CONCURRENT_SCRAPERS = 2
+SCRAPE_TIMEOUT_SECONDS = 60
+# Abort images, fonts, media and ad/tracker requests while scraping
+BLOCK_RESOURCES = True
+# Folder where cookies and local storage of every newspaper are kept between runs
+STORAGE_STATE_DIR = os.path.join("database", "storage_state")
+# Tokens (input and expected output) and maximum number of news of an AI batch
+AI_BATCH_TOKEN_BUDGET = 4000
+AI_BATCH_MAX_OUTPUT_TOKENS = 3000
+AI_BATCH_MAX_SIZE = 40
+# The AI answers with the index of every headline instead of repeating it
+AI_COMPACT_OUTPUT = True
+# Read the AI responses while they are generated, so that every article is available
+# as soon as it is complete instead of after the whole batch
+AI_STREAM_OUTPUT = True
+# Batches sent to the AI at the same time and limits of the provider quota
+AI_MAX_CONCURRENCY = 4
+AI_REQUESTS_PER_MINUTE = 20
+AI_TOKENS_PER_MINUTE = 200000
 # Skip the data extraction from the frontend
 MOCK_EXTRACT_NEWS = False
 # Return a mocked object of the AI instead of wasting credit
@@ -37,137 +76,587 @@ MOCK_AI_RESPONSE = False
 DRY_RUN_BROADCAST_MESSAGES = False
 # Name of the sqlite file where the database will be saved
 DATABASE_NAME = os.path.join("database", "news.db")
+# Sqlite file where the responses of the AI are cached, None disables the cache
+AI_CACHE_NAME: str | None = os.path.join("database", "ai_cache.db")
+AI_CACHE_TTL_SECONDS = 7 * 24 * 3600
+AI_CACHE_MAX_SIZE_MB = 50
+# Only compare the scraped news with the ones of the same newspaper
+DEDUPLICATE_PER_NEWSPAPER = False
+# Similarity (0 to 1) from which two headlines are considered the same article, None
+# disables the near duplicate filter
+NEAR_DUPLICATE_MIN_SIMILARITY = 0.8
+# Cosine similarity from which headlines of different newspapers are the same story,
+# only one of them is classified. None disables the grouping of stories
+STORY_CLUSTER_MIN_SIMILARITY: float | None = 0.5
+# Failed deliveries of a message before it is given up, and wait after the first
+# failure, doubled after every following one
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BASE_BACKOFF_SECONDS = 30
+# Time the outbox is delivered before exiting, below the stop_grace_period of
+# docker-compose.yaml. The messages left are delivered on the next start
+OUTBOX_DRAIN_TIMEOUT_SECONDS = 30
+# Newspapers waiting between two stages of the pipeline before the previous stage
+# is blocked
+PIPELINE_QUEUE_SIZE = 4
+# Schedule of the newspapers in daemon mode without their own one when CRON_PATTERN
+# is not set
+DAEMON_INTERVAL_SECONDS = 3600
+# File updated by the daemon to report its state, and age after which the health
+# check considers it stuck. It has to be longer than a run
+HEALTH_FILE = os.path.join("database", "health.json")
+HEALTH_MAX_AGE_SECONDS = 900
+# File locked while running, so that two runs never overlap
+RUN_LOCK_FILE = os.path.join("database", "run.lock")
+# Metrics of the process in the Prometheus text format and summary of the last run,
+# None disables the file
+METRICS_FILE: str | None = os.path.join("database", "metrics.prom")
+RUN_SUMMARY_FILE: str | None = os.path.join("database", "run_summary.json")
 NEWSPAPERS = [
     Newspaper(
         name="Nord Bayern",
         url="https://www.nordbayern.de/",
         access_hook=accept_nord_bayern_cookies,
-        extract_data_hook=extract_nord_bayern_headlines,
+        extraction=NORD_BAYERN_HEADLINES,
     ),
     Newspaper(
         name="20 Minutos",
         url="https://20minutos.es/",
         access_hook=None,
-        extract_data_hook=extract_20_minutes_headlines,
+        extraction=TWENTY_MINUTES_HEADLINES,
+        static_mode=True,
     ),
 ]
 
 
-def extract_news(newspaper: Newspaper) -> list[str] | None:
+@dataclass
+class NewsBatch:
     """
-    Extract the news from the newspaper website
+    News of a newspaper moving through the stages of the pipeline
     """
-    scraper_service = ScraperService(
-        headed=HEADED_BROWSER, mock_extract_news=MOCK_EXTRACT_NEWS
-    )
-    logger.info(f"Extracting data from: {newspaper.name}")
-
-    scraper_service.access_page(newspaper.url)
-
-    if newspaper.access_hook is not None:
-        scraper_service.execute_custom_function(newspaper.access_hook)
-
-    text = scraper_service.execute_custom_function_returning_value(
-        newspaper.extract_data_hook
-    )
-
-    scraper_service.close()
-
-    if text is None or text == "" or (isinstance(text, list) and len(text) == 0):
-        return None
 
-    logger.debug(f"News found in {newspaper.url}:\n{text}")
-
-    return text
-
-
-def classify_news(model: AIModelProtocol, text: list[str] | str) -> list[Article]:
+    newspaper: Newspaper
+    headlines: list[str] = field(default_factory=list)
+    # Story of every headline, in the same order
+    stories: list[StoryCluster] = field(default_factory=list)
+    articles: list[Article] = field(default_factory=list)
+    # Articles of stories classified and broadcast with a previous newspaper
+    linked_articles: list[Article] = field(default_factory=list)
+    # Whether it is the last batch of the newspaper
+    last: bool = True
+
+
+def extract_news(
+    scraper_service: ConcurrentScraperService,
+    newspapers: list[Newspaper],
+    stop_event: threading.Event | None = None,
+) -> Iterator[NewsBatch]:
+    """
+    Extract the news from all the newspaper websites at the same time, yielding
+    the newspapers in the order of the list: a newspaper scraped early waits for
+    the previous ones. No more newspapers are yielded once the stop event is set,
+    and the ones being scraped are not waited for.
+    """
+    positions = {id(x): i for i, x in enumerate(newspapers)}
+    scraped: dict[int, tuple[Newspaper, list[str] | None]] = {}
+    next_position = 0
+    with closing(scraper_service.scrape_iter(newspapers, stop_event)) as results:
+        for newspaper, headlines in results:
+            if stop_event is not None and stop_event.is_set():
+                logger.info("Stop requested, the remaining newspapers are skipped")
+                return
+
+            scraped[positions[id(newspaper)]] = (newspaper, headlines)
+            while next_position in scraped:
+                newspaper, headlines = scraped.pop(next_position)
+                next_position += 1
+                if headlines is not None:
+                    yield NewsBatch(newspaper, headlines)
+
+
+def classify_news(
+    model: AIModelProtocol,
+    rate_limiter: RateLimiter,
+    batcher: TokenBudgetBatcher,
+    newspaper: Newspaper,
+    text: list[str] | str,
+) -> Iterator[list[Article]]:
     """
-    Use AI to classify the news
+    Use AI to classify the news of the newspaper, yielding the articles of every
+    batch
     """
     logger.info("Starting AI analysis on the extracted text...")
 
-    news_ai = AiService(model, batch_size=BATCH_SIZE, mock_response=MOCK_AI_RESPONSE)
-    news_ai.classify_news(text)
-    news_ai.filter_news_by_category()
+    news_ai = AiService(
+        model,
+        mock_response=MOCK_AI_RESPONSE,
+        max_concurrency=AI_MAX_CONCURRENCY,
+        rate_limiter=rate_limiter,
+        batcher=batcher,
+        compact_output=AI_COMPACT_OUTPUT,
+        stream_output=AI_STREAM_OUTPUT,
+        metric_labels={"newspaper": newspaper.name},
+    )
+    total = 0
+    for articles in news_ai.classify_news_stream(text):
+        articles = news_ai.filter_articles_by_category(articles)
+        total += len(articles)
+        yield articles
 
-    logger.debug(f"A total of {len(news_ai.news)} were found.")
+    logger.debug(f"A total of {total} were found.")
     logger.info("AI analysis finished.")
 
-    return news_ai.news
-
 
-def save_data_in_db(db: Database, newspaper: Newspaper, news: list[Article]) -> None:
+def save_data_in_db(db: Database, newspaper: Newspaper, news: list[Article]) -> int:
     """
     Save the data in the database so that further request can filter the news that have
-    already been processed by the AI
+    already been processed by the AI. Return the id of the newspaper.
     """
-
     newspaper_service = NewspaperService(db)
-    newspaper_id = newspaper_service.save_newspaper(newspaper)
-
-    categories = set([x.category.lower() for x in news])
-
     category_service = CategoryService(db)
     article_service = ArticleService(db)
-    for category in sorted(categories):
-        category_id = category_service.save_category(category)
-        for article in sorted(
-            filter(lambda x: x.category == category, news), key=lambda x: x.title
-        ):
-            article_service.save_article(article, category_id, newspaper_id)
+
+    with db.transaction():
+        newspaper_id = newspaper_service.save_newspaper(newspaper)
+        category_ids = category_service.save_categories(
+            sorted(set([x.category.lower() for x in news]))
+        )
+        article_service.save_articles(
+            sorted(news, key=lambda x: (x.category.lower(), x.title)),
+            category_ids,
+            newspaper_id,
+        )
+
+    return newspaper_id
 
 
-def filter_existing_news(db: Database, news: list[str]) -> list[str]:
+def filter_existing_news(
+    db: Database, newspaper: Newspaper, news: list[str]
+) -> list[str]:
     """
     Filter the news that are already stored in the database
     """
     article_service = ArticleService(db)
 
-    articles: list[str] = []
-    for article in news:
-        if article_service.exists_article(article):
-            continue
-        articles.append(article)
+    with metrics.span("dedup", newspaper=newspaper.name):
+        newspaper_id = None
+        if DEDUPLICATE_PER_NEWSPAPER:
+            newspaper_id = NewspaperService(db).save_newspaper(newspaper)
+
+        articles = article_service.filter_new_articles(news, newspaper_id)
+        if NEAR_DUPLICATE_MIN_SIMILARITY is not None:
+            articles = article_service.filter_near_duplicates(
+                articles, NEAR_DUPLICATE_MIN_SIMILARITY, newspaper_id
+            )
+        articles = article_service.filter_article_limit(articles)
 
-    articles = article_service.filter_article_limit(articles)
+    metrics.increment("headlines_scraped", len(news), newspaper=newspaper.name)
+    metrics.increment("headlines_new", len(articles), newspaper=newspaper.name)
 
     logger.debug(f"A total of {len(articles)} new articles were found")
 
     return articles
 
 
-def main():
+def main(daemon: bool = False):
+    """
+    Execute main functionality of this project. In daemon mode the process keeps
+    the model, the database, the browser and the Telegram sessions warm and runs
+    the newspapers on their schedule until SIGTERM.
+    """
+    # Nothing is opened before the lock is held, so that a run blocked by another
+    # process neither migrates the database nor delivers its messages
+    try:
+        with process_lock(RUN_LOCK_FILE):
+            run_with_resources(daemon)
+    except LockHeldError:
+        # e.g. a run started by cron while the daemon or a slow run is working
+        logger.warning("Another run is in progress, this one is skipped")
+        return
+
+    print("Finished")
+
+
+def run_with_resources(daemon: bool) -> None:
     """
-    Execute main functionality of this project
+    Open the model, the Telegram bot and the database, run the newspapers and
+    close them
     """
-    model = OpenAIModel(api_key=os.environ.get("OPENAI_API_KEY", ""))
+    model: AIModelProtocol = OpenAIModel(
+        api_key=os.environ.get("OPENAI_API_KEY", ""),
+        base_url=os.environ.get("OPENAI_BASE_URL") or None,
+    )
+    if AI_CACHE_NAME is not None:
+        model = CachedAIModel(
+            model,
+            AI_CACHE_NAME,
+            ttl_seconds=AI_CACHE_TTL_SECONDS,
+            max_size_mb=AI_CACHE_MAX_SIZE_MB,
+        )
 
     bot = TelegramBot(dry_run=DRY_RUN_BROADCAST_MESSAGES)
-    broadcast_service = BroadcastService(bot)
-    db = Database(DATABASE_NAME)
+    try:
+        db = Database(DATABASE_NAME)
+        try:
+            run_with_database(db, model, bot, daemon)
+        finally:
+            db.close()
+    finally:
+        logger.info(f"Telegram: {bot.get_stats()}")
+        if isinstance(model, CachedAIModel):
+            logger.info(f"AI cache: {model.stats()}")
+            model.close()
+
+
+def run_with_database(
+    db: Database, model: AIModelProtocol, bot: TelegramBot, daemon: bool
+) -> None:
+    """
+    Start the outbox worker and the scrapers, run the newspapers once or on their
+    schedule, and stop what was started
+    """
+    outbox_service = OutboxService(
+        db,
+        bot,
+        max_attempts=OUTBOX_MAX_ATTEMPTS,
+        base_backoff_seconds=OUTBOX_BASE_BACKOFF_SECONDS,
+    )
+    broadcast_service = BroadcastService(bot, outbox_service=outbox_service)
+    NewspaperService(db).warm_cache()
+    CategoryService(db).warm_cache()
+
+    # Messages left by a previous run are delivered while scraping
+    outbox_service.start()
+    try:
+        scraper_service = ConcurrentScraperService(
+            max_concurrency=MAX_CONCURRENT_SCRAPERS,
+            timeout_seconds=SCRAPE_TIMEOUT_SECONDS,
+            headed=HEADED_BROWSER,
+            max_navigations_per_page=MAX_NAVIGATIONS_PER_PAGE,
+            max_page_memory_mb=MAX_PAGE_MEMORY_MB,
+            mock_extract_news=MOCK_EXTRACT_NEWS,
+            block_resources=BLOCK_RESOURCES,
+            storage_state_dir=STORAGE_STATE_DIR,
+        )
+        try:
+            # Shared by all the runs and newspapers so that the quota of the
+            # provider is respected between runs that follow each other
+            rate_limiter = RateLimiter(AI_REQUESTS_PER_MINUTE, AI_TOKENS_PER_MINUTE)
+            run = partial(
+                run_newspapers,
+                db,
+                model,
+                rate_limiter,
+                broadcast_service,
+                scraper_service,
+            )
+            if daemon:
+                SchedulerService(
+                    NEWSPAPERS,
+                    run,
+                    default_interval_seconds=DAEMON_INTERVAL_SECONDS,
+                    default_cron=os.environ.get("CRON_PATTERN") or None,
+                    health_file=HEALTH_FILE,
+                ).run_forever()
+            else:
+                run(NEWSPAPERS)
+        finally:
+            scraper_service.close()
+    finally:
+        try:
+            outbox_service.stop(
+                drain=True, drain_timeout_seconds=OUTBOX_DRAIN_TIMEOUT_SECONDS
+            )
+        finally:
+            # Include the messages delivered after the last run
+            export_metrics()
+
+
+def run_newspapers(
+    db: Database,
+    model: AIModelProtocol,
+    rate_limiter: RateLimiter,
+    broadcast_service: BroadcastService,
+    scraper_service: ConcurrentScraperService,
+    newspapers: list[Newspaper],
+    stop_event: threading.Event | None = None,
+) -> dict[str, StageStats]:
+    """
+    Scrape the newspapers concurrently and process their news in a pipeline, so
+    that a newspaper is classified while the next ones are scraped. Setting the
+    stop event finishes the newspapers already scraped and skips the rest. Return
+    the statistics of every stage, which are exported with the metrics of the run.
+
+    The result does not depend on which site loads first: the newspapers are
+    grouped in stories in the order of the list, so a story is classified and
+    announced with the first newspaper of the list that reports it. Every
+    newspaper is saved and announced as soon as its last batch is classified.
+    """
+    metrics.start_run()
+    batcher = TokenBudgetBatcher(
+        max_batch_tokens=AI_BATCH_TOKEN_BUDGET,
+        max_output_tokens=AI_BATCH_MAX_OUTPUT_TOKENS,
+        max_batch_size=AI_BATCH_MAX_SIZE,
+    )
+    clustering_service = None
+    if STORY_CLUSTER_MIN_SIMILARITY is not None:
+        clustering_service = ClusteringService(STORY_CLUSTER_MIN_SIMILARITY)
+    classified: dict[tuple[str, str], Article] = {}
+    pending_news: dict[str, NewsBatch] = {}
+
+    pipeline = Pipeline(
+        [
+            Stage("prepare", partial(prepare_news, db, clustering_service)),
+            Stage(
+                "classify",
+                partial(classify_stories, model, rate_limiter, batcher, classified),
+            ),
+            Stage(
+                "persist",
+                partial(
+                    persist_news,
+                    db,
+                    broadcast_service,
+                    clustering_service,
+                    pending_news,
+                ),
+                finish=partial(
+                    save_pending_news,
+                    db,
+                    broadcast_service,
+                    clustering_service,
+                    pending_news,
+                ),
+            ),
+        ],
+        queue_size=PIPELINE_QUEUE_SIZE,
+        source_name="scrape",
+    )
+    stats = pipeline.run(extract_news(scraper_service, newspapers, stop_event))
+
+    metrics.annotate_run(
+        newspapers=[x.name for x in newspapers],
+        stages={
+            name: {
+                "items": x.items,
+                "errors": x.errors,
+                "busy_seconds": round(x.busy_seconds, 6),
+                "idle_seconds": round(x.idle_seconds, 6),
+                "blocked_seconds": round(x.blocked_seconds, 6),
+            }
+            for name, x in stats.items()
+        },
+    )
+    export_metrics()
 
-    for newspaper in NEWSPAPERS:
+    return stats
 
-        raw_news = extract_news(newspaper)
 
-        if raw_news is None:
+def prepare_news(
+    db: Database, clustering_service: ClusteringService | None, batch: NewsBatch
+) -> list[NewsBatch]:
+    """
+    Keep the new headlines of the newspaper and find their stories
+    """
+    newspaper = batch.newspaper
+    headlines = filter_existing_news(db, newspaper, batch.headlines)
+
+    if clustering_service is None:
+        stories = [
+            StoryCluster(
+                headlines=[ClusteredHeadline(newspaper=newspaper.name, title=x)]
+            )
+            for x in headlines
+        ]
+    else:
+        stories = clustering_service.add(newspaper.name, headlines)
+
+    return [NewsBatch(newspaper, headlines, stories)]
+
+
+def classify_stories(
+    model: AIModelProtocol,
+    rate_limiter: RateLimiter,
+    batcher: TokenBudgetBatcher,
+    classified: dict[tuple[str, str], Article],
+    batch: NewsBatch,
+) -> Iterator[NewsBatch]:
+    """
+    Classify the stories that the newspaper reports first and reuse the
+    classification of the stories of previous newspapers
+    """
+    name = batch.newspaper.name
+    headlines = [
+        title
+        for title, story in zip(batch.headlines, batch.stories)
+        if story.representative.newspaper == name
+    ]
+
+    # The closing batch is always produced, so that the articles classified before
+    # an error are still saved
+    if len(headlines) > 0:
+        try:
+            for articles in classify_news(
+                model, rate_limiter, batcher, batch.newspaper, headlines
+            ):
+                classified.update(((name, x.title), x) for x in articles)
+                yield NewsBatch(
+                    batch.newspaper,
+                    stories=batch.stories,
+                    articles=articles,
+                    last=False,
+                )
+        except Exception as e:
+            logger.exception(
+                f"The classification of {name} failed, only the articles already "
+                f"classified are saved: {e}"
+            )
+            metrics.increment("classify_failures", newspaper=name)
+
+    linked_articles = []
+    for title, story in zip(batch.headlines, batch.stories):
+        representative = story.representative
+        if representative.newspaper == name:
             continue
+        article = classified.get((representative.newspaper, representative.title))
+        if article is not None:
+            linked_articles.append(article.model_copy(update={"title": title}))
+
+    yield NewsBatch(
+        batch.newspaper, stories=batch.stories, linked_articles=linked_articles
+    )
+
 
-        raw_news = filter_existing_news(db, raw_news)
+def persist_news(
+    db: Database,
+    broadcast_service: BroadcastService,
+    clustering_service: ClusteringService | None,
+    pending_news: dict[str, NewsBatch],
+    batch: NewsBatch,
+) -> None:
+    """
+    Collect the batches of a newspaper and save it once the last one is
+    classified. A newspaper that could not be saved stays pending and is tried
+    again when the stage finishes.
+    """
+    name = batch.newspaper.name
+    news = pending_news.setdefault(
+        name, NewsBatch(batch.newspaper, stories=batch.stories)
+    )
+    news.articles.extend(batch.articles)
+    news.linked_articles.extend(batch.linked_articles)
+    if not batch.last:
+        return None
 
-        news = classify_news(model, raw_news)
+    try:
+        save_news(db, broadcast_service, clustering_service, news)
+    except Exception as e:
+        logger.exception(f"The articles of {name} could not be saved: {e}")
+        metrics.increment("save_failures", newspaper=name)
+        return None
+    del pending_news[name]
 
-        if news is None:
-            logger.info("No news found on the ai analysis")
+
+def save_pending_news(
+    db: Database,
+    broadcast_service: BroadcastService,
+    clustering_service: ClusteringService | None,
+    pending_news: dict[str, NewsBatch],
+) -> None:
+    """
+    Save the newspapers that are still pending at the end of the run: their
+    classification did not complete or their first save failed
+    """
+    for name, news in list(pending_news.items()):
+        logger.error(
+            f"{name} was not saved during the run, saving its "
+            f"{len(news.articles) + len(news.linked_articles)} articles now"
+        )
+        try:
+            save_news(db, broadcast_service, clustering_service, news)
+        except Exception as e:
+            logger.exception(f"The articles of {name} could not be saved: {e}")
+            metrics.increment("save_failures", newspaper=name)
             continue
+        del pending_news[name]
 
-        save_data_in_db(db, newspaper, news)
-        broadcast_service.broadcast_news(newspaper.name, news)
 
-    print("Finished")
+def save_news(
+    db: Database,
+    broadcast_service: BroadcastService,
+    clustering_service: ClusteringService | None,
+    news: NewsBatch,
+) -> None:
+    """
+    Save the articles of the newspaper and the messages announcing them in a single
+    transaction. The messages are delivered by the outbox worker, so nothing is
+    lost if the process stops. Every article lists the headlines about its story
+    of the newspapers grouped so far, the ones grouped later are not added to a
+    digest that was already announced.
+    """
+    name = news.newspaper.name
+    related_headlines: dict[str, list[ClusteredHeadline]] = {}
+    if clustering_service is not None:
+        related_headlines = clustering_service.related_headlines(name, news.stories)
+
+    with db.transaction(newspaper=name):
+        newspaper_id = save_data_in_db(
+            db, news.newspaper, news.articles + news.linked_articles
+        )
+        # A newspaper without new headlines would announce an empty digest
+        if len(news.articles) > 0:
+            broadcast_service.broadcast_news(
+                name, news.articles, related_headlines, newspaper_id
+            )
+    metrics.increment(
+        "articles_saved",
+        len(news.articles) + len(news.linked_articles),
+        newspaper=name,
+    )
+
+    if len(news.articles) > 0 and broadcast_service.outbox_service is not None:
+        broadcast_service.outbox_service.notify()
+
+
+def export_metrics() -> None:
+    """
+    Write the metrics of the process and the summary of the last run
+    """
+    try:
+        metrics.export(METRICS_FILE, RUN_SUMMARY_FILE)
+    except OSError as e:
+        logger.error(f"The metrics could not be exported: {e}")
+
+
+def check_health() -> bool:
+    """
+    Whether the daemon is running and updated its health file recently
+    """
+    try:
+        with open(HEALTH_FILE, encoding="utf8") as health_file:
+            health = json.load(health_file)
+    except (OSError, ValueError):
+        return False
+
+    age = time.time() - os.path.getmtime(HEALTH_FILE)
+    return health.get("status") != "stopped" and age < HEALTH_MAX_AGE_SECONDS
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="keep running and scrape the newspapers on their schedule",
+    )
+    parser.add_argument(
+        "--health",
+        action="store_true",
+        help="exit with an error if the daemon is not healthy",
+    )
+    args = parser.parse_args()
+
+    if args.health:
+        sys.exit(0 if check_health() else 1)
+
     load_dotenv()
-    main()
+    main(daemon=args.daemon)
@@ -0,0 +1,111 @@
+import threading
+
+from loguru import logger
+
+from src.ai.tokens import estimate_tokens
+
+
+class TokenBudgetBatcher:
+    """
+    Group headlines in batches that fit in a budget of tokens. The expected output
+    of every headline is estimated from its length and a ratio learnt from the
+    usage reported by the model.
+    """
+
+    max_batch_tokens: int
+    max_output_tokens: int
+    max_batch_size: int | None
+    output_ratio: float
+    output_overhead_tokens: int
+
+    def __init__(
+        self,
+        max_batch_tokens: int = 4000,
+        max_output_tokens: int = 3000,
+        max_batch_size: int | None = None,
+        initial_output_ratio: float = 4.0,
+        output_overhead_tokens: int = 30,
+        smoothing: float = 0.3,
+    ):
+        """
+        * max_batch_tokens: input and expected output tokens of a batch
+        * max_output_tokens: expected output tokens of a batch, keep it below the
+          output limit of the model to avoid truncated responses
+        * max_batch_size: maximum number of headlines of a batch
+        * initial_output_ratio: output tokens per input token before any usage is
+          known
+        * output_overhead_tokens: output tokens of every headline independent of
+          its length, e.g. the JSON keys and the category
+        * smoothing: weight of the last usage in the learnt ratio
+        """
+        self.max_batch_tokens = max_batch_tokens
+        self.max_output_tokens = max_output_tokens
+        self.max_batch_size = max_batch_size
+        self.output_ratio = initial_output_ratio
+        self.output_overhead_tokens = output_overhead_tokens
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+    def estimate_output_tokens(self, input_tokens: int, headlines: int = 1) -> int:
+        """
+        Expected tokens of the answer to headlines with the given input tokens
+        """
+        return int(
+            input_tokens * self.output_ratio + headlines * self.output_overhead_tokens
+        )
+
+    def create_batches(self, headlines: list[str]) -> list[list[str]]:
+        """
+        Split the headlines in consecutive batches within the token budget. A
+        headline exceeding the budget on its own gets a batch for itself.
+        """
+        batches: list[list[str]] = []
+        batch: list[str] = []
+        batch_input_tokens = 0
+
+        for headline in headlines:
+            input_tokens = estimate_tokens(headline)
+            new_input_tokens = batch_input_tokens + input_tokens
+            new_output_tokens = self.estimate_output_tokens(
+                new_input_tokens, len(batch) + 1
+            )
+
+            full = (
+                new_input_tokens + new_output_tokens > self.max_batch_tokens
+                or new_output_tokens > self.max_output_tokens
+                or (
+                    self.max_batch_size is not None
+                    and len(batch) >= self.max_batch_size
+                )
+            )
+            if full and len(batch) > 0:
+                batches.append(batch)
+                batch = []
+                new_input_tokens = input_tokens
+
+            batch.append(headline)
+            batch_input_tokens = new_input_tokens
+
+        if len(batch) > 0:
+            batches.append(batch)
+
+        logger.debug(
+            f"{len(headlines)} headlines grouped in {len(batches)} batches "
+            f"(output ratio {self.output_ratio:.2f})"
+        )
+        return batches
+
+    def record_usage(self, headlines: list[str], completion_tokens: int) -> None:
+        """
+        Learn the output per input ratio from the usage of a complete response
+        """
+        input_tokens = sum(estimate_tokens(x) for x in headlines)
+        if input_tokens == 0:
+            return
+
+        overhead = len(headlines) * self.output_overhead_tokens
+        ratio = max(completion_tokens - overhead, 0) / input_tokens
+        with self._lock:
+            self.output_ratio = (
+                self.smoothing * ratio + (1 - self.smoothing) * self.output_ratio
+            )
@@ -0,0 +1,77 @@
+"""
+Incremental parser of the JSON objects of a list while the JSON is being received
+"""
+
+import json
+from typing import Any
+
+
+class JsonListItemParser:
+    """
+    Return the objects of the list of a key of the root JSON object as soon as
+    every one of them is closed, e.g. the articles of {"news": [{...}, {...}]}.
+    Every character is read once, so feeding the whole response in small chunks
+    costs the same as parsing it at the end.
+    """
+
+    key: str
+
+    def __init__(self, key: str):
+        """
+        * key: key of the root object whose list items are returned
+        """
+        self.key = key
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        # Last string of the root object, which is a key if a colon follows it
+        self._string: list[str] = []
+        self._last_string: str | None = None
+        self._last_key: str | None = None
+        self._in_list = False
+        self._item: list[str] | None = None
+
+    def feed(self, text: str) -> list[Any]:
+        """
+        Read the next chunk of the JSON and return the items completed by it
+        """
+        items = []
+        for char in text:
+            if self._item is not None:
+                self._item.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = "".join(self._string)
+                elif self._depth == 1:
+                    self._string.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string = []
+            elif char == ":" and self._depth == 1:
+                self._last_key = self._last_string
+            elif char == "," and self._depth == 1:
+                self._last_string = None
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 2 and char == "[":
+                    self._in_list = self._last_key == self.key
+                elif self._depth == 3 and self._in_list and char == "{":
+                    self._item = [char]
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._item is not None:
+                    items.append(json.loads("".join(self._item)))
+                    self._item = None
+                elif self._depth == 1:
+                    self._in_list = False
+
+        return items
@@ -2,7 +2,7 @@
 Interface to define how the ai model shall be implemented
 """
 
-from typing import Protocol, Optional, Dict, Any
+from typing import Generator, Protocol, Optional, Dict, Any, runtime_checkable
 from dataclasses import dataclass
 
 
@@ -13,9 +13,31 @@ class ModelResponse:
     metadata: Optional[Dict[str, Any]] = None
 
 
+class RateLimitError(Exception):
+    """
+    The provider rejected the request because a rate limit was exceeded
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 class AIModelProtocol(Protocol):
     used_tokens: int
 
     def generate(
         self, prompt: str, system_prompt: Optional[str] = None, **kwargs
     ) -> ModelResponse: ...
+
+
+@runtime_checkable
+class StreamingAIModelProtocol(AIModelProtocol, Protocol):
+    def generate_stream(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> Generator[str, None, ModelResponse]:
+        """
+        Yield the text of the response as it is generated and return the complete
+        response, with the same metadata as generate, when the stream finishes
+        """
+        ...
@@ -0,0 +1,266 @@
+"""
+Wrapper of any model that keeps its responses on disk, so that the same prompt is
+never paid twice
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Generator, Optional
+
+from loguru import logger
+
+from src.ai.provider.base import (
+    AIModelProtocol,
+    ModelResponse,
+    StreamingAIModelProtocol,
+)
+
+
+class CachedAIModel(StreamingAIModelProtocol):
+    """
+    Content-addressed cache of the responses of a model. Entries expire after a
+    time to live and the least recently used ones are removed when the cache grows
+    over its maximum size.
+    """
+
+    model: AIModelProtocol
+    hits: int
+    misses: int
+    saved_tokens: int
+
+    def __init__(
+        self,
+        model: AIModelProtocol,
+        cache_path: str,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        max_size_mb: float = 50,
+    ):
+        """
+        * cache_path: sqlite file where the responses are stored
+        * ttl_seconds: time an entry is valid, None keeps them forever
+        * max_size_mb: size of the stored responses before the oldest are removed
+        """
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self._lock = threading.Lock()
+
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ai_response (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                metadata TEXT,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """
+        )
+        self._conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_ai_response_accessed_at
+            ON ai_response (accessed_at)
+        """
+        )
+        self._conn.commit()
+
+    @property
+    def used_tokens(self) -> int:
+        return self.model.used_tokens
+
+    def _get_key(
+        self, prompt: str, system_prompt: Optional[str], kwargs: dict[str, Any]
+    ) -> str:
+        """
+        Hash of everything that changes the response of the model
+        """
+        response_format = kwargs.get("response_format")
+        schema = None
+        if response_format is not None:
+            if hasattr(response_format, "model_json_schema"):
+                schema = response_format.model_json_schema()
+            else:
+                schema = repr(response_format)
+
+        payload = json.dumps(
+            {
+                "model": getattr(self.model, "model", type(self.model).__name__),
+                "system_prompt": system_prompt,
+                "response_format": schema,
+                "prompt": prompt,
+                "options": {
+                    k: repr(v) for k, v in kwargs.items() if k != "response_format"
+                },
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf8")).hexdigest()
+
+    def _read(self, key: str) -> Optional[ModelResponse]:
+        """
+        Return the cached response if it exists and did not expire
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, metadata, created_at FROM ai_response WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            content, metadata, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM ai_response WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute(
+                "UPDATE ai_response SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+
+            metadata = json.loads(metadata) if metadata is not None else {}
+            usage = metadata.get("usage") or {}
+            self.hits += 1
+            self.saved_tokens += usage.get("total_tokens", 0)
+
+        metadata["cached"] = True
+
+        return ModelResponse(content=content, raw_response=None, metadata=metadata)
+
+    def _write(self, key: str, response: ModelResponse) -> None:
+        """
+        Store the response and evict the least recently used entries if needed
+        """
+        content = (
+            response.content
+            if isinstance(response.content, str)
+            else json.dumps(response.content)
+        )
+        metadata = json.dumps(response.metadata, default=str)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO ai_response
+                   (key, content, metadata, size, created_at, accessed_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (key, content, metadata, len(content) + len(metadata), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """
+        Remove expired entries and the least recently used ones above the size
+        """
+        if self.ttl_seconds is not None:
+            self._conn.execute(
+                "DELETE FROM ai_response WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+
+        total_size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM ai_response"
+        ).fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+
+        removed = 0
+        rows = self._conn.execute(
+            "SELECT key, size FROM ai_response ORDER BY accessed_at"
+        ).fetchall()
+        keys = []
+        for key, size in rows:
+            if total_size - removed <= self.max_size_bytes:
+                break
+            keys.append((key,))
+            removed += size
+
+        self._conn.executemany("DELETE FROM ai_response WHERE key = ?", keys)
+        logger.debug(f"Removed {len(keys)} entries from the AI cache")
+
+    def generate(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> ModelResponse:
+        """
+        Return the stored response of the prompt or ask the wrapped model
+        """
+        key = self._get_key(prompt, system_prompt, kwargs)
+
+        cached_response = self._read(key)
+        if cached_response is not None:
+            logger.debug("AI response found in the cache")
+            return cached_response
+
+        with self._lock:
+            self.misses += 1
+        response = self.model.generate(prompt, system_prompt=system_prompt, **kwargs)
+
+        # Truncated responses are not reused
+        if (response.metadata or {}).get("finish_reason") in (None, "stop"):
+            self._write(key, response)
+
+        return response
+
+    def generate_stream(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> Generator[str, None, ModelResponse]:
+        """
+        Yield the stored response of the prompt at once or stream the response of
+        the wrapped model, storing it when it is complete. Models without streaming
+        yield their whole response.
+        """
+        key = self._get_key(prompt, system_prompt, kwargs)
+
+        cached_response = self._read(key)
+        if cached_response is not None:
+            logger.debug("AI response found in the cache")
+            yield cached_response.content
+            return cached_response
+
+        with self._lock:
+            self.misses += 1
+        if isinstance(self.model, StreamingAIModelProtocol):
+            response = yield from self.model.generate_stream(
+                prompt, system_prompt=system_prompt, **kwargs
+            )
+        else:
+            response = self.model.generate(
+                prompt, system_prompt=system_prompt, **kwargs
+            )
+            yield response.content
+
+        if (response.metadata or {}).get("finish_reason") in (None, "stop"):
+            self._write(key, response)
+
+        return response
+
+    def stats(self) -> dict[str, int]:
+        """
+        Return the hits, misses and tokens saved by the cache
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "saved_tokens": self.saved_tokens,
+        }
+
+    def close(self) -> None:
+        """
+        Close the cache file
+        """
+        with self._lock:
+            self._conn.close()
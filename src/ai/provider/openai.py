@@ -2,15 +2,54 @@
 Module to use the api of OpenAI
 """
 
-from typing import Any, Iterable, Optional
+import threading
+from typing import Any, Generator, Iterable, Optional
 
+import openai
 from loguru import logger
 from openai import OpenAI
+from pydantic import BaseModel
 
-from src.ai.provider.base import AIModelProtocol, ModelResponse
+from src.ai.provider.base import (
+    ModelResponse,
+    RateLimitError,
+    StreamingAIModelProtocol,
+)
 
 
-class OpenAIModel(AIModelProtocol):
+def _strict_schema(schema: Any) -> Any:
+    """
+    Close every object of the JSON schema and require all its properties, as the
+    strict structured outputs of the API expect
+    """
+    if isinstance(schema, list):
+        return [_strict_schema(x) for x in schema]
+    if not isinstance(schema, dict):
+        return schema
+
+    schema = {key: _strict_schema(value) for key, value in schema.items()}
+    if schema.get("type") == "object" and isinstance(schema.get("properties"), dict):
+        schema["additionalProperties"] = False
+        schema["required"] = list(schema["properties"])
+    return schema
+
+
+def response_format_param(response_format: type[BaseModel]) -> dict:
+    """
+    Return the json_schema response format of the chat completions API for a
+    pydantic model, which `create` does not build by itself
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_format.__name__,
+            "schema": _strict_schema(response_format.model_json_schema()),
+            "strict": True,
+        },
+    }
+
+
+class OpenAIModel(StreamingAIModelProtocol):
     """
     Implementation to use openAI
     """
@@ -21,10 +60,48 @@ class OpenAIModel(AIModelProtocol):
         self,
         api_key: str,
         model: str = "gpt-4o-mini",
+        base_url: Optional[str] = None,
     ):
-        self.client = OpenAI(api_key=api_key)
+        """
+        * base_url: url of an OpenAI compatible API, e.g. a local fake server. By
+          default the OPENAI_BASE_URL environment variable or the official API
+        """
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
         self.model = model
         self.used_tokens = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_retry_after(error: openai.RateLimitError) -> Optional[float]:
+        """
+        Read the seconds to wait from the headers of a 429 response
+        """
+        headers = error.response.headers
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000
+            if "retry-after" in headers:
+                return float(headers["retry-after"])
+        except ValueError:
+            return None
+        return None
+
+    def _get_messages(self, prompt: str, system_prompt: Optional[str]) -> Iterable:
+        messages: list = [{"role": "user", "content": prompt}]
+
+        if system_prompt is not None:
+            messages.append({"role": "system", "content": system_prompt})
+
+        return messages
+
+    def _record_usage(self, usage: Any) -> None:
+        if usage is None:
+            return
+
+        logger.debug(f"AI prompt took a total of {usage.total_tokens} tokens.")
+        logger.debug(f"Usage: {usage.model_dump_json(indent=4)}")
+        with self._lock:
+            self.used_tokens += usage.total_tokens
 
     def generate(
         self,
@@ -35,23 +112,20 @@ class OpenAIModel(AIModelProtocol):
         """
         Send the provided prompt and return the response
         """
-        messages: Iterable = [{"role": "user", "content": prompt}]
-
-        if system_prompt is not None:
-            messages.append({"role": "system", "content": system_prompt})
-
-        response = self.client.beta.chat.completions.parse(
-            model=self.model,
-            messages=messages,
-            response_format=response_format,
-        )
-
-        if response.usage is not None:
-            logger.debug(
-                f"AI prompt took a total of {response.usage.total_tokens} tokens."
+        try:
+            response = self.client.beta.chat.completions.parse(
+                model=self.model,
+                messages=self._get_messages(prompt, system_prompt),
+                response_format=response_format,
             )
-            logger.debug(f"Usage: {response.usage.model_dump_json(indent=4)}")
-            self.used_tokens += response.usage.total_tokens
+        except openai.RateLimitError as e:
+            raise RateLimitError(str(e), self._get_retry_after(e)) from e
+        except openai.LengthFinishReasonError as e:
+            # Return the truncated completion so that the caller can split the work
+            logger.warning("The AI response was truncated by the length limit")
+            response = e.completion
+
+        self._record_usage(response.usage)
 
         return ModelResponse(
             content=response.choices[0].message.content,
@@ -62,3 +136,61 @@ class OpenAIModel(AIModelProtocol):
                 "usage": response.usage.model_dump() if response.usage else None,
             },
         )
+
+    def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        response_format: Any = None,
+    ) -> Generator[str, None, ModelResponse]:
+        """
+        Send the provided prompt and yield the text of the response as it arrives.
+        The JSON is not validated against the response format, the caller parses
+        it while it is received.
+        """
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=self._get_messages(prompt, system_prompt),
+                response_format=(
+                    response_format_param(response_format)
+                    if response_format is not None
+                    else openai.NOT_GIVEN
+                ),
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+        except openai.RateLimitError as e:
+            raise RateLimitError(str(e), self._get_retry_after(e)) from e
+
+        content: list[str] = []
+        finish_reason = None
+        usage = None
+        with stream:
+            for chunk in stream:
+                # The usage comes in a last chunk without choices
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if len(chunk.choices) == 0:
+                    continue
+
+                choice = chunk.choices[0]
+                if choice.finish_reason is not None:
+                    finish_reason = choice.finish_reason
+                if choice.delta.content:
+                    content.append(choice.delta.content)
+                    yield choice.delta.content
+
+        if finish_reason == "length":
+            logger.warning("The AI response was truncated by the length limit")
+        self._record_usage(usage)
+
+        return ModelResponse(
+            content="".join(content),
+            raw_response=None,
+            metadata={
+                "model": self.model,
+                "finish_reason": finish_reason,
+                "usage": usage.model_dump() if usage else None,
+            },
+        )
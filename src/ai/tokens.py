@@ -0,0 +1,9 @@
+# Average number of characters of a token for latin languages
+CHARACTERS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough estimation of the tokens of a text without calling the tokenizer
+    """
+    return len(text) // CHARACTERS_PER_TOKEN + 1
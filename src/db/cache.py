@@ -0,0 +1,60 @@
+import threading
+
+
+class NameIdCache:
+    """
+    Write-through cache of the id of the rows of a small table by their name
+    """
+
+    hits: int
+    misses: int
+    warmed: bool
+
+    def __init__(self) -> None:
+        self._ids: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.warmed = False
+
+    def get(self, name: str) -> int | None:
+        """
+        Return the cached id of the name, counting the hit or miss
+        """
+        with self._lock:
+            row_id = self._ids.get(name)
+            if row_id is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return row_id
+
+    def set_many(self, ids: dict[str, int]) -> None:
+        """
+        Add the provided ids to the cache
+        """
+        with self._lock:
+            self._ids.update(ids)
+
+    def warm(self, ids: dict[str, int]) -> None:
+        """
+        Replace the content of the cache with all the rows of the table
+        """
+        with self._lock:
+            self._ids = dict(ids)
+            self.warmed = True
+
+    def clear(self) -> None:
+        """
+        Forget all the ids, the next access loads the table again
+        """
+        with self._lock:
+            self._ids = {}
+            self.warmed = False
+
+    def stats(self) -> dict[str, int]:
+        """
+        Return the number of cached names, hits and misses
+        """
+        with self._lock:
+            return {"size": len(self._ids), "hits": self.hits, "misses": self.misses}
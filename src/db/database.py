@@ -1,27 +1,170 @@
 import sqlite3
+import threading
+import time
+import weakref
 from pathlib import Path
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Callable, Generator
+
+from loguru import logger
+
+from src.utils.metrics import metrics
+
+from .cache import NameIdCache
+from .fingerprint import headline_fingerprint
+from .minhash import headline_minhash_values, minhash_rows
+
+
+class _ConnectionHolder:
+    """
+    Connection of a thread, whose lifetime follows the thread-local storage
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
 
 
 class Database:
     """
     Object to manage the database: This should be instantiated only once.
-    """
 
-    def __init__(self, db_path: str = "news.db"):
+    Every thread keeps a single connection that is reused by all the repositories
+    until the thread finishes or `close` is called.
+    """
 
+    def __init__(
+        self,
+        db_path: str = "news.db",
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        cache_size_kib: int = 16384,
+        mmap_size_mb: int = 64,
+        cached_statements: int = 256,
+    ):
+        """
+        * journal_mode, synchronous: values of the SQLite pragmas with the same name
+        * cache_size_kib: size of the page cache of every connection
+        * mmap_size_mb: size of the file mapped in memory, 0 disables it
+        * cached_statements: number of prepared statements kept by every connection
+        """
         self.db_path = Path(db_path)
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size_mb = mmap_size_mb
+        self.cached_statements = cached_statements
+        self.connections_opened = 0
+        self._local = threading.local()
+        self._connections: set[sqlite3.Connection] = set()
+        self._lock = threading.Lock()
+        self._caches: dict[str, NameIdCache] = {}
+
         self._create_tables()
+        self._migrate()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a new connection with the configured pragmas
+        """
+        conn = sqlite3.connect(
+            self.db_path,
+            cached_statements=self.cached_statements,
+            # Only the owner thread uses it, but `close` may be called by another
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA cache_size = -{self.cache_size_kib}")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size_mb * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+
+        with self._lock:
+            self._connections.add(conn)
+            self.connections_opened += 1
+
+        return conn
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        """
+        Close the connection of a thread that has finished
+        """
+        with self._lock:
+            self._connections.discard(conn)
+        conn.close()
 
     @contextmanager
     def get_connection(self) -> Generator[sqlite3.Connection, None, None]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        holder: _ConnectionHolder | None = getattr(self._local, "holder", None)
+        if holder is None:
+            holder = _ConnectionHolder(self._connect())
+            # The thread-local values are dropped when the thread finishes, which
+            # closes its connection instead of keeping it open until `close`
+            weakref.finalize(holder, self._release, holder.connection)
+            self._local.holder = holder
+        conn = holder.connection
+
         try:
             yield conn
-        finally:
-            conn.close()
+        except Exception:
+            conn.rollback()
+            # Cached ids written in the rolled back transaction may not exist
+            self._clear_caches()
+            raise
+
+    def name_id_cache(self, table: str) -> NameIdCache:
+        """
+        Return the cache of ids by name of the table, shared by all its repositories
+        """
+        with self._lock:
+            if table not in self._caches:
+                self._caches[table] = NameIdCache()
+            return self._caches[table]
+
+    def _clear_caches(self) -> None:
+        """
+        Empty the caches of all the tables
+        """
+        with self._lock:
+            caches = list(self._caches.values())
+        for cache in caches:
+            cache.clear()
+
+    @contextmanager
+    def transaction(self, **labels: Any) -> Generator[sqlite3.Connection, None, None]:
+        """
+        Group all the statements executed inside in a single commit. Nested
+        transactions are part of the outermost one, which is measured with the
+        labels, e.g. the newspaper.
+        """
+        depth = getattr(self._local, "transaction_depth", 0)
+        start = time.perf_counter()
+        with self.get_connection() as conn:
+            self._local.transaction_depth = depth + 1
+            try:
+                yield conn
+            finally:
+                self._local.transaction_depth = depth
+
+            if depth == 0:
+                conn.commit()
+                metrics.observe("db_transaction", time.perf_counter() - start, **labels)
+
+    def close(self) -> None:
+        """
+        Close the connections of all the threads
+        """
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            logger.debug(f"{self.connections_opened} database connections were used")
+            for table, cache in self._caches.items():
+                logger.debug(f"Cache of {table} ids: {cache.stats()}")
+            self._connections = set()
+            local, self._local = self._local, threading.local()
+        # Dropping the connections of the threads runs their finalizers, which take
+        # the lock
+        del local
 
     def _create_tables(self) -> None:
         with self.get_connection() as conn:
@@ -63,3 +206,134 @@ class Database:
             )
 
             conn.commit()
+
+    def _migrate(self) -> None:
+        """
+        Apply the migrations that are newer than the version stored in the database
+        """
+        migrations: list[Callable[[sqlite3.Connection], None]] = [
+            self._add_article_hash,
+            self._add_news_minhash,
+            self._add_outbox,
+        ]
+
+        with self.get_connection() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, migration in enumerate(migrations, start=1):
+                if number <= version:
+                    continue
+
+                logger.info(f"Applying database migration {number}...")
+                # sqlite3 only opens transactions implicitly before DML, so without
+                # an explicit one the ALTER TABLE of a migration interrupted later
+                # would be kept and fail when the migration is applied again
+                conn.execute("BEGIN")
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.commit()
+
+    def _add_article_hash(self, conn: sqlite3.Connection) -> None:
+        """
+        Add the fingerprint of the normalized headline with a unique index per
+        newspaper. Existing duplicates keep an empty fingerprint.
+        """
+        cursor = conn.cursor()
+        cursor.execute("ALTER TABLE news ADD COLUMN article_hash TEXT")
+
+        seen: set[tuple[str, int]] = set()
+        updates: list[tuple[str, int]] = []
+        for row in cursor.execute(
+            "SELECT id, newspaper_id, article FROM news ORDER BY id"
+        ).fetchall():
+            article_hash = headline_fingerprint(row["article"])
+            if (article_hash, row["newspaper_id"]) in seen:
+                continue
+            seen.add((article_hash, row["newspaper_id"]))
+            updates.append((article_hash, row["id"]))
+
+        cursor.executemany("UPDATE news SET article_hash = ? WHERE id = ?", updates)
+        cursor.execute(
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_news_article_hash
+            ON news (article_hash, newspaper_id)
+        """
+        )
+
+    def _add_news_minhash(self, conn: sqlite3.Connection) -> None:
+        """
+        Add the index of MinHash signatures used to find near duplicate headlines
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS news_minhash (
+                news_id INTEGER PRIMARY KEY,
+                newspaper_id INTEGER NOT NULL,
+                signature BLOB NOT NULL,
+                FOREIGN KEY (news_id) REFERENCES news (id) ON DELETE CASCADE
+            )
+        """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS news_minhash_band (
+                news_id INTEGER NOT NULL,
+                newspaper_id INTEGER NOT NULL,
+                band INTEGER NOT NULL,
+                value INTEGER NOT NULL,
+                PRIMARY KEY (news_id, band),
+                FOREIGN KEY (news_id) REFERENCES news (id) ON DELETE CASCADE
+            )
+        """
+        )
+        cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_news_minhash_band_value
+            ON news_minhash_band (value)
+        """
+        )
+
+        rows = cursor.execute("SELECT id, newspaper_id, article FROM news").fetchall()
+        minhashes = headline_minhash_values([x["article"] for x in rows])
+        signatures, bands = minhash_rows(
+            [
+                (row["id"], row["newspaper_id"], minhash)
+                for row, minhash in zip(rows, minhashes)
+            ]
+        )
+
+        cursor.executemany(
+            "INSERT OR IGNORE INTO news_minhash VALUES (?, ?, ?)", signatures
+        )
+        cursor.executemany(
+            "INSERT OR IGNORE INTO news_minhash_band VALUES (?, ?, ?, ?)", bands
+        )
+
+    def _add_outbox(self, conn: sqlite3.Connection) -> None:
+        """
+        Add the messages waiting to be delivered to every chat
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                newspaper_id INTEGER,
+                chat_id TEXT NOT NULL,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sent_at TIMESTAMP,
+                FOREIGN KEY (newspaper_id) REFERENCES newspaper (id)
+            )
+        """
+        )
+        cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_outbox_status_chat
+            ON outbox (status, chat_id, id)
+        """
+        )
@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Literal
+
+from .base import BaseModelWithConfig
+
+
+class OutboxMessage(BaseModelWithConfig):
+    """
+    Message waiting to be delivered to a chat
+    """
+
+    id: int | None = None
+    newspaper_id: int | None = None
+    chat_id: str
+    message: str
+    status: Literal["pending", "sent", "failed"] = "pending"
+    attempts: int = 0
+    # Unix time from which the message can be sent
+    next_attempt_at: float = 0
+    last_error: str | None = None
+    created_at: datetime | None = None
+    sent_at: datetime | None = None
@@ -0,0 +1,17 @@
+import hashlib
+import unicodedata
+
+
+def normalize_headline(headline: str) -> str:
+    """
+    Return the headline without differences in case, unicode form or whitespace
+    """
+    headline = unicodedata.normalize("NFKC", headline)
+    return " ".join(headline.casefold().split())
+
+
+def headline_fingerprint(headline: str) -> str:
+    """
+    Return the hash used to identify a headline in the database
+    """
+    return hashlib.sha1(normalize_headline(headline).encode("utf8")).hexdigest()
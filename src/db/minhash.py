@@ -0,0 +1,210 @@
+"""
+MinHash signatures of headlines and the locality sensitive bands used to find the
+stored headlines that are almost equal to a new one
+"""
+
+import functools
+import hashlib
+import random
+import re
+import struct
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .fingerprint import normalize_headline
+
+SHINGLE_SIZE = 3
+MINHASH_PERMUTATIONS = 32
+# Headlines sharing all the values of a band are compared. With 8 bands of 4 values
+# a pair with a similarity of 0.7 is found with a probability of 0.89.
+MINHASH_BANDS = 8
+MINHASH_ROWS = MINHASH_PERMUTATIONS // MINHASH_BANDS
+# Shingles whose permutations are computed at once, bounding the memory used
+MINHASH_CHUNK_SHINGLES = 32768
+SHINGLE_CACHE_SIZE = 65536
+# Headlines whose stored values are kept, so that the ones computed while filtering
+# the new headlines are reused when they are saved
+MINHASH_CACHE_SIZE = 4096
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_random = random.Random(20240101)
+_PERMUTATIONS = [
+    (_random.randrange(1, _MERSENNE_PRIME), _random.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+_SIGNATURE_FORMAT = f"<{MINHASH_PERMUTATIONS}Q"
+
+_PRIME = np.uint64(_MERSENNE_PRIME)
+_LOW_32_BITS = np.uint64(0xFFFFFFFF)
+_LOW_29_BITS = np.uint64(0x1FFFFFFF)
+_A = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)[:, None]
+_B = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)[:, None]
+_A_LOW = _A & _LOW_32_BITS
+_A_HIGH = _A >> np.uint64(32)
+
+_cache: OrderedDict[str, tuple[bytes, list[int]]] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _hash(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "little")
+
+
+@functools.lru_cache(maxsize=SHINGLE_CACHE_SIZE)
+def _shingle_hash(shingle: str) -> int:
+    """
+    Hash of a shingle. Headlines share most of their shingles, so they are cached.
+    """
+    return _hash(shingle.encode("utf8"))
+
+
+def _reduce(values: np.ndarray) -> np.ndarray:
+    """
+    Values modulo the Mersenne prime, using that 2^61 is 1 modulo it. Every value
+    has to be below 2^64 - 2^61.
+    """
+    values = (values & _PRIME) + (values >> np.uint64(61))
+    return np.where(values >= _PRIME, values - _PRIME, values)
+
+
+def _permute(hashes: np.ndarray) -> np.ndarray:
+    """
+    (a * x + b) modulo the Mersenne prime for every permutation and hash, exactly
+    as with Python integers. The product is split in 32 bits halves so that no
+    intermediate value overflows 64 bits.
+    """
+    x = _reduce(hashes)[None, :]
+    x_low = x & _LOW_32_BITS
+    x_high = x >> np.uint64(32)
+    # a * x = high * 2^64 + middle * 2^32 + low, and 2^64 is 8 modulo the prime
+    high = _A_HIGH * x_high
+    middle = _A_HIGH * x_low + _A_LOW * x_high
+    low = _A_LOW * x_low
+    values = (
+        (high << np.uint64(3))
+        + (middle >> np.uint64(29))
+        + ((middle & _LOW_29_BITS) << np.uint64(32))
+        + (low & _PRIME)
+        + (low >> np.uint64(61))
+        + _B
+    )
+    return _reduce(values)
+
+
+def headline_shingles(headline: str) -> set[str]:
+    """
+    Character shingles of the normalized headline without punctuation
+    """
+    text = " ".join(re.sub(r"[^\w\s]+", " ", normalize_headline(headline)).split())
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i : i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def headline_minhashes(headlines: list[str]) -> list[list[int]]:
+    """
+    Signature of every headline. The share of equal values of two signatures
+    estimates the Jaccard similarity of their shingles. The permutations of the
+    shingles of many headlines are computed together with numpy.
+    """
+    shingle_hashes = [
+        [_shingle_hash(x) for x in headline_shingles(headline)]
+        for headline in headlines
+    ]
+
+    signatures: list[list[int]] = []
+    start = 0
+    while start < len(shingle_hashes):
+        end = start + 1
+        size = len(shingle_hashes[start])
+        while end < len(shingle_hashes) and size < MINHASH_CHUNK_SHINGLES:
+            size += len(shingle_hashes[end])
+            end += 1
+
+        chunk = shingle_hashes[start:end]
+        offsets = np.cumsum([0] + [len(x) for x in chunk[:-1]])
+        hashes = np.fromiter(
+            (x for headline in chunk for x in headline), dtype=np.uint64, count=size
+        )
+        # The permutations of the repeated shingles are only computed once
+        unique_hashes, positions = np.unique(hashes, return_inverse=True)
+        values = _permute(unique_hashes)[:, positions]
+        # Every headline has at least one shingle, so no segment is empty
+        minimums = np.minimum.reduceat(values, offsets, axis=1)
+        signatures.extend(minimums.T.tolist())
+        start = end
+
+    return signatures
+
+
+def minhash_similarity(first: list[int], second: list[int]) -> float:
+    """
+    Estimated Jaccard similarity of two signatures
+    """
+    return sum(x == y for x, y in zip(first, second)) / len(first)
+
+
+def minhash_bands(signature: list[int]) -> list[int]:
+    """
+    Hash of every band of the signature as a signed 64 bits integer for SQLite
+    """
+    bands = []
+    for band in range(MINHASH_BANDS):
+        values = signature[band * MINHASH_ROWS : (band + 1) * MINHASH_ROWS]
+        data = struct.pack(f"<B{MINHASH_ROWS}Q", band, *values)
+        bands.append(_hash(data) - (1 << 63))
+    return bands
+
+
+def pack_signature(signature: list[int]) -> bytes:
+    return struct.pack(_SIGNATURE_FORMAT, *signature)
+
+
+def unpack_signature(data: bytes) -> list[int]:
+    return list(struct.unpack(_SIGNATURE_FORMAT, data))
+
+
+def headline_minhash_values(headlines: list[str]) -> list[tuple[bytes, list[int]]]:
+    """
+    Packed signature and band values of every headline as they are stored. The
+    values of the last headlines are cached, so saving the headlines that were
+    just filtered does not compute them again inside the transaction.
+    """
+    values: dict[str, tuple[bytes, list[int]]] = {}
+    with _cache_lock:
+        for headline in headlines:
+            if headline in _cache:
+                _cache.move_to_end(headline)
+                values[headline] = _cache[headline]
+
+    missing = [x for x in dict.fromkeys(headlines) if x not in values]
+    for headline, signature in zip(missing, headline_minhashes(missing)):
+        values[headline] = (pack_signature(signature), minhash_bands(signature))
+
+    with _cache_lock:
+        for headline in missing:
+            _cache[headline] = values[headline]
+        while len(_cache) > MINHASH_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return [values[x] for x in headlines]
+
+
+def minhash_rows(
+    news: list[tuple[int, int, tuple[bytes, list[int]]]],
+) -> tuple[list[tuple], list[tuple]]:
+    """
+    Rows of the news_minhash table and rows of the news_minhash_band table of the
+    stored headlines given their (id, newspaper id, values)
+    """
+    signatures = []
+    bands = []
+    for news_id, newspaper_id, (signature, band_values) in news:
+        signatures.append((news_id, newspaper_id, signature))
+        bands.extend(
+            (news_id, newspaper_id, band, value)
+            for band, value in enumerate(band_values)
+        )
+    return signatures, bands
@@ -4,6 +4,9 @@ from pydantic import BaseModel
 
 T = TypeVar("T", bound=BaseModel)
 
+# Maximum number of parameters of a single query, below the SQLite default limit
+QUERY_CHUNK_SIZE = 500
+
 
 class BaseRepository(ABC, Generic[T]):
     """
@@ -1,21 +1,76 @@
-from typing import List, Optional
+from typing import Iterable, List, Optional
 
 from ..database import Database
 from ..entity.category import Category
-from .base_repository import BaseRepository
+from .base_repository import QUERY_CHUNK_SIZE, BaseRepository
 
 
 class CategoryRepository(BaseRepository[Category]):
     def __init__(self, database: Database):
         self.database = database
+        self.cache = database.name_id_cache("category")
 
     def create(self, category: Category) -> Category:
-        with self.database.get_connection() as conn:
+        with self.database.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("INSERT INTO category (name) VALUES (?)", (category.name,))
-            conn.commit()
+            if cursor.lastrowid is not None:
+                self.cache.set_many({category.name: cursor.lastrowid})
             return Category(id=cursor.lastrowid, name=category.name)
 
+    def warm_cache(self) -> None:
+        """
+        Load the ids of all the categories in the cache
+        """
+        self.cache.warm({x.name: x.id for x in self.get_all() if x.id is not None})
+
+    def get_or_create_ids(self, names: Iterable[str]) -> dict[str, int]:
+        """
+        Return the id of every name using the cache. Only the missing categories
+        are inserted.
+        """
+        if not self.cache.warmed:
+            self.warm_cache()
+
+        ids: dict[str, int] = {}
+        missing: list[str] = []
+        for name in set(names):
+            category_id = self.cache.get(name)
+            if category_id is None:
+                missing.append(name)
+            else:
+                ids[name] = category_id
+
+        if len(missing) > 0:
+            ids.update(self.create_many(missing))
+
+        return ids
+
+    def create_many(self, names: Iterable[str]) -> dict[str, int]:
+        """
+        Insert the categories that do not exist yet and return the id of every name
+        """
+        unique_names = list(set(names))
+        ids: dict[str, int] = {}
+
+        with self.database.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT INTO category (name) VALUES (?) ON CONFLICT (name) DO NOTHING",
+                [(x,) for x in unique_names],
+            )
+            for i in range(0, len(unique_names), QUERY_CHUNK_SIZE):
+                chunk = unique_names[i : i + QUERY_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(
+                    f"SELECT id, name FROM category WHERE name IN ({placeholders})",
+                    chunk,
+                )
+                ids.update((row["name"], row["id"]) for row in cursor.fetchall())
+
+        self.cache.set_many(ids)
+        return ids
+
     def get(self, id: int) -> Optional[Category]:
         with self.database.get_connection() as conn:
             cursor = conn.cursor()
@@ -41,18 +96,18 @@ class CategoryRepository(BaseRepository[Category]):
             return [Category.model_validate(dict(row)) for row in cursor.fetchall()]
 
     def update(self, category: Category) -> Category:
-        with self.database.get_connection() as conn:
+        with self.database.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "UPDATE category SET name = ? WHERE id = ?",
                 (category.name, category.id),
             )
-            conn.commit()
+            self.cache.clear()
             return category
 
     def delete(self, id: int) -> bool:
-        with self.database.get_connection() as conn:
+        with self.database.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM category WHERE id = ?", (id,))
-            conn.commit()
+            self.cache.clear()
             return cursor.rowcount > 0
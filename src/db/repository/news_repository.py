@@ -1,8 +1,11 @@
-from typing import Optional
+import sqlite3
+from typing import Iterable, Optional
 
 from ..database import Database
 from ..entity.news import News
-from .base_repository import BaseRepository
+from ..fingerprint import headline_fingerprint
+from ..minhash import headline_minhash_values, minhash_rows, unpack_signature
+from .base_repository import QUERY_CHUNK_SIZE, BaseRepository
 
 
 class NewsRepository(BaseRepository[News]):
@@ -10,24 +13,103 @@ class NewsRepository(BaseRepository[News]):
         self.database = database
 
     def create(self, news: News) -> News:
-        with self.database.get_connection() as conn:
+        """
+        Insert the news. If the same headline is already stored for the newspaper
+        the existing id is returned.
+        """
+        article_hash = headline_fingerprint(news.article)
+        minhash = headline_minhash_values([news.article])[0]
+        with self.database.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """INSERT INTO news 
-                   (newspaper_id, article, description, translation, category_id)
-                   VALUES (?, ?, ?, ?, ?)""",
+                   (newspaper_id, article, article_hash, description, translation,
+                    category_id)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (article_hash, newspaper_id) DO NOTHING""",
                 (
                     news.newspaper_id,
                     news.article,
+                    article_hash,
                     news.description,
                     news.translation,
                     news.category_id,
                 ),
             )
-            conn.commit()
-            created_news = news.model_copy(update={"id": cursor.lastrowid})
+            news_id = cursor.lastrowid
+            if cursor.rowcount == 0:
+                cursor.execute(
+                    """SELECT id FROM news
+                       WHERE article_hash = ? AND newspaper_id = ?""",
+                    (article_hash, news.newspaper_id),
+                )
+                news_id = cursor.fetchone()[0]
+            else:
+                self._save_minhash(cursor, [(news_id, news.newspaper_id, minhash)])
+            created_news = news.model_copy(update={"id": news_id})
             return created_news
 
+    def create_many(self, news: list[News]) -> list[int]:
+        """
+        Insert all the news with a single statement and return their ids in the
+        same order. Headlines already stored for the newspaper keep their id.
+        """
+        rows = [
+            (
+                x.newspaper_id,
+                x.article,
+                headline_fingerprint(x.article),
+                x.description,
+                x.translation,
+                x.category_id,
+            )
+            for x in news
+        ]
+        # Computed before the transaction so that the write lock is held briefly
+        minhashes = headline_minhash_values([x.article for x in news])
+
+        ids: dict[tuple[str, int], int] = {}
+        with self.database.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                """INSERT INTO news
+                   (newspaper_id, article, article_hash, description, translation,
+                    category_id)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (article_hash, newspaper_id) DO NOTHING""",
+                rows,
+            )
+
+            hashes_by_newspaper: dict[int, list[str]] = {}
+            for row in rows:
+                hashes_by_newspaper.setdefault(row[0], []).append(row[2])
+
+            for newspaper_id, hashes in hashes_by_newspaper.items():
+                unique_hashes = list(set(hashes))
+                for i in range(0, len(unique_hashes), QUERY_CHUNK_SIZE):
+                    chunk = unique_hashes[i : i + QUERY_CHUNK_SIZE]
+                    placeholders = ", ".join("?" * len(chunk))
+                    cursor.execute(
+                        f"""SELECT id, article_hash FROM news
+                            WHERE newspaper_id = ?
+                              AND article_hash IN ({placeholders})""",
+                        [newspaper_id] + chunk,
+                    )
+                    ids.update(
+                        ((row["article_hash"], newspaper_id), row["id"])
+                        for row in cursor.fetchall()
+                    )
+
+            self._save_minhash(
+                cursor,
+                [
+                    (ids[(row[2], row[0])], row[0], minhash)
+                    for row, minhash in zip(rows, minhashes)
+                ],
+            )
+
+        return [ids[(row[2], row[0])] for row in rows]
+
     def get(self, id: int) -> Optional[News]:
         with self.database.get_connection() as conn:
             cursor = conn.cursor()
@@ -68,37 +150,123 @@ class NewsRepository(BaseRepository[News]):
             cursor.execute(
                 """SELECT id, newspaper_id, article, description, translation,
                           category_id, created_at
-                   FROM news WHERE article = ?""",
-                (name,),
+                   FROM news WHERE article_hash = ?""",
+                (headline_fingerprint(name),),
             )
             row = cursor.fetchone()
             if row:
                 return News.model_validate(dict(row))
             return None
 
-    def update(self, news: News) -> News:
+    def get_existing_fingerprints(
+        self, fingerprints: Iterable[str], newspaper_id: int | None = None
+    ) -> set[str]:
+        """
+        Return which of the provided headline fingerprints are already stored. If a
+        newspaper is provided only its news are considered.
+        """
+        unique_fingerprints = list(set(fingerprints))
+        existing: set[str] = set()
+
+        newspaper_filter = ""
+        newspaper_parameters: list[int] = []
+        if newspaper_id is not None:
+            newspaper_filter = " AND newspaper_id = ?"
+            newspaper_parameters = [newspaper_id]
+
         with self.database.get_connection() as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(unique_fingerprints), QUERY_CHUNK_SIZE):
+                chunk = unique_fingerprints[i : i + QUERY_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(
+                    f"""SELECT article_hash FROM news
+                        WHERE article_hash IN ({placeholders}){newspaper_filter}""",
+                    chunk + newspaper_parameters,
+                )
+                existing.update(row[0] for row in cursor.fetchall())
+
+        return existing
+
+    def get_minhash_candidates(
+        self, bands: Iterable[list[int]], newspaper_id: int | None = None
+    ) -> list[list[int]]:
+        """
+        Return the stored signatures sharing at least one band with the provided
+        ones. The caller has to compare them to discard the unrelated candidates.
+
+        * bands: bands of every signature, as returned by `minhash_bands`
+        * newspaper_id: if provided only its news are considered
+        """
+        # The band number is part of the hash, so the values of all bands are unique
+        unique_values = list({value for x in bands for value in x})
+
+        newspaper_filter = ""
+        newspaper_parameters: list[int] = []
+        if newspaper_id is not None:
+            newspaper_filter = " AND b.newspaper_id = ?"
+            newspaper_parameters = [newspaper_id]
+
+        signatures: dict[int, bytes] = {}
+        with self.database.get_connection() as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(unique_values), QUERY_CHUNK_SIZE):
+                chunk = unique_values[i : i + QUERY_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(
+                    f"""SELECT m.news_id, m.signature
+                        FROM news_minhash_band b
+                        JOIN news_minhash m ON m.news_id = b.news_id
+                        WHERE b.value IN ({placeholders}){newspaper_filter}""",
+                    chunk + newspaper_parameters,
+                )
+                signatures.update((row[0], row[1]) for row in cursor.fetchall())
+
+        return [unpack_signature(x) for x in signatures.values()]
+
+    def _save_minhash(
+        self,
+        cursor: sqlite3.Cursor,
+        news: list[tuple[int, int, tuple[bytes, list[int]]]],
+    ) -> None:
+        """
+        Store the MinHash signature and bands of every (id, newspaper id, values)
+        """
+        signatures, bands = minhash_rows(news)
+
+        cursor.executemany(
+            "INSERT OR REPLACE INTO news_minhash VALUES (?, ?, ?)", signatures
+        )
+        cursor.executemany(
+            "INSERT OR REPLACE INTO news_minhash_band VALUES (?, ?, ?, ?)", bands
+        )
+
+    def update(self, news: News) -> News:
+        minhash = headline_minhash_values([news.article])[0]
+        with self.database.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 """UPDATE news 
-                   SET newspaper_id = ?, article = ?, 
+                   SET newspaper_id = ?, article = ?, article_hash = ?,
                        description = ?, category_id = ?, translation = ?
                    WHERE id = ?""",
                 (
                     news.newspaper_id,
                     news.article,
+                    headline_fingerprint(news.article),
                     news.description,
                     news.category_id,
                     news.translation,
                     news.id,
                 ),
             )
-            conn.commit()
+            self._save_minhash(cursor, [(news.id, news.newspaper_id, minhash)])
             return news
 
     def delete(self, id: int) -> bool:
-        with self.database.get_connection() as conn:
+        with self.database.transaction() as conn:
             cursor = conn.cursor()
+            cursor.execute("DELETE FROM news_minhash_band WHERE news_id = ?", (id,))
+            cursor.execute("DELETE FROM news_minhash WHERE news_id = ?", (id,))
             cursor.execute("DELETE FROM news WHERE id = ?", (id,))
-            conn.commit()
             return cursor.rowcount > 0
@@ -8,19 +8,65 @@ from .base_repository import BaseRepository
 class NewspaperRepository(BaseRepository[Newspaper]):
     def __init__(self, database: Database):
         self.database = database
+        self.cache = database.name_id_cache("newspaper")
 
     def create(self, newspaper: Newspaper) -> Newspaper:
-        with self.database.get_connection() as conn:
+        with self.database.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "INSERT INTO newspaper (name, url) VALUES (?, ?)",
                 (newspaper.name, newspaper.url),
             )
-            conn.commit()
+            if cursor.lastrowid is not None:
+                self.cache.set_many({newspaper.name: cursor.lastrowid})
             return Newspaper(
                 id=cursor.lastrowid, name=newspaper.name, url=newspaper.url
             )
 
+    def warm_cache(self) -> None:
+        """
+        Load the ids of all the newspapers in the cache
+        """
+        self.cache.warm({x.name: x.id for x in self.get_all() if x.id is not None})
+
+    def get_or_create_id(self, newspaper: Newspaper) -> int:
+        """
+        Return the id of the newspaper using the cache. It is only inserted if it
+        does not exist.
+        """
+        if not self.cache.warmed:
+            self.warm_cache()
+
+        newspaper_id = self.cache.get(newspaper.name)
+        if newspaper_id is not None:
+            return newspaper_id
+
+        newspaper_entity = self.upsert(newspaper)
+        if newspaper_entity.id is None:
+            raise RuntimeError("The newspaper could not be saved")
+
+        return newspaper_entity.id
+
+    def upsert(self, newspaper: Newspaper) -> Newspaper:
+        """
+        Insert the newspaper if its name does not exist yet and return the stored one
+        """
+        with self.database.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT INTO newspaper (name, url) VALUES (?, ?)
+                   ON CONFLICT (name) DO NOTHING""",
+                (newspaper.name, newspaper.url),
+            )
+            cursor.execute(
+                "SELECT id, name, url FROM newspaper WHERE name = ?", (newspaper.name,)
+            )
+            newspaper_entity = Newspaper.model_validate(dict(cursor.fetchone()))
+
+        if newspaper_entity.id is not None:
+            self.cache.set_many({newspaper_entity.name: newspaper_entity.id})
+        return newspaper_entity
+
     def get(self, id: int) -> Optional[Newspaper]:
         with self.database.get_connection() as conn:
             cursor = conn.cursor()
@@ -48,18 +94,18 @@ class NewspaperRepository(BaseRepository[Newspaper]):
             return [Newspaper.model_validate(dict(row)) for row in cursor.fetchall()]
 
     def update(self, newspaper: Newspaper) -> Newspaper:
-        with self.database.get_connection() as conn:
+        with self.database.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 "UPDATE newspaper SET name = ?, url = ? WHERE id = ?",
                 (newspaper.name, newspaper.url, newspaper.id),
             )
-            conn.commit()
+            self.cache.clear()
             return newspaper
 
     def delete(self, id: int) -> bool:
-        with self.database.get_connection() as conn:
+        with self.database.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM newspaper WHERE id = ?", (id,))
-            conn.commit()
+            self.cache.clear()
             return cursor.rowcount > 0
@@ -0,0 +1,158 @@
+from typing import Optional
+
+from ..database import Database
+from ..entity.outbox_message import OutboxMessage
+from .base_repository import BaseRepository
+
+COLUMNS = """id, newspaper_id, chat_id, message, status, attempts, next_attempt_at,
+             last_error, created_at, sent_at"""
+
+
+class OutboxRepository(BaseRepository[OutboxMessage]):
+    def __init__(self, database: Database):
+        self.database = database
+
+    def create(self, message: OutboxMessage) -> OutboxMessage:
+        return message.model_copy(update={"id": self.create_many([message])[0]})
+
+    def create_many(self, messages: list[OutboxMessage]) -> list[int]:
+        """
+        Insert the messages in the current transaction and return their ids in the
+        same order
+        """
+        ids = []
+        with self.database.transaction() as conn:
+            cursor = conn.cursor()
+            for message in messages:
+                cursor.execute(
+                    """INSERT INTO outbox
+                       (newspaper_id, chat_id, message, status, attempts,
+                        next_attempt_at)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (
+                        message.newspaper_id,
+                        message.chat_id,
+                        message.message,
+                        message.status,
+                        message.attempts,
+                        message.next_attempt_at,
+                    ),
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def get(self, id: int) -> Optional[OutboxMessage]:
+        with self.database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {COLUMNS} FROM outbox WHERE id = ?", (id,))
+            row = cursor.fetchone()
+            if row:
+                return OutboxMessage.model_validate(dict(row))
+            return None
+
+    def get_all(self) -> list[OutboxMessage]:
+        with self.database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {COLUMNS} FROM outbox")
+            return [
+                OutboxMessage.model_validate(dict(row)) for row in cursor.fetchall()
+            ]
+
+    def get_due(self, now: float, limit: int) -> list[OutboxMessage]:
+        """
+        Return the pending messages that can be sent, oldest first. A message is
+        not due while an older message of the same chat waits for a retry, so that
+        every chat receives them in order.
+        """
+        with self.database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""SELECT {COLUMNS} FROM outbox o
+                    WHERE status = 'pending' AND next_attempt_at <= ?
+                      AND NOT EXISTS (
+                          SELECT 1 FROM outbox p
+                          WHERE p.status = 'pending' AND p.chat_id = o.chat_id
+                            AND p.id < o.id AND p.next_attempt_at > ?
+                      )
+                    ORDER BY id LIMIT ?""",
+                (now, now, limit),
+            )
+            return [
+                OutboxMessage.model_validate(dict(row)) for row in cursor.fetchall()
+            ]
+
+    def count_by_status(self) -> dict[str, int]:
+        with self.database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")
+            return {row[0]: row[1] for row in cursor.fetchall()}
+
+    def next_attempt_at(self, after: float) -> Optional[float]:
+        """
+        Return the first time after the provided one at which a pending message
+        can be sent again
+        """
+        with self.database.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT MIN(next_attempt_at) FROM outbox
+                   WHERE status = 'pending' AND next_attempt_at > ?""",
+                (after,),
+            )
+            return cursor.fetchone()[0]
+
+    def mark_sent(self, id: int) -> None:
+        with self.database.transaction() as conn:
+            conn.execute(
+                """UPDATE outbox
+                   SET status = 'sent', attempts = attempts + 1, last_error = NULL,
+                       sent_at = CURRENT_TIMESTAMP
+                   WHERE id = ?""",
+                (id,),
+            )
+
+    def mark_attempt_failed(
+        self, id: int, error: str, next_attempt_at: float | None
+    ) -> None:
+        """
+        Record a failed attempt. Without a next attempt the message is given up.
+        """
+        with self.database.transaction() as conn:
+            conn.execute(
+                """UPDATE outbox
+                   SET status = ?, attempts = attempts + 1, last_error = ?,
+                       next_attempt_at = COALESCE(?, next_attempt_at)
+                   WHERE id = ?""",
+                (
+                    "pending" if next_attempt_at is not None else "failed",
+                    error,
+                    next_attempt_at,
+                    id,
+                ),
+            )
+
+    def update(self, message: OutboxMessage) -> OutboxMessage:
+        with self.database.transaction() as conn:
+            conn.execute(
+                """UPDATE outbox
+                   SET newspaper_id = ?, chat_id = ?, message = ?, status = ?,
+                       attempts = ?, next_attempt_at = ?, last_error = ?
+                   WHERE id = ?""",
+                (
+                    message.newspaper_id,
+                    message.chat_id,
+                    message.message,
+                    message.status,
+                    message.attempts,
+                    message.next_attempt_at,
+                    message.last_error,
+                    message.id,
+                ),
+            )
+            return message
+
+    def delete(self, id: int) -> bool:
+        with self.database.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM outbox WHERE id = ?", (id,))
+            return cursor.rowcount > 0
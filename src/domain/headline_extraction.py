@@ -0,0 +1,28 @@
+from pydantic import BaseModel, ConfigDict, model_validator
+
+
+class HeadlineExtractionSpec(BaseModel):
+    """
+    Declarative description of where the headlines of a page are and how they are
+    cleaned
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    # XPath and/or CSS selector of the elements containing the headlines
+    xpath: str | None = None
+    selector: str | None = None
+    # Headlines containing any of these texts (case insensitive) are skipped
+    exclude_texts: tuple[str, ...] = ()
+    # Headlines matching any of these regular expressions are skipped
+    exclude_patterns: tuple[str, ...] = ()
+    normalize_whitespace: bool = True
+    # Return every headline only once, keeping the first occurrence
+    deduplicate: bool = True
+    min_length: int = 1
+
+    @model_validator(mode="after")
+    def _check_locator(self) -> "HeadlineExtractionSpec":
+        if self.xpath is None and self.selector is None:
+            raise ValueError("An xpath or a selector must be provided")
+        return self
@@ -9,3 +9,22 @@ class ExtractedNews(BaseModel):
     """
 
     news: list[Article]
+
+
+class CompactArticle(BaseModel):
+    """
+    Classification of a numbered headline that does not repeat its title
+    """
+
+    index: int
+    category_id: int
+    translation: str
+    description: str
+
+
+class CompactExtractedNews(BaseModel):
+    """
+    Representation of the compact classification of a batch of news
+    """
+
+    news: list[CompactArticle]
@@ -1,6 +1,8 @@
-from typing import Callable, Optional
+from typing import Callable, Literal, Optional
 
-from pydantic import Field, BaseModel
+from pydantic import Field, BaseModel, model_validator
+
+from src.domain.headline_extraction import HeadlineExtractionSpec
 
 
 class Newspaper(BaseModel):
@@ -11,4 +13,36 @@ class Newspaper(BaseModel):
     name: str
     url: str
     access_hook: Optional[Callable] = Field(default=None)
-    extract_data_hook: Callable
+    # Custom function returning the headlines. Prefer `extraction` when possible
+    extract_data_hook: Optional[Callable] = Field(default=None)
+    # Declarative extraction evaluated in a single call to the browser
+    extraction: Optional[HeadlineExtractionSpec] = Field(default=None)
+    # Event that playwright waits for after opening the url
+    wait_until: Literal["commit", "domcontentloaded", "load", "networkidle"] = Field(
+        default="domcontentloaded"
+    )
+    # Resource types to abort while scraping. None uses the default blocklist
+    blocked_resource_types: Optional[list[str]] = Field(default=None)
+    # Hosts blocked in addition to the default ad and tracker hosts
+    blocked_hosts: list[str] = Field(default_factory=list)
+    # Hosts that are never blocked, e.g. a consent manager
+    allowed_hosts: list[str] = Field(default_factory=list)
+    # Download the html over HTTP and only use the browser if nothing is found. It
+    # requires an `extraction` with an xpath
+    static_mode: bool = Field(default=False)
+    # Keep cookies and local storage between runs, e.g. to remember the consent
+    persist_storage_state: bool = Field(default=True)
+    # Schedule of the newspaper in daemon mode, every few seconds or with a cron
+    # expression. Without any of them the default schedule of the daemon is used
+    schedule_interval_seconds: Optional[float] = Field(default=None, gt=0)
+    schedule_cron: Optional[str] = Field(default=None)
+
+    @model_validator(mode="after")
+    def _check_extraction(self) -> "Newspaper":
+        if self.extract_data_hook is None and self.extraction is None:
+            raise ValueError(f"{self.name} needs an extract_data_hook or extraction")
+        if self.static_mode and (self.extraction is None or not self.extraction.xpath):
+            raise ValueError(f"{self.name} needs an extraction xpath for static_mode")
+        if self.schedule_interval_seconds is not None and self.schedule_cron:
+            raise ValueError(f"{self.name} can not have an interval and a cron")
+        return self
@@ -0,0 +1,27 @@
+from pydantic import BaseModel
+
+
+class ClusteredHeadline(BaseModel):
+    """
+    Headline of a newspaper that belongs to a story
+    """
+
+    newspaper: str
+    title: str
+
+
+class StoryCluster(BaseModel):
+    """
+    Headlines of different newspapers describing the same story. The first one is
+    the representative that is classified by the AI.
+    """
+
+    headlines: list[ClusteredHeadline]
+
+    @property
+    def representative(self) -> ClusteredHeadline:
+        return self.headlines[0]
+
+    @property
+    def linked(self) -> list[ClusteredHeadline]:
+        return self.headlines[1:]
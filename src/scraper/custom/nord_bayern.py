@@ -1,35 +1,33 @@
-import time
-from playwright.sync_api import Page
+from loguru import logger
+from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
 
+from src.domain.headline_extraction import HeadlineExtractionSpec
 
-def accept_nord_bayern_cookies(page: Page):
-    """
-    Close the cookies of the page to be able to read the content
-    """
-    element = page.locator("div#cmpwrapper >> #cmpwelcomebtnyes")
-
-    if element is None:
-        print("Cookies not found")
-        return
-
-    element.click()
-    # Wait till JS is executed
-    time.sleep(0.5)
+NORD_BAYERN_HEADLINES = HeadlineExtractionSpec(
+    xpath="//*[(self::h6 or self::h2) and contains(@class, 'headline')] | //h5[contains(@class,'headline') and not(following-sibling::p[text()='anzeige'] or preceding-sibling::p[contains(text(),'Anzeige')])]",
+)
+# Prefix of the cookies set by the consent manager once the consent is given
+CONSENT_COOKIE_PREFIX = "__cmpcons"
+# Time the consent dialog has to appear before assuming that there is none
+CONSENT_TIMEOUT_MS = 5000
 
 
-def extract_nord_bayern_headlines(page: Page) -> list[str] | None:
+def accept_nord_bayern_cookies(page: Page):
     """
     Close the cookies of the page to be able to read the content
     """
-    elements = page.query_selector_all(
-        "xpath=//*[(self::h6 or self::h2) and contains(@class, 'headline')] | //h5[contains(@class,'headline') and not(following-sibling::p[text()='anzeige'] or preceding-sibling::p[contains(text(),'Anzeige')])]"
-    )
+    if any(x["name"].startswith(CONSENT_COOKIE_PREFIX) for x in page.context.cookies()):
+        logger.debug("Cookies were already accepted")
+        return
 
-    if elements is None:
-        return None
+    wrapper = page.locator("div#cmpwrapper")
+    element = wrapper.locator("#cmpwelcomebtnyes")
 
-    data = []
-    for element in elements:
-        data.append(element.inner_text())
+    try:
+        element.click(timeout=CONSENT_TIMEOUT_MS)
+    except PlaywrightTimeoutError:
+        logger.debug("Cookies not found")
+        return
 
-    return data
+    # Wait till the dialog is removed by its JS
+    wrapper.wait_for(state="hidden")
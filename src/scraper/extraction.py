@@ -0,0 +1,120 @@
+"""
+Generic extraction of headlines described by a declarative specification. The same
+specification is evaluated inside the browser with a single round trip or against
+a parsed html tree when the page is read without browser.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any
+
+from lxml.html import HtmlElement
+from playwright.sync_api import Page
+
+from src.domain.headline_extraction import HeadlineExtractionSpec
+
+EXTRACT_SCRIPT = """
+(spec) => {
+    const nodes = [];
+    if (spec.xpath) {
+        const result = document.evaluate(
+            spec.xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+        );
+        for (let i = 0; i < result.snapshotLength; i++) {
+            nodes.push(result.snapshotItem(i));
+        }
+    }
+    if (spec.selector) {
+        nodes.push(...document.querySelectorAll(spec.selector));
+    }
+
+    const excludedTexts = spec.exclude_texts.map((x) => x.toLowerCase());
+    const excludedPatterns = spec.exclude_patterns.map((x) => new RegExp(x, "i"));
+    const seen = new Set();
+    const data = [];
+    for (const node of nodes) {
+        let text = node.innerText ?? node.textContent ?? "";
+        if (spec.normalize_whitespace) {
+            text = text.replace(/\\s+/g, " ").trim();
+        }
+        if (text.length < spec.min_length) {
+            continue;
+        }
+        const lowerText = text.toLowerCase();
+        if (excludedTexts.some((x) => lowerText.includes(x))) {
+            continue;
+        }
+        if (excludedPatterns.some((x) => x.test(text))) {
+            continue;
+        }
+        if (spec.deduplicate) {
+            if (seen.has(text)) {
+                continue;
+            }
+            seen.add(text);
+        }
+        data.push(text);
+    }
+    return data;
+}
+"""
+
+
+class HeadlineExtractor:
+    """
+    Compiled version of a HeadlineExtractionSpec. Use `compile` to reuse the
+    extractor of a specification.
+    """
+
+    spec: HeadlineExtractionSpec
+
+    def __init__(self, spec: HeadlineExtractionSpec):
+        self.spec = spec
+        self._arguments: dict[str, Any] = spec.model_dump()
+        self._excluded_texts = [x.lower() for x in spec.exclude_texts]
+        self._excluded_patterns = [
+            re.compile(x, re.IGNORECASE) for x in spec.exclude_patterns
+        ]
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def compile(spec: HeadlineExtractionSpec) -> "HeadlineExtractor":
+        """
+        Return the extractor of the specification, creating it only once
+        """
+        return HeadlineExtractor(spec)
+
+    def extract(self, page: Page) -> list[str]:
+        """
+        Return all the headlines of the page with a single call to the browser
+        """
+        return page.evaluate(EXTRACT_SCRIPT, self._arguments)
+
+    def extract_from_tree(self, tree: HtmlElement) -> list[str]:
+        """
+        Return the headlines of an already parsed html document. Only the xpath of
+        the specification is supported.
+        """
+        if self.spec.xpath is None:
+            raise ValueError("Extraction without browser requires an xpath")
+
+        seen = set()
+        data = []
+        for element in tree.xpath(self.spec.xpath):
+            text = element if isinstance(element, str) else element.text_content()
+            if self.spec.normalize_whitespace:
+                text = " ".join(text.split())
+            if len(text) < self.spec.min_length:
+                continue
+            lower_text = text.lower()
+            if any(x in lower_text for x in self._excluded_texts):
+                continue
+            if any(x.search(text) for x in self._excluded_patterns):
+                continue
+            if self.spec.deduplicate:
+                if text in seen:
+                    continue
+                seen.add(text)
+            data.append(text)
+
+        return data
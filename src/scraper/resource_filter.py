@@ -0,0 +1,136 @@
+from urllib.parse import urlparse
+
+from loguru import logger
+from playwright.sync_api import Route
+
+from src.domain.newspaper import Newspaper
+
+# Resources that are not needed to read the text of a page
+DEFAULT_BLOCKED_RESOURCE_TYPES = ["image", "font", "media"]
+
+# Advertising and tracking hosts. Subdomains are blocked as well.
+DEFAULT_BLOCKED_HOSTS = [
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googletagservices.com",
+    "googletagmanager.com",
+    "google-analytics.com",
+    "adservice.google.com",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "criteo.com",
+    "criteo.net",
+    "taboola.com",
+    "outbrain.com",
+    "rubiconproject.com",
+    "pubmatic.com",
+    "casalemedia.com",
+    "smartadserver.com",
+    "yieldlab.net",
+    "scorecardresearch.com",
+    "chartbeat.com",
+    "chartbeat.net",
+    "facebook.net",
+    "ioam.de",
+    "hotjar.com",
+]
+
+
+class ResourceFilter:
+    """
+    Abort the requests of a browser context that are not needed to extract the news
+    """
+
+    blocked_resource_types: set[str]
+    blocked_hosts: list[str]
+    allowed_hosts: list[str]
+    blocked_requests: int
+    allowed_requests: int
+    blocked_by_type: dict[str, int]
+
+    def __init__(
+        self,
+        blocked_resource_types: list[str] | None = None,
+        blocked_hosts: list[str] | None = None,
+        allowed_hosts: list[str] | None = None,
+    ):
+        """
+        * blocked_resource_types: playwright resource types to abort
+        * blocked_hosts: hosts whose requests are aborted, including subdomains
+        * allowed_hosts: hosts that are never blocked by host
+        """
+        if blocked_resource_types is None:
+            blocked_resource_types = DEFAULT_BLOCKED_RESOURCE_TYPES
+        if blocked_hosts is None:
+            blocked_hosts = DEFAULT_BLOCKED_HOSTS
+
+        self.blocked_resource_types = set(blocked_resource_types)
+        self.blocked_hosts = [x.lower() for x in blocked_hosts]
+        self.allowed_hosts = [x.lower() for x in allowed_hosts or []]
+        self.blocked_requests = 0
+        self.allowed_requests = 0
+        self.blocked_by_type = {}
+
+    @classmethod
+    def for_newspaper(cls, newspaper: Newspaper) -> "ResourceFilter":
+        """
+        Build the filter applying the overrides configured in the newspaper
+        """
+        return cls(
+            blocked_resource_types=newspaper.blocked_resource_types,
+            blocked_hosts=DEFAULT_BLOCKED_HOSTS + newspaper.blocked_hosts,
+            allowed_hosts=newspaper.allowed_hosts,
+        )
+
+    @staticmethod
+    def _matches_host(host: str, patterns: list[str]) -> bool:
+        """
+        Check if the host is one of the patterns or a subdomain of them
+        """
+        return any(host == x or host.endswith("." + x) for x in patterns)
+
+    def is_blocked(self, url: str, resource_type: str) -> bool:
+        """
+        Decide if a request shall be aborted
+        """
+        if resource_type in self.blocked_resource_types:
+            return True
+
+        host = (urlparse(url).hostname or "").lower()
+        if self._matches_host(host, self.allowed_hosts):
+            return False
+
+        return self._matches_host(host, self.blocked_hosts)
+
+    def handle_route(self, route: Route) -> None:
+        """
+        Playwright route handler
+        """
+        request = route.request
+        if self.is_blocked(request.url, request.resource_type):
+            self.blocked_requests += 1
+            self.blocked_by_type[request.resource_type] = (
+                self.blocked_by_type.get(request.resource_type, 0) + 1
+            )
+            route.abort()
+            return
+
+        self.allowed_requests += 1
+        route.continue_()
+
+    def log_stats(self, name: str) -> None:
+        """
+        Print how many requests were blocked
+        """
+        logger.debug(
+            f"{name}: blocked {self.blocked_requests} requests "
+            f"({self.blocked_by_type}), allowed {self.allowed_requests}"
+        )
+
+    def reset_stats(self) -> None:
+        """
+        Start counting again, e.g. before the next run of the same context
+        """
+        self.blocked_requests = 0
+        self.allowed_requests = 0
+        self.blocked_by_type = {}
@@ -1,11 +1,49 @@
 import os
+import queue
+import threading
 import time
-from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Optional
 from loguru import logger
+from pydantic import ValidationError
 
 from src.domain.article import Article
-from src.domain.news import ExtractedNews
-from src.ai.provider.base import AIModelProtocol
+from src.domain.news import CompactArticle, CompactExtractedNews, ExtractedNews
+from src.ai.json_stream import JsonListItemParser
+from src.ai.provider.base import (
+    AIModelProtocol,
+    ModelResponse,
+    RateLimitError,
+    StreamingAIModelProtocol,
+)
+from src.ai.batcher import TokenBudgetBatcher
+from src.ai.tokens import estimate_tokens
+from src.db.fingerprint import normalize_headline
+from src.utils.metrics import metrics
+from src.utils.rate_limiter import RateLimiter
+
+# Seconds waited after a 429 without Retry-After header
+DEFAULT_RETRY_AFTER_SECONDS = 60
+# Categories offered to the model in the compact mode
+DEFAULT_CATEGORIES = [
+    "german politics",
+    "international politics",
+    "economy",
+    "sport",
+    "science",
+    "technology",
+    "health",
+    "culture",
+    "crime",
+    "local",
+    "weather",
+    "tabloid",
+    "celebrities",
+    "lifestyle",
+    "other",
+]
+# Quotes that the model may add or remove around a headline it repeats
+HEADLINE_QUOTES = "\"'`«»‹›“”„‘’‚"
 
 
 class AiService:
@@ -17,26 +55,79 @@ class AiService:
     news: list[Article]
     batch_size: int
     mock_response: bool
+    max_concurrency: int
+    max_retries: int
+    rate_limiter: RateLimiter | None
+    batcher: TokenBudgetBatcher
+    compact_output: bool
+    stream_output: bool
+    categories: list[str]
+    metric_labels: dict[str, str]
 
     def __init__(
-        self, model: AIModelProtocol, batch_size=10, mock_response=False
+        self,
+        model: AIModelProtocol,
+        batch_size=10,
+        mock_response=False,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        rate_limiter: RateLimiter | None = None,
+        batcher: TokenBudgetBatcher | None = None,
+        compact_output: bool = False,
+        categories: list[str] | None = None,
+        stream_output: bool = False,
+        metric_labels: dict[str, str] | None = None,
     ) -> None:
         """
         Initialize the library with the provided model
+
+        * batch_size: maximum number of news of a batch when no batcher is provided
+        * max_concurrency: number of batches sent to the model at the same time
+        * max_retries: times a batch is sent again after a rate limit error
+        * rate_limiter: limiter shared with other services using the same model
+        * batcher: groups the news in batches by their tokens, sharing what it
+          learns about the size of the responses
+        * compact_output: the model answers with the index of every headline and
+          the id of its category instead of repeating the title
+        * categories: vocabulary of categories used in the compact mode
+        * stream_output: read the responses while they are generated and return
+          every article as soon as it is complete, if the model supports it
+        * metric_labels: labels of the metrics of the requests, e.g. the newspaper
         """
         self.model = model
         self.news = []
         self.batch_size = batch_size
         self.mock_response = mock_response
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.rate_limiter = rate_limiter
+        self.batcher = (
+            batcher
+            if batcher is not None
+            else TokenBudgetBatcher(max_batch_size=batch_size)
+        )
+        self.compact_output = compact_output
+        self.categories = categories if categories is not None else DEFAULT_CATEGORIES
+        self.stream_output = stream_output
+        self.metric_labels = metric_labels if metric_labels is not None else {}
+        self.stats = {
+            "batches": 0,
+            "latency_seconds": 0.0,
+            "completion_tokens": 0,
+            "estimated_saved_output_tokens": 0,
+            "first_article_seconds": None,
+            "total_seconds": 0.0,
+        }
+        self._stats_lock = threading.Lock()
 
-    def _mock_news_response(self) -> None:
+    def _mock_news_response(self) -> list[Article]:
         """
         In order to save money during development use an old response to return a mock of the obtained data
         """
         with open(
             os.path.join("src", "ai", "mock", "example.json"), mode="r", encoding="utf8"
         ) as f:
-            self.news = ExtractedNews.model_validate_json(f.read()).news
+            return ExtractedNews.model_validate_json(f.read()).news
 
     def classify_news(
         self, content: str | list[str], queries_per_minute: Optional[int] = 20
@@ -44,9 +135,124 @@ class AiService:
         """
         This method will find the news in the provided content and save them inside this class
 
-        * rate_sec indicates how many requests can be done until 1 minute es waited
+        * queries_per_minute: requests allowed per minute when the service has no
+          shared rate_limiter
+        """
+        for batch_news in self.classify_news_stream(content, queries_per_minute):
+            self.news.extend(batch_news)
+
+    def classify_news_stream(
+        self, content: str | list[str], queries_per_minute: Optional[int] = 20
+    ) -> Iterator[list[Article]]:
+        """
+        Classify the news and yield the articles of every batch as soon as it and
+        the previous batches are answered, keeping the order of the content. When
+        the output is streamed the articles are yielded as soon as they are
+        complete, in the order they are received.
+
+        * queries_per_minute: requests allowed per minute when the service has no
+          shared rate_limiter
+        """
+        system_prompt = (
+            self._get_compact_system_prompt()
+            if self.compact_output
+            else self._get_system_prompt()
+        )
+        if self.mock_response is True:
+            yield self._mock_news_response()
+            return
+
+        if isinstance(content, str):
+            content = [content]
+
+        rate_limiter = self.rate_limiter
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(queries_per_minute)
+
+        batches = self.batcher.create_batches(content)
+        start = time.perf_counter()
+
+        if self.stream_output and isinstance(self.model, StreamingAIModelProtocol):
+            results = self._classify_batches_streaming(
+                batches, system_prompt, rate_limiter
+            )
+        else:
+            results = self._classify_batches(batches, system_prompt, rate_limiter)
+
+        for batch_news in results:
+            for article in batch_news:
+                article.category = article.category.lower()
+            if self.stats["first_article_seconds"] is None and len(batch_news) > 0:
+                self.stats["first_article_seconds"] = time.perf_counter() - start
+            yield batch_news
+
+        self.stats["total_seconds"] += time.perf_counter() - start
+        logger.debug(f"A total of {self.model.used_tokens} tokens were used")
+        if self.stats["first_article_seconds"] is not None:
+            logger.debug(
+                f"First article after {self.stats['first_article_seconds']:.2f}s, "
+                f"all of them after {self.stats['total_seconds']:.2f}s"
+            )
+        if self.compact_output:
+            logger.debug(f"Compact classification stats: {self.stats}")
+
+    def _classify_batches(
+        self,
+        batches: list[list[str]],
+        system_prompt: str,
+        rate_limiter: RateLimiter,
+    ) -> Iterator[list[Article]]:
+        """
+        Classify the batches concurrently and yield them in order
+        """
+        # The results are returned in the order of the batches
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            yield from executor.map(
+                lambda x: self._classify_batch(x, system_prompt, rate_limiter),
+                batches,
+            )
+
+    def _classify_batches_streaming(
+        self,
+        batches: list[list[str]],
+        system_prompt: str,
+        rate_limiter: RateLimiter,
+    ) -> Iterator[list[Article]]:
         """
-        system_prompt = """\
+        Classify the batches concurrently and yield the articles of all of them as
+        soon as they are received
+        """
+        results: queue.Queue[list[Article] | Future] = queue.Queue()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = [
+                executor.submit(
+                    self._classify_batch_streaming,
+                    x,
+                    system_prompt,
+                    rate_limiter,
+                    results.put,
+                )
+                for x in batches
+            ]
+            # The finished future tells that the batch has no more articles
+            for future in futures:
+                future.add_done_callback(results.put)
+
+            remaining = len(futures)
+            while remaining > 0:
+                result = results.get()
+                if isinstance(result, Future):
+                    remaining -= 1
+                    # Raise the errors of the batch
+                    result.result()
+                    continue
+                yield result
+
+    def _get_system_prompt(self) -> str:
+        """
+        Prompt of the classification that returns complete articles
+        """
+        return """\
         - You are in charge of organizing the news provided by the user.
         - Extract and return a list of news, each defined by a title and a brief description that is not sensationalism but objective.
         - Make a summary translation to english.
@@ -55,41 +261,371 @@ class AiService:
         - Make sure you do not miss any translation and that the category is in english.
         - Format the output as a JSON list of News objects.
         """
-        if self.mock_response is True:
-            self._mock_news_response()
-            return
 
-        if isinstance(content, str):
-            content = [content]
+    def _get_compact_system_prompt(self) -> str:
+        """
+        Prompt of the classification that refers to the headlines by their index
+        """
+        categories = "\n".join(f"{i}: {x}" for i, x in enumerate(self.categories))
+        return f"""\
+        - You are in charge of organizing the numbered news headlines provided by the user.
+        - For every headline return its index, a brief description that is not sensationalism but objective and a summary translation to english.
+        - Assign every headline the id of one of these categories:
+        {categories}
+        - Do not repeat the headlines and do not skip any index.
+        """
+
+    def _build_article(
+        self, news_batch: list[str], compact: CompactArticle
+    ) -> Article | None:
+        """
+        Rebuild the article of a compact answer from the scraped headline
+        """
+        if compact.index < 0 or compact.index >= len(news_batch):
+            logger.warning(f"The AI returned an unknown index {compact.index}")
+            return None
+
+        if 0 <= compact.category_id < len(self.categories):
+            category = self.categories[compact.category_id]
+        else:
+            category = "other"
+
+        return Article(
+            title=news_batch[compact.index],
+            description=compact.description,
+            category=category,
+            english_translation=compact.translation,
+        )
+
+    def _build_articles(self, news_batch: list[str], content: str) -> list[Article]:
+        """
+        Rebuild the articles of a compact response from the scraped headlines. A
+        repeated index only keeps its first article.
+        """
+        articles: list[Article] = []
+        seen: set[int] = set()
+        for compact in CompactExtractedNews.model_validate_json(content).news:
+            if compact.index in seen:
+                logger.warning(f"The AI repeated the index {compact.index}")
+                continue
+            article = self._build_article(news_batch, compact)
+            if article is not None:
+                seen.add(compact.index)
+                articles.append(article)
+
+        return articles
+
+    @staticmethod
+    def _headline_key(headline: str) -> str:
+        """
+        Return the headline without the changes of case, whitespace and quoting
+        that the model may make when it repeats it
+        """
+        return normalize_headline(headline).strip(HEADLINE_QUOTES + " ")
 
-        counter = 0
-        for i in range(0, len(content), self.batch_size):
-            news_batch = content[i : i + self.batch_size]
+    def _parse_streamed_article(
+        self, news_batch: list[str], headline_indices: dict[str, int], item: Any
+    ) -> tuple[int | None, Article] | None:
+        """
+        Build the article of an object of the streamed response and find the index
+        of its headline in the batch. An article whose title matches a headline
+        takes the scraped headline as title.
+        """
+        try:
+            if self.compact_output:
+                compact = CompactArticle.model_validate(item)
+                article = self._build_article(news_batch, compact)
+                return (compact.index, article) if article is not None else None
+            article = Article.model_validate(item)
+        except ValidationError as e:
+            logger.warning(f"The AI returned an invalid article: {e}")
+            return None
+
+        index = headline_indices.get(self._headline_key(article.title))
+        if index is None:
+            return None, article
+        return index, article.model_copy(update={"title": news_batch[index]})
+
+    def _get_batch_prompt(self, news_batch: list[str]) -> tuple[str, type]:
+        """
+        Return the text sent to the model for the batch and the format of its
+        response
+        """
+        if self.compact_output:
+            news_text = "\n".join(f"{i}. {x}" for i, x in enumerate(news_batch))
+            return news_text, CompactExtractedNews
+        return "\n".join(news_batch), ExtractedNews
+
+    def _estimate_batch_tokens(
+        self, news_batch: list[str], news_text: str, system_prompt: str
+    ) -> int:
+        """
+        Input and expected output tokens of the request of a batch
+        """
+        input_tokens = estimate_tokens(news_text)
+        return (
+            estimate_tokens(system_prompt)
+            + input_tokens
+            + self.batcher.estimate_output_tokens(input_tokens, len(news_batch))
+        )
+
+    def _record_batch_stats(
+        self, news_batch: list[str], latency: float, usage: dict | None
+    ) -> None:
+        """
+        Track the latency of a batch and estimate the output tokens saved by not
+        repeating the titles. Only the tokens of the titles are counted, the
+        response of the full schema is not measured.
+        """
+        completion_tokens = usage["completion_tokens"] if usage is not None else 0
+        saved_tokens = sum(estimate_tokens(x) for x in news_batch)
 
-            news_text = "\n".join(news_batch)
+        with self._stats_lock:
+            self.stats["batches"] += 1
+            self.stats["latency_seconds"] += latency
+            self.stats["completion_tokens"] += completion_tokens
+            self.stats["estimated_saved_output_tokens"] += saved_tokens
 
-            response = self.model.generate(
-                news_text, system_prompt=system_prompt, response_format=ExtractedNews
+        if completion_tokens > 0:
+            saved_seconds = latency / completion_tokens * saved_tokens
+            logger.debug(
+                f"Batch of {len(news_batch)} news took {latency:.2f}s, "
+                f"an estimated ~{saved_tokens} output tokens (~{saved_seconds:.2f}s) "
+                "saved by not repeating the titles"
             )
 
+    def _classify_batch(
+        self, news_batch: list[str], system_prompt: str, rate_limiter: RateLimiter
+    ) -> list[Article]:
+        """
+        Send a single batch to the model respecting the rate limits
+        """
+        news_text, response_format = self._get_batch_prompt(news_batch)
+        estimated_tokens = self._estimate_batch_tokens(
+            news_batch, news_text, system_prompt
+        )
+
+        for attempt in range(self.max_retries + 1):
+            waited = rate_limiter.acquire(estimated_tokens)
+            if waited > 0:
+                logger.debug(f"Waited {waited:.1f}s for the AI rate limit")
+                metrics.increment(
+                    "ai_rate_limit_wait_seconds", waited, **self.metric_labels
+                )
+
+            start = time.perf_counter()
+            try:
+                response = self.model.generate(
+                    news_text,
+                    system_prompt=system_prompt,
+                    response_format=response_format,
+                )
+            except RateLimitError as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = e.retry_after or DEFAULT_RETRY_AFTER_SECONDS
+                logger.warning(f"AI rate limit reached, retrying in {retry_after}s")
+                metrics.increment("ai_retries", **self.metric_labels)
+                rate_limiter.pause(retry_after)
+                continue
+
             logger.trace(response.content)
             logger.trace(response.metadata)
             logger.trace(response.raw_response)
-            logger.trace(type(response.content))
-            logger.trace(type(response.metadata))
-            logger.trace(type(response.raw_response))
 
-            self.news = (
-                self.news + ExtractedNews.model_validate_json(response.content).news
+            if not self._record_response(
+                news_batch, response, estimated_tokens, start, rate_limiter
+            ):
+                return self._classify_truncated_batch(
+                    news_batch, system_prompt, rate_limiter
+                )
+
+            if self.compact_output:
+                return self._build_articles(news_batch, response.content)
+
+            return ExtractedNews.model_validate_json(response.content).news
+
+        raise RuntimeError("The batch could not be classified")
+
+    def _record_response(
+        self,
+        news_batch: list[str],
+        response: ModelResponse,
+        estimated_tokens: int,
+        start: float,
+        rate_limiter: RateLimiter,
+    ) -> bool:
+        """
+        Record the usage of the response of a batch. Return False if the response
+        was truncated.
+        """
+        metadata = response.metadata or {}
+        usage = metadata.get("usage")
+        labels = self.metric_labels
+        metrics.observe("ai_batch", time.perf_counter() - start, **labels)
+        if metadata.get("cached"):
+            # Cached responses do not consume the quota of the provider
+            rate_limiter.record_usage(estimated_tokens, 0)
+            metrics.increment("ai_cache_hits", **labels)
+        else:
+            metrics.increment("ai_cache_misses", **labels)
+            if usage is not None:
+                rate_limiter.record_usage(estimated_tokens, usage["total_tokens"])
+                metrics.increment("ai_prompt_tokens", usage["prompt_tokens"], **labels)
+                metrics.increment(
+                    "ai_completion_tokens", usage["completion_tokens"], **labels
+                )
+
+        if metadata.get("finish_reason") == "length":
+            metrics.increment("ai_truncated_responses", **labels)
+            return False
+
+        if usage is not None and not metadata.get("cached"):
+            self.batcher.record_usage(news_batch, usage["completion_tokens"])
+
+        if self.compact_output and not metadata.get("cached"):
+            self._record_batch_stats(news_batch, time.perf_counter() - start, usage)
+
+        return True
+
+    def _classify_batch_streaming(
+        self,
+        news_batch: list[str],
+        system_prompt: str,
+        rate_limiter: RateLimiter,
+        emit: Callable[[list[Article]], None],
+    ) -> None:
+        """
+        Send a single batch to the model respecting the rate limits and emit every
+        article as soon as its object is closed in the response
+        """
+        assert isinstance(self.model, StreamingAIModelProtocol)
+        news_text, response_format = self._get_batch_prompt(news_batch)
+        estimated_tokens = self._estimate_batch_tokens(
+            news_batch, news_text, system_prompt
+        )
+        headline_indices = {
+            self._headline_key(x): i for i, x in reversed(list(enumerate(news_batch)))
+        }
+        # Headlines of the batch already emitted, by index, and titles of the
+        # emitted articles that match none of them
+        emitted: set[int] = set()
+        emitted_titles: set[str] = set()
+
+        for attempt in range(self.max_retries + 1):
+            waited = rate_limiter.acquire(estimated_tokens)
+            if waited > 0:
+                logger.debug(f"Waited {waited:.1f}s for the AI rate limit")
+                metrics.increment(
+                    "ai_rate_limit_wait_seconds", waited, **self.metric_labels
+                )
+
+            start = time.perf_counter()
+            first_article_seconds = None
+            parser = JsonListItemParser("news")
+            stream = self.model.generate_stream(
+                news_text, system_prompt=system_prompt, response_format=response_format
             )
-            counter += 1
-            if queries_per_minute is not None and counter % queries_per_minute == 0:
-                time.sleep(60)
+            try:
+                while True:
+                    articles = []
+                    for item in parser.feed(next(stream)):
+                        parsed = self._parse_streamed_article(
+                            news_batch, headline_indices, item
+                        )
+                        if parsed is None:
+                            continue
+                        index, article = parsed
+                        if index is None:
+                            key = self._headline_key(article.title)
+                            if key in emitted_titles:
+                                continue
+                            emitted_titles.add(key)
+                        elif index in emitted:
+                            logger.warning(f"The AI repeated the headline {index}")
+                            continue
+                        else:
+                            emitted.add(index)
+                        articles.append(article)
+                    if len(articles) == 0:
+                        continue
+                    if first_article_seconds is None:
+                        first_article_seconds = time.perf_counter() - start
+                        metrics.observe(
+                            "ai_first_article",
+                            first_article_seconds,
+                            **self.metric_labels,
+                        )
+                    emit(articles)
+            except StopIteration as e:
+                response: ModelResponse = e.value
+            except RateLimitError as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = e.retry_after or DEFAULT_RETRY_AFTER_SECONDS
+                logger.warning(f"AI rate limit reached, retrying in {retry_after}s")
+                metrics.increment("ai_retries", **self.metric_labels)
+                rate_limiter.pause(retry_after)
+                continue
 
-        for article in self.news:
-            article.category = article.category.lower()
+            logger.trace(response.content)
+            logger.trace(response.metadata)
+            if first_article_seconds is not None:
+                logger.debug(
+                    f"Batch of {len(news_batch)} news streamed its first article "
+                    f"after {first_article_seconds:.2f}s and finished after "
+                    f"{time.perf_counter() - start:.2f}s"
+                )
 
-        logger.debug(f"A total of {self.model.used_tokens} tokens were used")
+            if not self._record_response(
+                news_batch, response, estimated_tokens, start, rate_limiter
+            ):
+                # The complete articles were already emitted, only the rest is
+                # classified again
+                articles = []
+                remaining = [x for i, x in enumerate(news_batch) if i not in emitted]
+                logger.warning(
+                    f"Streamed response of a batch of {len(news_batch)} news was "
+                    f"truncated, classifying the {len(remaining)} missing ones again"
+                )
+                if len(remaining) == len(news_batch):
+                    articles = self._classify_truncated_batch(
+                        news_batch, system_prompt, rate_limiter
+                    )
+                elif len(remaining) > 0:
+                    articles = self._classify_batch(
+                        remaining, system_prompt, rate_limiter
+                    )
+                emit(
+                    [
+                        x
+                        for x in articles
+                        if self._headline_key(x.title) not in emitted_titles
+                    ]
+                )
+            return
+
+        raise RuntimeError("The batch could not be classified")
+
+    def _classify_truncated_batch(
+        self, news_batch: list[str], system_prompt: str, rate_limiter: RateLimiter
+    ) -> list[Article]:
+        """
+        Split a batch whose response was cut by the length limit and classify both
+        halves
+        """
+        if len(news_batch) == 1:
+            logger.error(f"The response of '{news_batch[0]}' is too long, skipping it")
+            return []
+
+        middle = len(news_batch) // 2
+        logger.warning(
+            f"Response of a batch of {len(news_batch)} news was truncated, "
+            "splitting it"
+        )
+        return self._classify_batch(
+            news_batch[:middle], system_prompt, rate_limiter
+        ) + self._classify_batch(news_batch[middle:], system_prompt, rate_limiter)
 
     def _get_filtered_categories(self) -> list[str] | None:
         """
@@ -109,6 +645,15 @@ class AiService:
         if filtered_categories is None:
             return None
 
-        self.news = [
-            x for x in self.news if x.category.lower() not in filtered_categories
-        ]
+        self.news = self.filter_articles_by_category(self.news)
+
+    def filter_articles_by_category(self, articles: list[Article]) -> list[Article]:
+        """
+        Return the articles whose category is not filtered
+        """
+        filtered_categories = self._get_filtered_categories()
+
+        if filtered_categories is None:
+            return articles
+
+        return [x for x in articles if x.category.lower() not in filtered_categories]
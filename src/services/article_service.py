@@ -1,6 +1,13 @@
 import os
 from loguru import logger
 from src.db.entity.news import News
+from src.db.fingerprint import headline_fingerprint
+from src.db.minhash import (
+    headline_minhash_values,
+    minhash_bands,
+    minhash_similarity,
+    unpack_signature,
+)
 from src.domain.article import Article
 from src.db.repository.news_repository import NewsRepository
 from src.db.database import Database
@@ -34,6 +41,29 @@ class ArticleService:
 
         return news.id
 
+    def save_articles(
+        self, articles: list[Article], category_ids: dict[str, int], newspaper_id: int
+    ) -> list[int]:
+        """
+        Save all the articles in a single statement and return their ids
+
+        * category_ids: id of the category of every article by category name
+        """
+        logger.debug(f"Saving {len(articles)} articles in the database...")
+
+        return self.article_repository.create_many(
+            [
+                News(
+                    newspaper_id=newspaper_id,
+                    category_id=category_ids[article.category.lower()],
+                    article=article.title,
+                    description=article.description,
+                    translation=article.english_translation,
+                )
+                for article in articles
+            ]
+        )
+
     def exists_article(self, article_title: str) -> bool:
         """
         Find the article in the database
@@ -44,6 +74,71 @@ class ArticleService:
 
         return True
 
+    def filter_new_articles(
+        self, article_titles: list[str], newspaper_id: int | None = None
+    ) -> list[str]:
+        """
+        Return the articles that are not stored in the database yet, keeping their
+        order. Headlines differing only in case or whitespace are the same article.
+
+        * newspaper_id: only compare with the articles of this newspaper
+        """
+        fingerprints = [headline_fingerprint(x) for x in article_titles]
+        existing = self.article_repository.get_existing_fingerprints(
+            fingerprints, newspaper_id
+        )
+
+        articles: list[str] = []
+        for title, fingerprint in zip(article_titles, fingerprints):
+            if fingerprint in existing:
+                continue
+            existing.add(fingerprint)
+            articles.append(title)
+
+        return articles
+
+    def filter_near_duplicates(
+        self,
+        article_titles: list[str],
+        min_similarity: float = 0.8,
+        newspaper_id: int | None = None,
+    ) -> list[str]:
+        """
+        Remove the headlines that are almost equal to a stored one or to a previous
+        headline of the list, e.g. with an edited word or punctuation. Only the
+        headlines sharing a band of their MinHash signature are compared.
+
+        * min_similarity: estimated Jaccard similarity of the shingles of two
+          headlines from which they are the same article
+        * newspaper_id: only compare with the articles of this newspaper
+        """
+        values = headline_minhash_values(article_titles)
+        signatures = [unpack_signature(x) for x, _ in values]
+        bands = [x for _, x in values]
+        candidates = self.article_repository.get_minhash_candidates(bands, newspaper_id)
+
+        # Band index of the stored candidates and the accepted headlines of the list
+        index: dict[int, list[list[int]]] = {}
+        for candidate in candidates:
+            for value in minhash_bands(candidate):
+                index.setdefault(value, []).append(candidate)
+
+        articles: list[str] = []
+        for title, signature, title_bands in zip(article_titles, signatures, bands):
+            duplicate = any(
+                minhash_similarity(signature, x) >= min_similarity
+                for value in title_bands
+                for x in index.get(value, [])
+            )
+            if duplicate:
+                logger.debug(f"Skipping near duplicate headline '{title}'")
+                continue
+            for value in title_bands:
+                index.setdefault(value, []).append(signature)
+            articles.append(title)
+
+        return articles
+
     def _get_max_number_of_news_per_newspaper(self) -> int:
         """
         Return the api key from the environment variable
@@ -1,9 +1,10 @@
-from datetime import datetime
-
 from loguru import logger
 
 from src.domain.article import Article
+from src.domain.story_cluster import ClusteredHeadline
+from src.services.outbox_service import OutboxService
 from src.telegram.bot import TelegramBot
+from src.telegram.digest import DigestRenderer
 
 
 class BroadcastService:
@@ -11,33 +12,47 @@ class BroadcastService:
     Class in charge of sending the news across the configured channels
     """
 
-    def __init__(self, telegram_bot: TelegramBot):
+    def __init__(
+        self,
+        telegram_bot: TelegramBot,
+        digest_renderer: DigestRenderer | None = None,
+        outbox_service: OutboxService | None = None,
+    ):
+        """
+        * outbox_service: store the messages to be delivered by its worker instead
+          of sending them right away
+        """
         self.telegram_bot = telegram_bot
+        self.outbox_service = outbox_service
+        self.digest_renderer = (
+            digest_renderer if digest_renderer is not None else DigestRenderer()
+        )
 
-    def broadcast_news(self, newspaper_name: str, news: list[Article]) -> None:
+    def broadcast_news(
+        self,
+        newspaper_name: str,
+        news: list[Article],
+        related_headlines: dict[str, list[ClusteredHeadline]] | None = None,
+        newspaper_id: int | None = None,
+    ) -> None:
         """
-        Displayed the articles that were provided
+        Displayed the articles that were provided. With an outbox the messages are
+        only stored, call it in the transaction that saves the articles.
+
+        * related_headlines: headlines of other newspapers about the same story by
+          article title, shown in the entry of the article
+        * newspaper_id: id of the newspaper stored with the outbox messages
         """
         logger.info(f"Sending broadcast message with the news of {newspaper_name}...")
 
-        categories = set([x.category for x in news])
+        logger.debug(
+            f"The following categories were found: {set(x.category for x in news)}"
+        )
 
-        logger.debug(f"The following categories were found: {categories}")
+        messages = self.digest_renderer.render(newspaper_name, news, related_headlines)
+        logger.debug(f"{len(news)} articles packed in {len(messages)} messages")
 
-        self.telegram_bot.broadcast_message(
-            f"""**News from {newspaper_name} ({datetime.now().strftime(r"%Y-%m-%d")}):**"""
-        )
-        for category in sorted(categories):
-            self.telegram_bot.broadcast_message(f"""### {category.capitalize()}\n\n""")
-            for index, article in enumerate(
-                sorted(
-                    filter(lambda x: x.category == category, news),
-                    key=lambda x: x.title,
-                ),
-                start=1,
-            ):
-                self.telegram_bot.broadcast_message(
-                    f"{index}. *{article.english_translation}*\n"
-                    f"- *Original title:* {article.title}\n"
-                    f"- *Description:* {article.description}"
-                )
+        if self.outbox_service is not None:
+            self.outbox_service.enqueue(messages, newspaper_id)
+        else:
+            self.telegram_bot.broadcast_messages(messages)
@@ -1,7 +1,6 @@
 from loguru import logger
 
 from src.db.database import Database
-from src.db.entity.category import Category
 from src.db.repository.category_repository import CategoryRepository
 
 
@@ -15,11 +14,27 @@ class CategoryService:
 
     def save_category(self, category_name: str) -> int:
         logger.debug(f"Saving category '{category_name}' in the database...")
-        category = self.category_repository.get_by_name(category_name)
-        if category is None:
-            category = self.category_repository.create(Category(name=category_name))
+        ids = self.category_repository.get_or_create_ids([category_name])
 
-        if category.id is None:
+        if category_name not in ids:
             raise RuntimeError("The category could not be saved")
 
-        return category.id
+        return ids[category_name]
+
+    def save_categories(self, category_names: list[str]) -> dict[str, int]:
+        """
+        Save all the categories at once and return the id of every name
+        """
+        logger.debug(f"Saving categories {category_names} in the database...")
+        ids = self.category_repository.get_or_create_ids(category_names)
+
+        if len(ids) != len(set(category_names)):
+            raise RuntimeError("The categories could not be saved")
+
+        return ids
+
+    def warm_cache(self) -> None:
+        """
+        Load the ids of all the categories so that saving them needs no queries
+        """
+        self.category_repository.warm_cache()
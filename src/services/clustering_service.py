@@ -0,0 +1,151 @@
+import re
+import threading
+import zlib
+
+import numpy as np
+from loguru import logger
+
+from src.db.fingerprint import normalize_headline
+from src.domain.story_cluster import ClusteredHeadline, StoryCluster
+
+
+class ClusteringService:
+    """
+    Group the headlines of a run that describe the same story in different
+    newspapers, as the newspapers arrive. Headlines are vectorized with the hashing
+    trick and weighted with TF-IDF, so the words that are common in the run count
+    less than names and places.
+    """
+
+    min_similarity: float
+    n_features: int
+    batch_size: int
+    clusters: list[StoryCluster]
+
+    def __init__(
+        self,
+        min_similarity: float = 0.5,
+        n_features: int = 4096,
+        char_ngram_size: int = 4,
+        batch_size: int = 512,
+    ):
+        """
+        * min_similarity: cosine similarity from which two headlines are the same
+          story
+        * n_features: size of the hashed vectors
+        * char_ngram_size: size of the character n-grams added to the words, they
+          match inflected and translated names
+        * batch_size: headlines compared at the same time
+        """
+        self.min_similarity = min_similarity
+        self.n_features = n_features
+        self.char_ngram_size = char_ngram_size
+        self.batch_size = batch_size
+        self.clusters = []
+        self._titles: list[str] = []
+        self._representative_rows: list[int] = []
+        # The stories are grouped and read by different stages of the pipeline
+        self._lock = threading.Lock()
+
+    def _features(self, headline: str) -> list[int]:
+        """
+        Hashed indices of the words and character n-grams of the headline
+        """
+        words = re.findall(r"\w{2,}", normalize_headline(headline))
+        size = self.char_ngram_size
+
+        tokens = [f"w:{x}" for x in words]
+        for word in words:
+            tokens.extend(
+                f"c:{word[i : i + size]}" for i in range(len(word) - size + 1)
+            )
+
+        return [zlib.crc32(x.encode("utf8")) % self.n_features for x in tokens]
+
+    def vectorize(self, headlines: list[str]) -> np.ndarray:
+        """
+        Return the L2 normalized TF-IDF vectors of the headlines, one per row
+        """
+        vectors = np.zeros((len(headlines), self.n_features), dtype=np.float32)
+        for row, headline in enumerate(headlines):
+            np.add.at(vectors[row], self._features(headline), 1)
+
+        document_frequency = np.count_nonzero(vectors, axis=0)
+        idf = np.log((1 + len(headlines)) / (1 + document_frequency)) + 1
+        vectors *= idf.astype(np.float32)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+    def add(self, newspaper: str, titles: list[str]) -> list[StoryCluster]:
+        """
+        Group the headlines of a newspaper with the most similar story of the
+        previous newspapers of the run and return the story of every headline. A
+        story has at most one headline of each newspaper and the headline of the
+        first newspaper is its representative.
+        """
+        if len(titles) == 0:
+            return []
+
+        with self._lock:
+            stories = self._add(newspaper, titles)
+
+        linked = sum(1 for x in stories if x.representative.newspaper != newspaper)
+        logger.debug(
+            f"{linked} of {len(titles)} headlines of {newspaper} were already "
+            "reported by other newspapers"
+        )
+
+        return stories
+
+    def _add(self, newspaper: str, titles: list[str]) -> list[StoryCluster]:
+        stories: list[StoryCluster] = []
+        first_row = len(self._titles)
+        self._titles.extend(titles)
+        # The weights of the words change with every newspaper of the run
+        vectors = self.vectorize(self._titles)
+        representative_rows = list(self._representative_rows)
+        representatives = vectors[representative_rows]
+
+        for start in range(first_row, len(self._titles), self.batch_size):
+            end = min(start + self.batch_size, len(self._titles))
+            similarities = vectors[start:end] @ representatives.T
+
+            for row in range(start, end):
+                headline = ClusteredHeadline(
+                    newspaper=newspaper, title=self._titles[row]
+                )
+                candidates = similarities[row - start]
+                best_cluster = None
+                for index in np.argsort(-candidates):
+                    if candidates[index] < self.min_similarity:
+                        break
+                    cluster = self.clusters[index]
+                    if all(x.newspaper != newspaper for x in cluster.headlines):
+                        best_cluster = cluster
+                        break
+
+                if best_cluster is None:
+                    best_cluster = StoryCluster(headlines=[headline])
+                    self.clusters.append(best_cluster)
+                    self._representative_rows.append(row)
+                else:
+                    best_cluster.headlines.append(headline)
+                stories.append(best_cluster)
+
+        return stories
+
+    def related_headlines(
+        self, newspaper: str, stories: list[StoryCluster]
+    ) -> dict[str, list[ClusteredHeadline]]:
+        """
+        Return the headlines of the other newspapers grouped so far with the stories
+        that the newspaper reported first, by its headline
+        """
+        with self._lock:
+            return {
+                story.representative.title: list(story.linked)
+                for story in stories
+                if story.representative.newspaper == newspaper and len(story.linked) > 0
+            }
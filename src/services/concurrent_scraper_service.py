@@ -0,0 +1,320 @@
+import queue
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from loguru import logger
+
+from src.domain.newspaper import Newspaper
+from src.scraper.resource_filter import ResourceFilter
+from src.services.scraper_service import BrowserPool, ScraperService
+from src.services.static_scraper_service import StaticScraperService
+from src.utils.metrics import metrics
+
+
+@dataclass
+class _ScrapeTask:
+    newspaper: Newspaper
+    future: Future = field(default_factory=Future)
+    started_at: float | None = None
+    worker: "_ScraperWorker | None" = None
+
+
+class _ScraperWorker(threading.Thread):
+    """
+    Thread owning its own browser. Playwright's sync API can not share a browser
+    between threads, so every worker launches one and reuses it for all its tasks.
+    The context and page of every newspaper are also kept between runs, so pages
+    are only replaced when they reach the limits of navigations or memory.
+    """
+
+    def __init__(self, tasks: queue.Queue, service: "ConcurrentScraperService"):
+        super().__init__(daemon=True)
+        self.tasks = tasks
+        self.service = service
+        self.abandoned = False
+        self.browser_pool = BrowserPool(
+            headed=service.headed,
+            max_navigations_per_page=service.max_navigations_per_page,
+            max_page_memory_mb=service.max_page_memory_mb,
+        )
+        self.scrapers: dict[str, ScraperService] = {}
+
+    def _get_scraper(self, newspaper: Newspaper) -> ScraperService:
+        """
+        Return the scraper of the newspaper, opening its context the first time
+        """
+        scraper_service = self.scrapers.get(newspaper.name)
+        if scraper_service is None:
+            scraper_service = ScraperService(
+                self.browser_pool,
+                mock_extract_news=self.service.mock_extract_news,
+                timeout_seconds=self.service.timeout_seconds,
+                resource_filter=(
+                    ResourceFilter.for_newspaper(newspaper)
+                    if self.service.block_resources
+                    else None
+                ),
+                storage_state_path=self.service.get_storage_state_path(newspaper),
+            )
+            self.scrapers[newspaper.name] = scraper_service
+        return scraper_service
+
+    def _close_scraper(self, name: str) -> None:
+        """
+        Close the context of a newspaper, e.g. after its page failed
+        """
+        scraper_service = self.scrapers.pop(name, None)
+        if scraper_service is None:
+            return
+
+        try:
+            scraper_service.close()
+        except Exception as e:
+            logger.warning(f"Error closing the browser context of {name}: {e}")
+
+    def _scrape(self, task: _ScrapeTask) -> list[str] | None:
+        """
+        Extract the news of a single newspaper. Static newspapers are downloaded
+        without browser and only fall back to it if nothing is found.
+        """
+        newspaper = task.newspaper
+        if newspaper.static_mode and not self.service.mock_extract_news:
+            text = self.service.static_scraper_service.extract_news(newspaper)
+            if text is not None:
+                return text
+            logger.info(f"Static extraction of {newspaper.name} found nothing")
+
+        scraper_service = self._get_scraper(newspaper)
+        try:
+            return scraper_service.extract_news(newspaper)
+        except Exception:
+            # The page may be left in any state, the next run starts a new one
+            self._close_scraper(newspaper.name)
+            raise
+
+    def run(self) -> None:
+        try:
+            while not self.abandoned:
+                task = self.tasks.get()
+                if self.abandoned:
+                    # Abandoned while waiting: the task, or the stop signal that
+                    # `close` sends to a live worker, belongs to another worker
+                    self.tasks.put(task)
+                    break
+                if task is None:
+                    break
+
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+
+                task.worker = self
+                task.started_at = time.monotonic()
+                try:
+                    with metrics.span("scrape", newspaper=task.newspaper.name):
+                        task.future.set_result(self._scrape(task))
+                except Exception as e:
+                    task.future.set_exception(e)
+        finally:
+            for name in list(self.scrapers):
+                self._close_scraper(name)
+            self.browser_pool.close()
+
+
+class ConcurrentScraperService:
+    """
+    Scrape several newspapers at the same time with a limited number of browsers
+    """
+
+    max_concurrency: int
+    timeout_seconds: float
+    headed: bool
+    mock_extract_news: bool
+    block_resources: bool
+    storage_state_dir: Path | None
+    static_scraper_service: StaticScraperService
+
+    def __init__(
+        self,
+        max_concurrency: int = 2,
+        timeout_seconds: float = 60,
+        headed: bool = False,
+        max_navigations_per_page: int | None = 20,
+        max_page_memory_mb: int | None = 512,
+        mock_extract_news: bool = False,
+        block_resources: bool = True,
+        storage_state_dir: str | None = None,
+    ):
+        """
+        Configure the service. The workers are started lazily on the first scrape.
+
+        * max_concurrency: number of sites loaded at the same time
+        * timeout_seconds: time a single site may take before it is skipped
+        * block_resources: abort images, fonts, media and ad/tracker requests
+        * storage_state_dir: folder where the browser storage of each newspaper is
+          persisted between runs
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.headed = headed
+        self.max_navigations_per_page = max_navigations_per_page
+        self.max_page_memory_mb = max_page_memory_mb
+        self.mock_extract_news = mock_extract_news
+        self.block_resources = block_resources
+        self.storage_state_dir = (
+            Path(storage_state_dir) if storage_state_dir is not None else None
+        )
+        self.static_scraper_service = StaticScraperService(
+            timeout_seconds=timeout_seconds, max_connections=max_concurrency
+        )
+        self._tasks: queue.Queue = queue.Queue()
+        self._workers: list[_ScraperWorker] = []
+
+    def get_storage_state_path(self, newspaper: Newspaper) -> Path | None:
+        """
+        Return the file where the browser storage of the newspaper is saved
+        """
+        if self.storage_state_dir is None or not newspaper.persist_storage_state:
+            return None
+
+        file_name = re.sub(r"[^a-z0-9]+", "_", newspaper.name.lower()).strip("_")
+        return self.storage_state_dir / f"{file_name}.json"
+
+    def _start_worker(self) -> None:
+        """
+        Add a new worker to the pool
+        """
+        worker = _ScraperWorker(self._tasks, self)
+        worker.start()
+        self._workers.append(worker)
+
+    def start(self) -> None:
+        """
+        Start the workers that are missing
+        """
+        self._workers = [x for x in self._workers if x.is_alive()]
+        while len(self._workers) < self.max_concurrency:
+            self._start_worker()
+
+    def _abandon_worker(self, worker: _ScraperWorker, replace: bool = True) -> None:
+        """
+        Replace a hung worker by a new one, unless `replace` is False. The hung
+        thread exits as soon as its current task finishes.
+        """
+        worker.abandoned = True
+        if worker in self._workers:
+            self._workers.remove(worker)
+        if replace:
+            self._start_worker()
+
+    def scrape_iter(
+        self,
+        newspapers: list[Newspaper],
+        stop_event: threading.Event | None = None,
+    ) -> Iterator[tuple[Newspaper, list[str] | None]]:
+        """
+        Extract the news of all the newspapers and yield every newspaper as soon as
+        it finishes. Sites that fail or exceed the timeout yield None without
+        delaying the rest. Closing the iterator cancels the newspapers that are
+        still queued.
+
+        * stop_event: once it is set nothing else is yielded and the sites being
+          scraped are abandoned, so that a shutdown does not wait for them
+        """
+        self.start()
+
+        tasks = [_ScrapeTask(newspaper) for newspaper in newspapers]
+        for task in tasks:
+            self._tasks.put(task)
+
+        pending = {task.future: task for task in tasks}
+        try:
+            while pending:
+                done, _ = wait(pending.keys(), timeout=0.5, return_when=FIRST_COMPLETED)
+                if stop_event is not None and stop_event.is_set():
+                    self._abandon_running(pending.values())
+                    return
+
+                for future in done:
+                    task = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Error scraping {task.newspaper.name}: {e}")
+                        metrics.increment(
+                            "scrape_errors", newspaper=task.newspaper.name
+                        )
+                        result = None
+                    yield task.newspaper, result
+
+                now = time.monotonic()
+                for future, task in list(pending.items()):
+                    if task.started_at is None or task.worker is None:
+                        continue
+                    if future.done():
+                        # Finished after the wait, it is yielded on the next one
+                        continue
+                    if now - task.started_at < self.timeout_seconds:
+                        continue
+
+                    logger.warning(
+                        f"Scraping {task.newspaper.name} exceeded "
+                        f"{self.timeout_seconds}s and will be skipped"
+                    )
+                    pending.pop(future)
+                    metrics.increment("scrape_timeouts", newspaper=task.newspaper.name)
+                    self._abandon_worker(task.worker)
+                    yield task.newspaper, None
+        finally:
+            # The caller stopped iterating, e.g. on shutdown: the newspapers that
+            # no worker has started yet are not scraped
+            cancelled = sum(future.cancel() for future in pending)
+            if cancelled > 0:
+                logger.info(f"{cancelled} newspapers were not scraped")
+
+    def _abandon_running(self, tasks: Iterable[_ScrapeTask]) -> None:
+        """
+        Leave the sites being scraped to their workers, which exit when they finish
+        them, without waiting for them when the service is closed
+        """
+        abandoned: list[str] = []
+        for task in tasks:
+            if task.worker is None or not task.future.running():
+                continue
+            self._abandon_worker(task.worker, replace=False)
+            abandoned.append(task.newspaper.name)
+
+        if len(abandoned) > 0:
+            logger.info(f"Stop requested, {', '.join(abandoned)} are abandoned")
+
+    def scrape(self, newspapers: list[Newspaper]) -> dict[str, list[str] | None]:
+        """
+        Extract the news of all the newspapers. Sites that fail or exceed the
+        timeout return None without delaying the rest.
+        """
+        results: dict[str, list[str] | None] = {x.name: None for x in newspapers}
+        for newspaper, result in self.scrape_iter(newspapers):
+            results[newspaper.name] = result
+
+        return results
+
+    def close(self) -> None:
+        """
+        Stop the workers and close their browsers
+        """
+        for _ in self._workers:
+            self._tasks.put(None)
+
+        for worker in self._workers:
+            worker.join(timeout=self.timeout_seconds)
+
+        self._workers = []
+        self._tasks = queue.Queue()
+        self.static_scraper_service.close()
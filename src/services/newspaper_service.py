@@ -16,13 +16,12 @@ class NewspaperService:
 
     def save_newspaper(self, newspaper: Newspaper) -> int:
         logger.debug(f"Saving newspaper '{newspaper.name}' in the database...")
-        newspaper_entity = self.newspaper_repository.get_by_name(newspaper.name)
-        if newspaper_entity is None:
-            newspaper_entity = self.newspaper_repository.create(
-                NewspaperEntity(name=newspaper.name, url=newspaper.url)
-            )
-
-        if newspaper_entity.id is None:
-            raise RuntimeError("The newspaper could not be saved")
-
-        return newspaper_entity.id
+        return self.newspaper_repository.get_or_create_id(
+            NewspaperEntity(name=newspaper.name, url=newspaper.url)
+        )
+
+    def warm_cache(self) -> None:
+        """
+        Load the ids of all the newspapers so that saving them needs no queries
+        """
+        self.newspaper_repository.warm_cache()
@@ -0,0 +1,259 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from src.db.database import Database
+from src.db.entity.outbox_message import OutboxMessage
+from src.db.repository.newspaper_repository import NewspaperRepository
+from src.db.repository.outbox_repository import OutboxRepository
+from src.telegram.bot import TelegramBot
+from src.utils.metrics import metrics
+
+
+class OutboxService:
+    """
+    Deliver the messages stored in the outbox. Messages are written in the same
+    transaction as the articles they announce, so a crash never loses them, and a
+    background worker sends them with a status and a number of attempts per chat
+    and message. Failed messages are retried with exponential backoff.
+
+    Delivery is at least once: a message is marked as sent after Telegram accepts
+    it, so a crash between both steps, or a response lost after the message was
+    delivered, sends it again on the next attempt.
+    """
+
+    outbox_repository: OutboxRepository
+    newspaper_repository: NewspaperRepository
+    telegram_bot: TelegramBot
+    max_attempts: int
+    base_backoff_seconds: float
+    max_backoff_seconds: float
+    batch_size: int
+    poll_seconds: float
+
+    def __init__(
+        self,
+        db: Database,
+        telegram_bot: TelegramBot,
+        max_attempts: int = 8,
+        base_backoff_seconds: float = 30,
+        max_backoff_seconds: float = 3600,
+        batch_size: int = 200,
+        poll_seconds: float = 30,
+    ):
+        """
+        * max_attempts: attempts before a message is marked as failed
+        * base_backoff_seconds: wait after the first failed attempt, doubled after
+          every following one up to max_backoff_seconds
+        * batch_size: messages read from the outbox at once
+        * poll_seconds: time the worker sleeps when nothing is due
+        """
+        self.outbox_repository = OutboxRepository(db)
+        self.newspaper_repository = NewspaperRepository(db)
+        self.telegram_bot = telegram_bot
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._wake_up = threading.Event()
+        self._stopping = threading.Event()
+        self._worker: threading.Thread | None = None
+        # Shared by the threads delivering every chat
+        self._newspaper_names: dict[int | None, str] = {}
+        self._newspaper_names_lock = threading.Lock()
+
+    def enqueue(self, messages: list[str], newspaper_id: int | None = None) -> None:
+        """
+        Store the messages for every chat. Call it inside the transaction that
+        saves the articles.
+        """
+        self.outbox_repository.create_many(
+            [
+                OutboxMessage(newspaper_id=newspaper_id, chat_id=chat_id, message=x)
+                for chat_id in self.telegram_bot.get_chat_ids()
+                for x in messages
+            ]
+        )
+
+    def notify(self) -> None:
+        """
+        Tell the worker that there are new messages
+        """
+        self._wake_up.set()
+
+    def _get_backoff(self, attempts: int) -> float:
+        return min(
+            self.base_backoff_seconds * 2 ** (attempts - 1), self.max_backoff_seconds
+        )
+
+    def _get_newspaper_name(self, newspaper_id: int | None) -> str:
+        """
+        Name of the newspaper of a message, used to label its metrics
+        """
+        with self._newspaper_names_lock:
+            name = self._newspaper_names.get(newspaper_id)
+            if name is None:
+                newspaper = (
+                    self.newspaper_repository.get(newspaper_id)
+                    if newspaper_id is not None
+                    else None
+                )
+                name = newspaper.name if newspaper is not None else "unknown"
+                self._newspaper_names[newspaper_id] = name
+            return name
+
+    def _deliver_chat(
+        self, messages: list[OutboxMessage], deadline: float | None = None
+    ) -> int:
+        """
+        Send the messages of a chat in order, stopping at the first failure so that
+        the following ones are not delivered before it. Messages are left pending
+        when the worker is stopping or the deadline (monotonic time) has passed.
+        Return the sent messages.
+        """
+        sent = 0
+        for message in messages:
+            if message.id is None:
+                continue
+            if self._stopping.is_set() or self._expired(deadline):
+                break
+
+            newspaper = self._get_newspaper_name(message.newspaper_id)
+            with metrics.span("telegram_send", newspaper=newspaper):
+                try:
+                    error = self.telegram_bot.send_message(
+                        message.chat_id, message.message
+                    )
+                except Exception as e:
+                    # Counted as a failed attempt so that the message waits for its
+                    # backoff instead of being sent again on every poll
+                    logger.exception(f"Unexpected error sending message {message.id}")
+                    error = repr(e)
+            if error is None:
+                self.outbox_repository.mark_sent(message.id)
+                metrics.increment("telegram_sent", newspaper=newspaper)
+                sent += 1
+                continue
+
+            metrics.increment("telegram_failed_attempts", newspaper=newspaper)
+
+            attempts = message.attempts + 1
+            next_attempt_at = None
+            if attempts < self.max_attempts:
+                next_attempt_at = time.time() + self._get_backoff(attempts)
+                logger.warning(
+                    f"Message {message.id} to chat {message.chat_id} failed, "
+                    f"retrying in {self._get_backoff(attempts):.0f}s: {error}"
+                )
+            else:
+                logger.error(
+                    f"Message {message.id} to chat {message.chat_id} failed "
+                    f"{attempts} times and is given up: {error}"
+                )
+            self.outbox_repository.mark_attempt_failed(
+                message.id, error, next_attempt_at
+            )
+            break
+
+        return sent
+
+    @staticmethod
+    def _expired(deadline: float | None) -> bool:
+        return deadline is not None and time.monotonic() >= deadline
+
+    def deliver_due(self, deadline: float | None = None) -> int:
+        """
+        Send a batch of the messages that are due, every chat in parallel. Return
+        the number of messages read from the outbox.
+
+        * deadline: monotonic time after which no more messages are sent
+        """
+        messages = self.outbox_repository.get_due(time.time(), self.batch_size)
+        if len(messages) == 0:
+            return 0
+
+        by_chat: dict[str, list[OutboxMessage]] = {}
+        for message in messages:
+            by_chat.setdefault(message.chat_id, []).append(message)
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.telegram_bot.max_concurrency, len(by_chat))
+        ) as executor:
+            sent = sum(
+                executor.map(
+                    lambda x: self._deliver_chat(x, deadline), by_chat.values()
+                )
+            )
+
+        logger.debug(f"{sent} of {len(messages)} outbox messages were delivered")
+        return len(messages)
+
+    def drain(self, timeout_seconds: float | None = None) -> None:
+        """
+        Deliver all the messages that are due now. With a timeout the messages that
+        could not be sent in time stay pending for the next start.
+        """
+        deadline = None
+        if timeout_seconds is not None:
+            deadline = time.monotonic() + timeout_seconds
+
+        while not self._stopping.is_set() and self.deliver_due(deadline) > 0:
+            if self._expired(deadline):
+                logger.warning(
+                    f"The outbox could not be delivered in {timeout_seconds}s, the "
+                    "rest of the messages are sent on the next start"
+                )
+                return
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            timeout = self.poll_seconds
+            try:
+                self.drain()
+
+                now = time.time()
+                next_attempt_at = self.outbox_repository.next_attempt_at(now)
+                if next_attempt_at is not None:
+                    timeout = min(timeout, next_attempt_at - now)
+            except Exception as e:
+                logger.error(f"Error delivering the outbox: {e}")
+
+            self._wake_up.wait(timeout)
+            self._wake_up.clear()
+
+    def start(self) -> None:
+        """
+        Start the background worker. Messages left by previous runs are delivered
+        right away.
+        """
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        self._stopping.clear()
+        self._worker = threading.Thread(
+            target=self._run, name="outbox-delivery", daemon=True
+        )
+        self._worker.start()
+
+    def stop(
+        self, drain: bool = True, drain_timeout_seconds: float | None = None
+    ) -> None:
+        """
+        Stop the worker. With drain the messages that are due are delivered first,
+        during drain_timeout_seconds at most, e.g. to exit before the process is
+        killed.
+        """
+        if self._worker is not None:
+            self._stopping.set()
+            self._wake_up.set()
+            self._worker.join()
+            self._worker = None
+            self._stopping.clear()
+
+        if drain:
+            self.drain(drain_timeout_seconds)
+
+        logger.info(f"Outbox: {self.outbox_repository.count_by_status()}")
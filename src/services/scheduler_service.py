@@ -0,0 +1,157 @@
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+from loguru import logger
+
+from src.domain.newspaper import Newspaper
+from src.utils.cron import CronExpression
+
+
+class SchedulerService:
+    """
+    Run the newspapers of a long-lived process on their own schedule. Due
+    newspapers are run together and runs never overlap: a newspaper is scheduled
+    again once its run finished, skipping the ticks missed meanwhile.
+    """
+
+    newspapers: list[Newspaper]
+    default_interval_seconds: float | None
+    default_cron: CronExpression | None
+    health_file: Path | None
+    stop_event: threading.Event
+
+    def __init__(
+        self,
+        newspapers: list[Newspaper],
+        run: Callable[[list[Newspaper], threading.Event], None],
+        default_interval_seconds: float | None = None,
+        default_cron: str | None = None,
+        health_file: str | None = None,
+    ):
+        """
+        * run: function processing the due newspapers. It should finish early when
+          the event is set
+        * default_interval_seconds, default_cron: schedule of the newspapers
+          without their own one, one of them is required
+        * health_file: json file updated after every run and while waiting, so
+          that an external probe can check that the process is alive
+        """
+        if default_interval_seconds is None and not default_cron:
+            raise ValueError("A default interval or cron expression is required")
+
+        self.newspapers = newspapers
+        self.run = run
+        self.default_interval_seconds = default_interval_seconds
+        self.default_cron = CronExpression(default_cron) if default_cron else None
+        self.health_file = Path(health_file) if health_file is not None else None
+        self.stop_event = threading.Event()
+        self._crons = {
+            x.name: CronExpression(x.schedule_cron)
+            for x in newspapers
+            if x.schedule_cron
+        }
+        self._health = {
+            "status": "starting",
+            "pid": os.getpid(),
+            "runs": 0,
+            "failed_runs": 0,
+            "last_error": None,
+            "newspapers": {},
+        }
+
+    def get_next_run(self, newspaper: Newspaper, after: datetime) -> datetime:
+        """
+        Return when the newspaper has to be run again
+        """
+        if newspaper.name in self._crons:
+            return self._crons[newspaper.name].next_after(after)
+        if newspaper.schedule_interval_seconds is not None:
+            return after + timedelta(seconds=newspaper.schedule_interval_seconds)
+        if self.default_cron is not None:
+            return self.default_cron.next_after(after)
+        return after + timedelta(seconds=self.default_interval_seconds or 0)
+
+    def _write_health(self, status: str) -> None:
+        """
+        Write the state of the scheduler atomically in the health file
+        """
+        self._health["status"] = status
+        self._health["updated_at"] = datetime.now().isoformat()
+        if self.health_file is None:
+            return
+
+        self.health_file.parent.mkdir(parents=True, exist_ok=True)
+        temporary_file = self.health_file.with_suffix(".tmp")
+        temporary_file.write_text(json.dumps(self._health, indent=2), encoding="utf8")
+        temporary_file.replace(self.health_file)
+
+    def stop(self, *_) -> None:
+        """
+        Stop the scheduler. A run in progress finishes the newspapers it started.
+        """
+        logger.info("Stopping the scheduler...")
+        self.stop_event.set()
+
+    def _run_due(self, due: list[Newspaper]) -> None:
+        logger.info(f"Running {', '.join(x.name for x in due)}")
+        self._write_health("running")
+        start = time.perf_counter()
+        try:
+            self.run(due, self.stop_event)
+            self._health["runs"] += 1
+            error = None
+        except Exception as e:
+            logger.exception(f"Scheduled run failed: {e}")
+            self._health["failed_runs"] += 1
+            self._health["last_error"] = str(e)
+            error = str(e)
+
+        for newspaper in due:
+            self._health["newspapers"][newspaper.name] = {
+                "last_run": datetime.now().isoformat(),
+                "last_run_seconds": round(time.perf_counter() - start, 1),
+                "last_error": error,
+            }
+
+    def run_forever(self, max_sleep_seconds: float = 30) -> None:
+        """
+        Run the newspapers when they are due until SIGTERM or SIGINT are received.
+        It has to be called from the main thread to handle the signals.
+
+        * max_sleep_seconds: maximum time between two updates of the health file
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        now = datetime.now()
+        # Every newspaper runs once when the daemon starts
+        next_runs = {x.name: now for x in self.newspapers}
+
+        while not self.stop_event.is_set():
+            now = datetime.now()
+            due = [x for x in self.newspapers if next_runs[x.name] <= now]
+
+            if len(due) > 0:
+                self._run_due(due)
+                finished_at = datetime.now()
+                for newspaper in due:
+                    next_runs[newspaper.name] = self.get_next_run(
+                        newspaper, finished_at
+                    )
+                    self._health["newspapers"][newspaper.name]["next_run"] = next_runs[
+                        newspaper.name
+                    ].isoformat()
+                continue
+
+            self._write_health("idle")
+            wait_seconds = (min(next_runs.values()) - now).total_seconds()
+            self.stop_event.wait(min(max(wait_seconds, 0), max_sleep_seconds))
+
+        self._write_health("stopped")
+        logger.info("Scheduler stopped")
@@ -1,34 +1,238 @@
-from typing import Any, Callable
-from playwright.sync_api import sync_playwright, Playwright, Browser, Page
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from loguru import logger
+from playwright.sync_api import (
+    sync_playwright,
+    Playwright,
+    Browser,
+    BrowserContext,
+    Page,
+)
+
+from src.domain.newspaper import Newspaper
+from src.scraper.extraction import HeadlineExtractor
+from src.scraper.resource_filter import ResourceFilter
+from src.utils.metrics import metrics
+
+
+class BrowserPool:
+    """
+    Long-lived browser shared by all the newspapers. Each newspaper obtains its own
+    isolated context so that cookies and storage are not shared between sites.
+    """
+
+    playwright: Playwright | None
+    browser: Browser | None
+    headed: bool
+    max_navigations_per_page: int | None
+    max_page_memory_mb: int | None
+    timings: dict[str, list[float]]
+
+    def __init__(
+        self,
+        headed: bool = False,
+        max_navigations_per_page: int | None = 20,
+        max_page_memory_mb: int | None = 512,
+    ):
+        """
+        Configure the pool. The browser is launched lazily the first time a context
+        is requested.
+
+        * max_navigations_per_page: number of `goto` calls after which a page is
+          replaced by a new one. Pages are reused when the scraper of a newspaper is
+          kept between runs.
+        * max_page_memory_mb: JS heap size after which a page is replaced by a new one
+        """
+        self.playwright = None
+        self.browser = None
+        self.headed = headed
+        self.max_navigations_per_page = max_navigations_per_page
+        self.max_page_memory_mb = max_page_memory_mb
+        self.timings = {}
+
+    def _record_timing(self, name: str, start: float) -> None:
+        """
+        Save the time elapsed since start under the provided name
+        """
+        elapsed = time.perf_counter() - start
+        self.timings.setdefault(name, []).append(elapsed)
+        logger.debug(f"Browser pool '{name}' took {elapsed:.3f}s")
+
+    def start(self) -> None:
+        """
+        Launch the browser if it is not running yet
+        """
+        if self.browser is not None:
+            return
+
+        start = time.perf_counter()
+        self.playwright = sync_playwright().start()
+        self.browser = self.playwright.chromium.launch(headless=self.headed is False)
+        self._record_timing("browser_open", start)
+
+    def new_context(self, **kwargs) -> BrowserContext:
+        """
+        Return a new isolated context of the shared browser
+        """
+        self.start()
+        assert self.browser is not None
+
+        start = time.perf_counter()
+        context = self.browser.new_context(**kwargs)
+        self._record_timing("context_open", start)
+        return context
+
+    def close_context(self, context: BrowserContext) -> None:
+        """
+        Close a context obtained with `new_context`
+        """
+        start = time.perf_counter()
+        context.close()
+        self._record_timing("context_close", start)
+
+    def should_recycle_page(
+        self, navigations: int, get_memory_mb: Callable[[], Optional[float]]
+    ) -> bool:
+        """
+        Check if a page has been used enough to be replaced by a fresh one. The
+        memory is only measured when the number of navigations does not decide it.
+
+        * navigations: `goto` calls done by the page
+        * get_memory_mb: return the used JS heap of the page, None if unknown
+        """
+        max_navigations = self.max_navigations_per_page
+        if max_navigations is not None and navigations >= max_navigations:
+            return True
+
+        max_memory = self.max_page_memory_mb
+        if max_memory is not None and navigations > 0:
+            memory = get_memory_mb()
+            if memory is not None and memory >= max_memory:
+                return True
+
+        return False
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """
+        Return the number of calls and total time of every tracked operation
+        """
+        return {
+            name: {"count": len(values), "total_seconds": sum(values)}
+            for name, values in self.timings.items()
+        }
+
+    def close(self) -> None:
+        """
+        Close the browser and stop playwright
+        """
+        if self.browser is None or self.playwright is None:
+            return
+
+        start = time.perf_counter()
+        self.browser.close()
+        self.playwright.stop()
+        self.browser = None
+        self.playwright = None
+        self._record_timing("browser_close", start)
+
+        logger.debug(f"Browser pool stats: {self.stats()}")
 
 
 class ScraperService:
     """
-    Class to interact with the frontend
+    Class to interact with the frontend. It may be kept open to scrape the same
+    newspaper in every run, reusing its page until it has to be recycled.
     """
 
-    playwright: Playwright
-    browser: Browser
+    browser_pool: BrowserPool
+    context: BrowserContext
     page: Page
+    navigations: int
     mock_extract_news: bool
+    resource_filter: ResourceFilter | None
+    storage_state_path: Path | None
 
-    def __init__(self, headed=False, mock_extract_news=False):
+    def __init__(
+        self,
+        browser_pool: BrowserPool,
+        mock_extract_news=False,
+        timeout_seconds: float | None = None,
+        resource_filter: ResourceFilter | None = None,
+        storage_state_path: Path | None = None,
+    ):
         """
-        Initialize the browser
+        Open an isolated context in the shared browser
+
+        * timeout_seconds: maximum time of every single playwright operation
+        * resource_filter: requests matching this filter are aborted
+        * storage_state_path: file where cookies and local storage are kept between
+          runs, so that consent dialogs only have to be accepted once
         """
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=headed is False)
-        self.page = self.browser.new_page()
+        self.browser_pool = browser_pool
+        self.storage_state_path = storage_state_path
+        if storage_state_path is not None and storage_state_path.exists():
+            logger.debug(f"Loading browser storage state from {storage_state_path}")
+            self.context = self.browser_pool.new_context(
+                storage_state=storage_state_path
+            )
+        else:
+            self.context = self.browser_pool.new_context()
+        if timeout_seconds is not None:
+            self.context.set_default_timeout(timeout_seconds * 1000)
+        self.resource_filter = resource_filter
+        if resource_filter is not None:
+            self.context.route("**/*", resource_filter.handle_route)
+        self.page = self.context.new_page()
+        self.navigations = 0
         self.mock_extract_news = mock_extract_news
 
-    def access_page(self, url: str) -> None:
+    def _get_page_memory_mb(self) -> Optional[float]:
+        """
+        Return the used JS heap of the current page. Only chromium provides it.
+        """
+        try:
+            used_bytes = self.page.evaluate(
+                "() => performance.memory ? performance.memory.usedJSHeapSize : null"
+            )
+        except Exception:
+            return None
+
+        if used_bytes is None:
+            return None
+
+        return used_bytes / (1024 * 1024)
+
+    def _should_recycle_page(self) -> bool:
+        """
+        Check if the page has been used enough to be replaced by a fresh one
+        """
+        return self.browser_pool.should_recycle_page(
+            self.navigations, self._get_page_memory_mb
+        )
+
+    def _recycle_page(self) -> None:
+        """
+        Replace the current page by a new one in the same context
+        """
+        logger.debug(f"Recycling page after {self.navigations} navigations")
+        self.page.close()
+        self.page = self.context.new_page()
+        self.navigations = 0
+
+    def access_page(self, url: str, wait_until: str = "load") -> None:
         """
         Access the provided site
         """
         if self.mock_extract_news:
             return
 
-        self.page.goto(url)
+        if self._should_recycle_page():
+            self._recycle_page()
+
+        self.page.goto(url, wait_until=wait_until)
+        self.navigations += 1
 
     def execute_custom_function(self, function: Callable) -> None:
         """
@@ -48,9 +252,55 @@ class ScraperService:
 
         return function(self.page)
 
+    def save_storage_state(self) -> None:
+        """
+        Persist the cookies and local storage of the context
+        """
+        if self.mock_extract_news or self.storage_state_path is None:
+            return
+
+        self.storage_state_path.parent.mkdir(parents=True, exist_ok=True)
+        self.context.storage_state(path=self.storage_state_path)
+
+    def extract_news(self, newspaper: Newspaper) -> list[str] | None:
+        """
+        Open the newspaper, run its hooks and return the extracted headlines
+        """
+        logger.info(f"Extracting data from: {newspaper.name}")
+
+        self.access_page(newspaper.url, wait_until=newspaper.wait_until)
+
+        if newspaper.access_hook is not None:
+            self.execute_custom_function(newspaper.access_hook)
+
+        if newspaper.extraction is not None:
+            extractor = HeadlineExtractor.compile(newspaper.extraction)
+            text = self.execute_custom_function_returning_value(extractor.extract)
+        else:
+            text = self.execute_custom_function_returning_value(
+                newspaper.extract_data_hook
+            )
+
+        if self.resource_filter is not None:
+            self.resource_filter.log_stats(newspaper.name)
+            metrics.increment(
+                "scrape_blocked_requests",
+                self.resource_filter.blocked_requests,
+                newspaper=newspaper.name,
+            )
+            self.resource_filter.reset_stats()
+
+        self.save_storage_state()
+
+        if text is None or text == "" or (isinstance(text, list) and len(text) == 0):
+            return None
+
+        logger.debug(f"News found in {newspaper.url}:\n{text}")
+
+        return text
+
     def close(self) -> None:
         """
-        Close the object
+        Close the context of this scraper. The shared browser stays open.
         """
-        self.browser.close()
-        self.playwright.stop()
+        self.browser_pool.close_context(self.context)
@@ -0,0 +1,97 @@
+import re
+from functools import lru_cache
+
+import httpx
+import lxml.html
+from loguru import logger
+
+from src.domain.newspaper import Newspaper
+from src.scraper.extraction import HeadlineExtractor
+
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36"
+)
+# Charset declared by the page itself, only searched at the start of the html
+META_CHARSET = re.compile(rb"<meta[^>]+charset", re.IGNORECASE)
+META_CHARSET_BYTES = 2048
+
+
+@lru_cache(maxsize=None)
+def _html_parser(encoding: str | None) -> lxml.html.HTMLParser:
+    """
+    Return the parser of the encoding, None detects it from the page
+    """
+    return lxml.html.HTMLParser(encoding=encoding)
+
+
+def parse_html(response: httpx.Response) -> lxml.html.HtmlElement:
+    """
+    Parse the page with the charset of the response or of its meta tag. lxml reads
+    pages without any of them as latin-1, but they are almost always utf-8.
+    """
+    encoding = response.charset_encoding
+    if encoding is None and not META_CHARSET.search(
+        response.content[:META_CHARSET_BYTES]
+    ):
+        encoding = "utf-8"
+
+    return lxml.html.fromstring(
+        response.content, base_url=str(response.url), parser=_html_parser(encoding)
+    )
+
+
+class StaticScraperService:
+    """
+    Read the news of server rendered pages without a browser. The HTTP client keeps
+    the connections alive so that it can be shared by all the newspapers.
+    """
+
+    client: httpx.Client
+
+    def __init__(self, timeout_seconds: float = 30, max_connections: int = 10):
+        """
+        Create the pooled HTTP client
+        """
+        self.client = httpx.Client(
+            timeout=timeout_seconds,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT, "Accept-Language": "*"},
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+
+    def extract_news(self, newspaper: Newspaper) -> list[str] | None:
+        """
+        Download the page of the newspaper and extract the headlines. None is
+        returned when nothing is found so that the caller can use the browser.
+        """
+        if newspaper.extraction is None:
+            raise ValueError(f"{newspaper.name} has no extraction configured")
+
+        logger.info(f"Extracting data without browser from: {newspaper.name}")
+
+        try:
+            response = self.client.get(newspaper.url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Static request to {newspaper.url} failed: {e}")
+            return None
+
+        tree = parse_html(response)
+        data = HeadlineExtractor.compile(newspaper.extraction).extract_from_tree(tree)
+
+        if len(data) == 0:
+            return None
+
+        logger.debug(f"News found in {newspaper.url}:\n{data}")
+
+        return data
+
+    def close(self) -> None:
+        """
+        Close the connections of the client
+        """
+        self.client.close()
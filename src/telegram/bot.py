@@ -1,22 +1,35 @@
 import os
+import threading
 import time
-import traceback
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
+import requests
 import telebot
 from dotenv import load_dotenv
 
+from src.utils.metrics import metrics
+from src.utils.rate_limiter import TokenBucket
+
+# Seconds waited after a 429 without retry_after or after a server error
+DEFAULT_RETRY_AFTER_SECONDS = 1
+DEFAULT_API_URL = "https://api.telegram.org/bot{0}/{1}"
+
 
 class TelegramBot:
     """
-    Bot that takes care of sending the messages through telegram
+    Bot that takes care of sending the messages through telegram. The limits of the
+    Bot API are modelled with token buckets, a global one and one per chat, and the
+    chats are served in parallel while the messages of a chat keep their order.
     """
 
-    bot: telebot.TeleBot
+    api_url: str
     dry_run: bool
-    # Define the number of messages before waiting some times to avoid the
-    # error 429
-    max_rate: int = 10
-    messages = 0
+    # Limits of the Bot API: about 30 messages per second in total and one per
+    # second in the same chat
+    messages_per_second: float
+    messages_per_chat_per_second: float
+    # Times a message is sent again after a 429 or a server error
+    max_retries: int
 
     def _get_api_key(self) -> str:
         """
@@ -29,15 +42,41 @@ class TelegramBot:
             )
         return api_key
 
-    def __init__(self, dry_run: bool = False) -> None:
+    def __init__(
+        self,
+        dry_run: bool = False,
+        api_url: str | None = None,
+        messages_per_second: float = 30,
+        messages_per_chat_per_second: float = 1,
+        max_concurrency: int = 8,
+        max_retries: int = 5,
+    ) -> None:
         """
         Initialize the bot
+
+        * api_url: template of the Bot API urls, e.g. a local fake server like
+          'http://localhost:8081/bot{0}/{1}'. By default TELEGRAM_API_URL or the
+          official API.
+        * max_concurrency: chats that are sent messages at the same time
         """
         api_key = self._get_api_key()
-        self.bot = telebot.TeleBot(api_key)
+        api_url = api_url if api_url is not None else os.environ.get("TELEGRAM_API_URL")
+        self.api_url = api_url or DEFAULT_API_URL
+        self._api_key = api_key
+        # Every thread sending messages keeps its own HTTP session
+        self._sessions = threading.local()
         self.dry_run = dry_run
+        self.messages_per_second = messages_per_second
+        self.messages_per_chat_per_second = messages_per_chat_per_second
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(messages_per_second, messages_per_second)
+        self._chat_buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self.stats = {"sent": 0, "failed": 0, "retries": 0, "waited_seconds": 0.0}
+        self.latencies: list[float] = []
 
-    def _get_chat_ids(self) -> list[str]:
+    def get_chat_ids(self) -> list[str]:
         """
         Obtain the chat ids configured in the environment
         """
@@ -56,36 +95,195 @@ class TelegramBot:
         """
         return [message[i : i + chunk_size] for i in range(0, len(message), chunk_size)]
 
-    def _count_message(self) -> None:
+    def _get_chat_bucket(self, chat_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = TokenBucket(1, self.messages_per_chat_per_second)
+                self._chat_buckets[chat_id] = bucket
+            return bucket
+
+    def _get_retry_after(self, error: telebot.apihelper.ApiTelegramException) -> float:
+        """
+        Seconds that Telegram asks to wait before sending again
+        """
+        parameters = (error.result_json or {}).get("parameters") or {}
+        return float(parameters.get("retry_after", DEFAULT_RETRY_AFTER_SECONDS))
+
+    def _get_session(self) -> requests.Session:
+        """
+        Return the HTTP session of the current thread
+        """
+        session: requests.Session | None = getattr(self._sessions, "value", None)
+        if session is None:
+            session = requests.Session()
+            self._sessions.value = session
+        return session
+
+    def _send_request(self, chat_id: str, message: str) -> None:
+        """
+        Call sendMessage of the Bot API of this bot. The url is not taken from the
+        global configuration of telebot, so that bots with different urls can be
+        used at the same time, but the errors are the ones of telebot.
+        """
+        result = self._get_session().post(
+            self.api_url.format(self._api_key, "sendMessage"),
+            data={"chat_id": chat_id, "text": message, "parse_mode": "MARKDOWN"},
+            timeout=(
+                telebot.apihelper.CONNECT_TIMEOUT,
+                telebot.apihelper.READ_TIMEOUT,
+            ),
+        )
+        try:
+            result_json = result.json()
+        except ValueError:
+            if result.status_code != 200:
+                raise telebot.apihelper.ApiHTTPException("sendMessage", result)
+            raise telebot.apihelper.ApiInvalidJSONException("sendMessage", result)
+
+        if not result_json.get("ok"):
+            raise telebot.apihelper.ApiTelegramException(
+                "sendMessage", result, result_json
+            )
+
+    def _send(self, chat_id: str, message: str) -> str | None:
+        """
+        Send a message respecting the limits. Rate limited and failed requests are
+        sent again after the time requested by Telegram. Return the error if it
+        could not be sent.
+        """
+        chat_bucket = self._get_chat_bucket(chat_id)
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            waited = chat_bucket.acquire() + self._global_bucket.acquire()
+
+            start = time.perf_counter()
+            try:
+                self._send_request(chat_id, message)
+            except telebot.apihelper.ApiTelegramException as e:
+                error = str(e)
+                if e.error_code == 429:
+                    retry_after = self._get_retry_after(e)
+                elif e.error_code >= 500:
+                    retry_after = DEFAULT_RETRY_AFTER_SECONDS * 2**attempt
+                else:
+                    logger.error(f"Error sending telegram message:\n'{message}'")
+                    logger.error(e)
+                    break
+
+                logger.warning(
+                    f"Telegram answered {e.error_code} to chat {chat_id}, "
+                    f"retrying in {retry_after}s"
+                )
+                chat_bucket.block_for(retry_after)
+                with self._lock:
+                    self.stats["retries"] += 1
+                    self.stats["waited_seconds"] += waited
+                metrics.increment("telegram_retries", reason=e.error_code)
+                continue
+            except telebot.apihelper.ApiException as e:
+                # Errors without a Telegram answer, e.g. a 502 page of a proxy or
+                # a body that is not JSON
+                error = str(e)
+                status_code = getattr(e.result, "status_code", None) or 0
+                if status_code < 500 and not isinstance(
+                    e, telebot.apihelper.ApiInvalidJSONException
+                ):
+                    logger.error(f"Error sending telegram message:\n'{message}'")
+                    logger.error(e)
+                    break
+
+                retry_after = DEFAULT_RETRY_AFTER_SECONDS * 2**attempt
+                logger.warning(
+                    f"Telegram request failed with HTTP {status_code}, "
+                    f"retrying in {retry_after}s"
+                )
+                chat_bucket.block_for(retry_after)
+                with self._lock:
+                    self.stats["retries"] += 1
+                    self.stats["waited_seconds"] += waited
+                metrics.increment("telegram_retries", reason=status_code)
+                continue
+            except requests.RequestException as e:
+                error = str(e)
+                retry_after = DEFAULT_RETRY_AFTER_SECONDS * 2**attempt
+                logger.warning(
+                    f"Telegram request failed: {e}, retrying in {retry_after}s"
+                )
+                chat_bucket.block_for(retry_after)
+                with self._lock:
+                    self.stats["retries"] += 1
+                    self.stats["waited_seconds"] += waited
+                metrics.increment("telegram_retries", reason="network")
+                continue
+
+            latency = time.perf_counter() - start
+            with self._lock:
+                self.stats["sent"] += 1
+                self.stats["waited_seconds"] += waited
+                self.latencies.append(latency)
+            metrics.observe("telegram_request", latency)
+            metrics.increment("telegram_rate_limit_wait_seconds", waited)
+            return None
+
+        with self._lock:
+            self.stats["failed"] += 1
+        return error
+
+    def send_message(self, chat_id: str, message: str) -> str | None:
+        """
+        Send a message to a single chat. Return the error if it could not be sent.
+        """
+        for message_chunk in self._chunk_message(message):
+            if self.dry_run is False:
+                error = self._send(chat_id, message_chunk)
+                if error is not None:
+                    return error
+            else:
+                logger.info(f"DRY_RUN: Sending message: {message_chunk}")
+        return None
+
+    def _send_to_chat(self, chat_id: str, messages: list[str]) -> None:
         """
-        This method prevents the error 429 when too many messages are sent
+        Send the messages to a chat in order
         """
-        self.messages += 1
-        if self.messages % self.max_rate == 0:
-            time.sleep(5)
-            self.messages = 0
+        for message in messages:
+            self.send_message(chat_id, message)
+
+    def broadcast_messages(self, messages: list[str]) -> None:
+        """
+        Broadcast the messages to all the chats at the same time
+        """
+        chat_ids = self.get_chat_ids()
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_concurrency, len(chat_ids))
+        ) as executor:
+            for future in [
+                executor.submit(self._send_to_chat, x, messages) for x in chat_ids
+            ]:
+                future.result()
 
     def broadcast_message(self, message: str) -> None:
         """
         Broadcast a message
         """
-        for chat_id in self._get_chat_ids():
-            for message_chunk in self._chunk_message(message):
-                if self.dry_run is False:
-                    try:
-                        self.bot.send_message(
-                            chat_id, message_chunk, parse_mode="MARKDOWN"
-                        )
-                        self._count_message()
-
-                    except telebot.apihelper.ApiTelegramException as e:
-                        logger.error(
-                            f"Error sending elegram message:\n'{message_chunk}'"
-                        )
-                        logger.error(e)
-                        traceback.print_stack()
-                else:
-                    logger.info(f"DRY_RUN: Sending message: {message_chunk}")
+        self.broadcast_messages([message])
+
+    def get_stats(self) -> dict[str, float]:
+        """
+        Return the sent and failed messages, the retries and the latency of the
+        requests to Telegram
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            latencies = sorted(self.latencies)
+
+        if len(latencies) > 0:
+            stats["latency_p50_seconds"] = latencies[len(latencies) // 2]
+            stats["latency_p95_seconds"] = latencies[int(len(latencies) * 0.95)]
+            stats["latency_max_seconds"] = latencies[-1]
+        return stats
 
 
 if __name__ == "__main__":
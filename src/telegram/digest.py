@@ -0,0 +1,133 @@
+"""
+Rendering of the news of a newspaper in as few Telegram messages as possible
+"""
+
+from datetime import datetime
+
+from src.domain.article import Article
+from src.domain.story_cluster import ClusteredHeadline
+
+# Maximum length of a Telegram message, see: https://limits.tginfo.me/en
+MAX_MESSAGE_LENGTH = 4096
+BLOCK_SEPARATOR = "\n\n"
+
+
+def message_length(text: str) -> int:
+    """
+    Length of the text as counted by Telegram, in UTF-16 code units
+    """
+    return len(text.encode("utf-16-le")) // 2
+
+
+class DigestRenderer:
+    """
+    Pack the header, the categories and the articles of a newspaper in messages
+    under the length limit. Messages are only split between articles, and the
+    heading of the category is repeated when a category continues in a new message.
+    """
+
+    max_length: int
+
+    def __init__(self, max_length: int = MAX_MESSAGE_LENGTH):
+        self.max_length = max_length
+
+    def render_article(
+        self,
+        index: int,
+        article: Article,
+        related_headlines: list[ClusteredHeadline],
+    ) -> str:
+        """
+        Entry of a single article
+        """
+        entry = (
+            f"{index}. *{article.english_translation}*\n"
+            f"- *Original title:* {article.title}\n"
+            f"- *Description:* {article.description}"
+        )
+        for headline in related_headlines:
+            entry += f"\n- *Also in {headline.newspaper}:* {headline.title}"
+        return entry
+
+    def _split_block(self, block: str) -> list[str]:
+        """
+        Split a block longer than a message by lines, or by characters when a
+        single line is too long
+        """
+        parts: list[str] = []
+        part = ""
+        for line in block.split("\n"):
+            while message_length(line) > self.max_length:
+                if part:
+                    parts.append(part)
+                    part = ""
+                # Code points are never longer than two UTF-16 units
+                size = self.max_length // 2
+                parts.append(line[:size])
+                line = line[size:]
+
+            candidate = f"{part}\n{line}" if part else line
+            if message_length(candidate) > self.max_length:
+                parts.append(part)
+                candidate = line
+            part = candidate
+
+        if part:
+            parts.append(part)
+        return parts
+
+    def render(
+        self,
+        newspaper_name: str,
+        news: list[Article],
+        related_headlines: dict[str, list[ClusteredHeadline]] | None = None,
+    ) -> list[str]:
+        """
+        Return the messages with all the news of the newspaper
+
+        * related_headlines: headlines of other newspapers about the same story by
+          article title, shown in the entry of the article
+        """
+        related_headlines = related_headlines or {}
+        messages: list[str] = []
+        message = (
+            f"**News from {newspaper_name} ({datetime.now().strftime(r'%Y-%m-%d')}):**"
+        )
+
+        def add_block(block: str, heading: str | None) -> None:
+            nonlocal message
+            candidate = f"{message}{BLOCK_SEPARATOR}{block}"
+            if message_length(candidate) <= self.max_length:
+                message = candidate
+                return
+
+            messages.append(message)
+            if heading is not None:
+                block = f"{heading}{BLOCK_SEPARATOR}{block}"
+            if message_length(block) <= self.max_length:
+                message = block
+                return
+
+            *parts, message = self._split_block(block)
+            messages.extend(parts)
+
+        for category in sorted(set(x.category for x in news)):
+            heading = f"### {category.capitalize()}"
+            for index, article in enumerate(
+                sorted(
+                    filter(lambda x: x.category == category, news),
+                    key=lambda x: x.title,
+                ),
+                start=1,
+            ):
+                entry = self.render_article(
+                    index, article, related_headlines.get(article.title, [])
+                )
+                # The heading is kept with the first article of the category
+                if index == 1:
+                    add_block(f"{heading}{BLOCK_SEPARATOR}{entry}", None)
+                else:
+                    add_block(entry, heading)
+
+        messages.append(message)
+        return messages
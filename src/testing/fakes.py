@@ -0,0 +1,373 @@
+"""
+Local stand-ins of the newspapers, the OpenAI API and the Telegram Bot API, so that
+the tests and the benchmark of the pipeline run without network nor credit. It
+is not used by the application itself
+"""
+
+import json
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+from src.ai.tokens import estimate_tokens
+
+# Error of the fake Bot API answered with a page that is not JSON
+PROXY_ERROR = "proxy"
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        data = json.dumps(payload).encode("utf8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+
+class FakeServer:
+    """
+    HTTP server running in a background thread
+    """
+
+    server: ThreadingHTTPServer
+
+    def __init__(self, handler: Any):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.server.fake = self  # type: ignore[attr-defined]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self) -> "FakeServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _NewspaperHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class NewspaperSiteServer(FakeServer):
+    """
+    Serve the saved pages of the newspapers of a folder, e.g. /paper-1.html
+    """
+
+    def __init__(self, folder: str):
+        super().__init__(partial(_NewspaperHandler, directory=folder))
+
+
+class _OpenAIHandler(_QuietHandler):
+    server: Any
+
+    def do_POST(self) -> None:
+        fake: FakeOpenAIServer = self.server.fake
+        body = self._read_json()
+        with fake.lock:
+            rate_limited = fake.rate_limited_requests > 0
+            fake.rate_limited_requests -= int(rate_limited)
+        if rate_limited:
+            self._send_rate_limit()
+            return
+
+        prompt = "\n".join(
+            x["content"] for x in body["messages"] if x["role"] == "user"
+        )
+        schema = (body.get("response_format") or {}).get("json_schema") or {}
+        content = fake.answer(prompt, schema.get("name") == "CompactExtractedNews")
+        finish_reason = "stop"
+        if fake.max_response_characters is not None:
+            if len(content) > fake.max_response_characters:
+                content = content[: fake.max_response_characters]
+                finish_reason = "length"
+        usage = {
+            "prompt_tokens": sum(
+                estimate_tokens(x["content"]) for x in body["messages"]
+            ),
+            "completion_tokens": estimate_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        with fake.lock:
+            fake.requests += 1
+            fake.headlines += len([x for x in prompt.split("\n") if x.strip()])
+            fake.completion_tokens += usage["completion_tokens"]
+
+        if body.get("stream"):
+            self._stream(fake, content, usage, finish_reason)
+            return
+
+        time.sleep(
+            fake.first_token_seconds
+            + usage["completion_tokens"] / fake.tokens_per_second
+        )
+        self._send_json(
+            {
+                "id": "benchmark",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": finish_reason,
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    def _send_rate_limit(self) -> None:
+        data = json.dumps(
+            {"error": {"message": "Rate limit reached", "type": "requests"}}
+        ).encode("utf8")
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Retry-After-Ms", "10")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(
+        self,
+        fake: "FakeOpenAIServer",
+        content: str,
+        usage: dict,
+        finish_reason: str = "stop",
+    ) -> None:
+        """
+        Send the content in chunks of a few tokens at the configured speed
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(data: Any) -> None:
+            event = f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n"
+            event_bytes = event.encode("utf8")
+            self.wfile.write(f"{len(event_bytes):x}\r\n".encode() + event_bytes)
+            self.wfile.write(b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta: dict, finish_reason: str | None = None) -> dict:
+            return {
+                "id": "benchmark",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": "benchmark",
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+
+        start = time.perf_counter() + fake.first_token_seconds
+        chunk_size = 16
+        for i in range(0, len(content), chunk_size):
+            # Every token is sent when it would have been generated
+            sleep = start + estimate_tokens(content[:i]) / fake.tokens_per_second
+            time.sleep(max(sleep - time.perf_counter(), 0))
+            send(chunk({"content": content[i : i + chunk_size]}))
+
+        send(chunk({}, finish_reason))
+        send({**chunk({}), "choices": [], "usage": usage})
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeOpenAIServer(FakeServer):
+    """
+    OpenAI compatible chat completions endpoint that classifies every headline of
+    the prompt with a configurable latency
+    """
+
+    first_token_seconds: float
+    tokens_per_second: float
+    max_response_characters: int | None
+    rate_limited_requests: int
+    requests: int
+    headlines: int
+    completion_tokens: int
+
+    def __init__(
+        self,
+        first_token_seconds: float = 0.3,
+        tokens_per_second=200,
+        max_response_characters: int | None = None,
+        rate_limited_requests: int = 0,
+        title_format: str = "{}",
+    ):
+        """
+        * first_token_seconds: time until the first token of every response
+        * tokens_per_second: speed at which the rest of the response is generated
+        * max_response_characters: longer responses are cut and finish with the
+          "length" reason, like when the model reaches its output limit
+        * rate_limited_requests: number of the first requests that are rejected
+          with a 429
+        * title_format: how the headlines are repeated in the responses that are
+          not compact, e.g. with quotes added by the model
+        """
+        super().__init__(_OpenAIHandler)
+        self.first_token_seconds = first_token_seconds
+        self.tokens_per_second = tokens_per_second
+        self.max_response_characters = max_response_characters
+        self.rate_limited_requests = rate_limited_requests
+        self.title_format = title_format
+        self.requests = 0
+        self.headlines = 0
+        self.completion_tokens = 0
+        self.lock = threading.Lock()
+
+    def answer(self, prompt: str, compact: bool) -> str:
+        """
+        Classification of the headlines of the prompt, one per line
+        """
+        news = []
+        for index, line in enumerate(x for x in prompt.split("\n") if x.strip()):
+            if compact:
+                news.append(
+                    {
+                        "index": index,
+                        "category_id": index % 5,
+                        "translation": f"Translation of headline {index}",
+                        "description": f"Objective description of headline {index}",
+                    }
+                )
+            else:
+                news.append(
+                    {
+                        "title": self.title_format.format(line),
+                        "description": f"Objective description of headline {index}",
+                        "category": "sport",
+                        "english_translation": f"Translation of headline {index}",
+                    }
+                )
+        return json.dumps({"news": news})
+
+
+class _TelegramHandler(_QuietHandler):
+    server: Any
+
+    def _handle(self) -> None:
+        fake: FakeTelegramServer = self.server.fake
+        url = urlparse(self.path)
+        method = url.path.rsplit("/", 1)[-1]
+        # telebot sends the parameters in the query string
+        parameters = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if self.command == "POST" and self.headers.get("Content-Length"):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            parameters.update(
+                {k: v[0] for k, v in parse_qs(body.decode("utf8")).items()}
+            )
+
+        time.sleep(fake.latency_seconds)
+        if method != "sendMessage":
+            self._send_json({"ok": True, "result": True})
+            return
+
+        chat_id = parameters.get("chat_id", "")
+        with fake.lock:
+            fake.requests += 1
+            chat_errors = fake.errors.get(chat_id) or []
+            error = chat_errors.pop(0) if len(chat_errors) > 0 else None
+            if error is None:
+                fake.messages.setdefault(chat_id, []).append(parameters.get("text", ""))
+            message_id = sum(len(x) for x in fake.messages.values())
+
+        if error == PROXY_ERROR:
+            self._send_proxy_error()
+            return
+        if error is not None:
+            self._send_json(
+                {
+                    "ok": False,
+                    "error_code": error,
+                    "description": f"Error {error}",
+                    "parameters": {"retry_after": 0} if error == 429 else {},
+                },
+                status=int(error),
+            )
+            return
+
+        self._send_json(
+            {
+                "ok": True,
+                "result": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {
+                        "id": int(parameters.get("chat_id", 0)),
+                        "type": "private",
+                    },
+                    "text": parameters.get("text", ""),
+                },
+            }
+        )
+
+    def _send_proxy_error(self) -> None:
+        data = b"<html><body>502 Bad Gateway</body></html>"
+        self.send_response(502)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class FakeTelegramServer(FakeServer):
+    """
+    Bot API that accepts every message and keeps them by chat
+    """
+
+    latency_seconds: float
+    errors: dict[str, list[int | str]]
+    requests: int
+    messages: dict[str, list[str]]
+
+    def __init__(
+        self,
+        latency_seconds: float = 0.02,
+        errors: dict[str, list[int | str]] | None = None,
+    ):
+        """
+        * latency_seconds: time taken by every request
+        * errors: answers to the first messages of every chat instead of accepting
+          them, the error code of the Bot API (e.g. 429 with a retry_after of 0) or
+          PROXY_ERROR for an HTML 502 page of a proxy
+        """
+        super().__init__(_TelegramHandler)
+        self.latency_seconds = latency_seconds
+        self.errors = {k: list(v) for k, v in (errors or {}).items()}
+        self.requests = 0
+        self.messages = {}
+        self.lock = threading.Lock()
+
+    @property
+    def api_url(self) -> str:
+        """
+        Template of the urls of the Bot API for telebot
+        """
+        return self.url + "/bot{0}/{1}"
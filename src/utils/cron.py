@@ -0,0 +1,101 @@
+"""
+Minimal parser of the standard five fields cron expressions
+"""
+
+from datetime import datetime, timedelta
+
+# Minimum and maximum values of minute, hour, day of month, month and day of week
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _parse_field(field: str, minimum: int, maximum: int) -> set[int]:
+    """
+    Values of a field with lists (1,2), ranges (1-5), steps (*/15) and wildcards
+    """
+    values: set[int] = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Invalid step in cron field '{field}'")
+
+        if part == "*":
+            start, end = minimum, maximum
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = maximum if step > 1 else start
+
+        if start < minimum or end > maximum or start > end:
+            raise ValueError(f"Cron field '{field}' out of range")
+        values.update(range(start, end + 1, step))
+
+    return values
+
+
+class CronExpression:
+    """
+    Cron expression like '*/15 6-22 * * 1-5'. Sunday is 0 (7 is accepted too) and
+    when both days are restricted a day matching any of them is valid, as in cron.
+    """
+
+    expression: str
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' needs five fields")
+
+        self.expression = expression
+        (
+            self.minutes,
+            self.hours,
+            self.days,
+            self.months,
+            self.weekdays,
+        ) = [
+            _parse_field(field, minimum, maximum)
+            for field, (minimum, maximum) in zip(fields, FIELD_RANGES)
+        ]
+        if 7 in self.weekdays:
+            self.weekdays = (self.weekdays - {7}) | {0}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _matches_day(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        # Python counts the days from monday
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        """
+        Return the first time matching the expression after the provided one
+        """
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Five years cover every valid combination, e.g. the 29th of February
+        limit = candidate + timedelta(days=5 * 366)
+
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year = candidate.year + candidate.month // 12
+                month = candidate.month % 12 + 1
+                candidate = candidate.replace(
+                    year=year, month=month, day=1, hour=0, minute=0
+                )
+            elif not self._matches_day(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
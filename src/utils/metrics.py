@@ -0,0 +1,224 @@
+"""
+In-process metrics of the runs: timing spans and counters labelled by newspaper,
+exported in the Prometheus text format and as a JSON summary of every run
+"""
+
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Generator
+
+# Upper bounds in seconds of the histogram buckets of the spans
+SPAN_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Durations of a span kept for the percentiles of the run summary
+MAX_SAMPLES = 1024
+PROMETHEUS_PREFIX = "news_summarizer"
+
+Labels = tuple[tuple[str, str], ...]
+
+
+@dataclass
+class _Span:
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    buckets: list[int] = field(default_factory=lambda: [0] * len(SPAN_BUCKETS))
+    samples: deque = field(default_factory=lambda: deque(maxlen=MAX_SAMPLES))
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        index = bisect.bisect_left(SPAN_BUCKETS, seconds)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+        self.samples.append(seconds)
+
+
+class Metrics:
+    """
+    Registry of spans and counters. Recording takes a lock and a few dictionary
+    updates, so the instrumentation can stay enabled in production. The values
+    exported to Prometheus accumulate during the whole life of the process while
+    the summary only covers the current run.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._spans: dict[tuple[str, Labels], _Span] = {}
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._run_spans: dict[tuple[str, Labels], _Span] = {}
+        self._run_counters: dict[tuple[str, Labels], float] = {}
+        self._run_started_at = time.time()
+        self._run_info: dict[str, Any] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, Any]) -> tuple[str, Labels]:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        """
+        Record the duration of an operation
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            for spans in (self._spans, self._run_spans):
+                span = spans.get(key)
+                if span is None:
+                    span = spans[key] = _Span()
+                span.observe(seconds)
+
+    @contextmanager
+    def span(self, name: str, **labels: Any) -> Generator[None, None, None]:
+        """
+        Measure the time of the block, also when it raises
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """
+        Add the value to a counter
+        """
+        if value == 0:
+            return
+
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._run_counters[key] = self._run_counters.get(key, 0) + value
+
+    def start_run(self) -> None:
+        """
+        Start the summary of a new run
+        """
+        with self._lock:
+            self._run_spans = {}
+            self._run_counters = {}
+            self._run_started_at = time.time()
+            self._run_info = {}
+
+    def annotate_run(self, **values: Any) -> None:
+        """
+        Add values to the summary of the current run, e.g. its newspapers
+        """
+        with self._lock:
+            self._run_info.update(values)
+
+    @staticmethod
+    def _format_labels(labels: Labels, *extra: tuple[str, str]) -> str:
+        values = [f'{k}="{_escape(v)}"' for k, v in labels + extra]
+        return "{" + ",".join(values) + "}" if len(values) > 0 else ""
+
+    def to_prometheus(self) -> str:
+        """
+        Spans as histograms and counters in the Prometheus text format
+        """
+        with self._lock:
+            spans = {
+                k: (list(v.buckets), v.count, v.total_seconds)
+                for k, v in self._spans.items()
+            }
+            counters = dict(self._counters)
+
+        lines: list[str] = []
+        for name in sorted(set(x[0] for x in spans)):
+            metric = f"{PROMETHEUS_PREFIX}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for (span_name, labels), (buckets, count, total) in sorted(spans.items()):
+                if span_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(SPAN_BUCKETS, buckets):
+                    cumulative += bucket
+                    bucket_labels = self._format_labels(labels, ("le", str(bound)))
+                    lines.append(f"{metric}_bucket{bucket_labels} {cumulative}")
+                bucket_labels = self._format_labels(labels, ("le", "+Inf"))
+                lines.append(f"{metric}_bucket{bucket_labels} {count}")
+                lines.append(f"{metric}_sum{self._format_labels(labels)} {total}")
+                lines.append(f"{metric}_count{self._format_labels(labels)} {count}")
+
+        for name in sorted(set(x[0] for x in counters)):
+            metric = f"{PROMETHEUS_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{metric}{self._format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict[str, Any]:
+        """
+        Count, total, percentiles and maximum of every span and the counters of the
+        current run, grouped by metric and newspaper
+        """
+        with self._lock:
+            spans = {
+                k: (v.count, v.total_seconds, v.max_seconds, sorted(v.samples))
+                for k, v in self._run_spans.items()
+            }
+            counters = dict(self._run_counters)
+            started_at = self._run_started_at
+            run_info = dict(self._run_info)
+
+        result: dict[str, Any] = {
+            "started_at": started_at,
+            "duration_seconds": time.time() - started_at,
+            **run_info,
+            "spans": {},
+            "counters": {},
+        }
+        for (name, labels), (count, total, maximum, samples) in sorted(spans.items()):
+            result["spans"].setdefault(name, []).append(
+                {
+                    "labels": dict(labels),
+                    "count": count,
+                    "total_seconds": round(total, 6),
+                    "p50_seconds": round(samples[len(samples) // 2], 6),
+                    "p95_seconds": round(samples[int(len(samples) * 0.95)], 6),
+                    "max_seconds": round(maximum, 6),
+                }
+            )
+        for (name, labels), value in sorted(counters.items()):
+            result["counters"].setdefault(name, []).append(
+                {"labels": dict(labels), "value": value}
+            )
+        return result
+
+    def export(self, prometheus_path: str | None, summary_path: str | None) -> None:
+        """
+        Write the Prometheus text file, e.g. for the textfile collector of the node
+        exporter, and the JSON summary of the run
+        """
+        if prometheus_path is not None:
+            _write_atomically(prometheus_path, self.to_prometheus())
+        if summary_path is not None:
+            _write_atomically(
+                summary_path, json.dumps(self.summary(), indent=2, default=str)
+            )
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomically(path: str, content: str) -> None:
+    """
+    Replace the file at once so that a reader never sees half of it
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = Path(path).with_suffix(".tmp")
+    temporary_path.write_text(content, encoding="utf8")
+    temporary_path.replace(path)
+
+
+# Registry shared by the whole process, like the logger
+metrics = Metrics()
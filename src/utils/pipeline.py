@@ -0,0 +1,228 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Iterable
+
+from loguru import logger
+
+# Marks the end of the items of a queue
+_END = object()
+
+
+@dataclass
+class StageStats:
+    """
+    Time spent by the workers of a stage
+    * busy_seconds: processing items
+    * idle_seconds: waiting for items of the previous stage
+    * blocked_seconds: waiting for room in the queue of the next stage
+    * item_seconds: busy time of every item, to obtain its percentiles
+    """
+
+    items: int = 0
+    outputs: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    idle_seconds: float = 0.0
+    blocked_seconds: float = 0.0
+    item_seconds: list[float] = field(default_factory=list)
+
+
+@dataclass
+class Stage:
+    """
+    Step of a pipeline. The function receives an item and returns the items for the
+    next stage, an iterable (e.g. a generator to stream them) or None. The finish
+    function is called once all the items of the stage are processed, and returns
+    the last items in the same way.
+    """
+
+    name: str
+    function: Callable[[Any], Iterable[Any] | None]
+    workers: int = 1
+    finish: Callable[[], Iterable[Any] | None] | None = None
+    stats: StageStats = field(default_factory=StageStats)
+
+
+class Pipeline:
+    """
+    Run stages in their own threads connected by bounded queues, so that every
+    stage works on the next item while the following ones are busy. A full queue
+    blocks the previous stage until there is room for its output.
+    """
+
+    stages: list[Stage]
+    queue_size: int
+    source_name: str
+    source_stats: StageStats
+
+    def __init__(
+        self, stages: list[Stage], queue_size: int = 4, source_name: str = "source"
+    ):
+        """
+        * queue_size: items waiting between two stages before the previous one is
+          blocked
+        * source_name: name of the statistics of the iterable feeding the pipeline,
+          which runs in the calling thread
+        """
+        if len(stages) == 0:
+            raise ValueError("A pipeline needs at least one stage")
+
+        self.stages = stages
+        self.queue_size = queue_size
+        self.source_name = source_name
+        self.source_stats = StageStats()
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def stopping(self) -> bool:
+        """
+        Whether the pipeline was asked to stop, stages streaming many items can
+        check it to finish early
+        """
+        return self._stopping.is_set()
+
+    def stop(self) -> None:
+        """
+        Stop feeding new items. The items already in the pipeline are completed.
+        """
+        self._stopping.set()
+
+    def _put(self, output: queue.Queue | None, item: Any, stats: StageStats) -> None:
+        if output is None:
+            return
+
+        start = time.perf_counter()
+        output.put(item)
+        with self._stats_lock:
+            stats.blocked_seconds += time.perf_counter() - start
+            stats.outputs += 1
+
+    def _process(
+        self,
+        stage: Stage,
+        function: Callable[[], Iterable[Any] | None],
+        output: queue.Queue | None,
+        is_item: bool = True,
+    ) -> None:
+        """
+        Run a function of the stage and send its outputs downstream as soon as they
+        are produced. Only the time of the items is added to their statistics.
+        """
+        busy_seconds = 0.0
+        start = time.perf_counter()
+        try:
+            results = function()
+            for result in results if results is not None else []:
+                busy_seconds += time.perf_counter() - start
+                self._put(output, result, stage.stats)
+                start = time.perf_counter()
+        except Exception as e:
+            logger.exception(f"Error in the {stage.name} stage: {e}")
+            with self._stats_lock:
+                stage.stats.errors += 1
+        busy_seconds += time.perf_counter() - start
+
+        with self._stats_lock:
+            stage.stats.busy_seconds += busy_seconds
+            if is_item:
+                stage.stats.items += 1
+                stage.stats.item_seconds.append(busy_seconds)
+
+    def _run_worker(
+        self,
+        stage: Stage,
+        source: queue.Queue,
+        output: queue.Queue | None,
+        remaining_workers: list[int],
+    ) -> None:
+        while True:
+            start = time.perf_counter()
+            item = source.get()
+            with self._stats_lock:
+                stage.stats.idle_seconds += time.perf_counter() - start
+
+            if item is _END:
+                break
+            self._process(stage, partial(stage.function, item), output)
+
+        # The last worker of the stage finishes it and closes the next queue
+        with self._stats_lock:
+            remaining_workers[0] -= 1
+            last_worker = remaining_workers[0] == 0
+        if last_worker and stage.finish is not None:
+            self._process(stage, stage.finish, output, is_item=False)
+        if last_worker and output is not None:
+            for _ in range(self._next_workers(stage)):
+                output.put(_END)
+
+    def _next_workers(self, stage: Stage) -> int:
+        index = self.stages.index(stage)
+        return self.stages[index + 1].workers
+
+    def run(self, items: Iterable[Any]) -> dict[str, StageStats]:
+        """
+        Feed the items to the first stage and wait until all the stages finished.
+        The items may be a generator producing them, e.g. the first step of the
+        work. Return the statistics of the source and every stage.
+        """
+        self._stopping.clear()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads: list[threading.Thread] = []
+        start = time.perf_counter()
+
+        for index, stage in enumerate(self.stages):
+            stage.stats = StageStats()
+            output = queues[index + 1] if index + 1 < len(queues) else None
+            remaining_workers = [stage.workers]
+            for worker in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._run_worker,
+                    args=(stage, queues[index], output, remaining_workers),
+                    name=f"pipeline-{stage.name}-{worker}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        self.source_stats = StageStats()
+        iterator = iter(items)
+        try:
+            while not self._stopping.is_set():
+                busy_start = time.perf_counter()
+                item = next(iterator, _END)
+                busy_seconds = time.perf_counter() - busy_start
+                self.source_stats.busy_seconds += busy_seconds
+                if item is _END:
+                    break
+                self.source_stats.items += 1
+                self.source_stats.item_seconds.append(busy_seconds)
+                self._put(queues[0], item, self.source_stats)
+        finally:
+            if self._stopping.is_set():
+                logger.info("Pipeline stopped, no more items are fed")
+            # Release a generator that was not consumed until the end
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_END)
+
+            for thread in threads:
+                thread.join()
+
+        stats = {self.source_name: self.source_stats}
+        stats.update((x.name, x.stats) for x in self.stages)
+        self._log_stats(stats, time.perf_counter() - start)
+        return stats
+
+    def _log_stats(self, stats: dict[str, StageStats], total_seconds: float) -> None:
+        summary = ", ".join(
+            f"{name} {x.busy_seconds:.1f}s busy/{x.blocked_seconds:.1f}s blocked "
+            f"({x.items} items, {x.errors} errors)"
+            for name, x in stats.items()
+        )
+        logger.info(f"Pipeline finished in {total_seconds:.1f}s: {summary}")
@@ -0,0 +1,33 @@
+import fcntl
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Generator
+
+
+class LockHeldError(RuntimeError):
+    """
+    Another process holds the lock
+    """
+
+
+@contextmanager
+def process_lock(path: str) -> Generator[None, None, None]:
+    """
+    Hold an exclusive lock on the file, so that two processes never run at the
+    same time, e.g. the daemon and a run started by cron. The lock is released
+    by the system if the process dies.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf8") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise LockHeldError(f"Another process holds the lock {path}") from None
+
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
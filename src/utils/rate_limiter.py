@@ -0,0 +1,139 @@
+import threading
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens are refilled continuously up to the capacity.
+    """
+
+    capacity: float
+    refill_per_second: float
+
+    def __init__(
+        self,
+        capacity: float,
+        refill_per_second: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        * clock, sleep: source of the time and how to wait, replaced by the tests
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated_at = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._tokens = min(
+            self.capacity, self._tokens + elapsed * self.refill_per_second
+        )
+        self._updated_at = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        Wait until the amount of tokens is available and take them. Amounts bigger
+        than the capacity wait for a full bucket. Return the seconds waited.
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+
+                wait_seconds = max(
+                    self._blocked_until - now,
+                    (amount - self._tokens) / self.refill_per_second,
+                )
+
+            self._sleep(wait_seconds)
+            waited += wait_seconds
+
+    def adjust(self, amount: float) -> None:
+        """
+        Take (positive) or return (negative) tokens without waiting, e.g. when the
+        real cost of an operation is known after it finished
+        """
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+    def block_for(self, seconds: float) -> None:
+        """
+        Do not hand out tokens during the provided time
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, self._clock() + seconds)
+
+
+class RateLimiter:
+    """
+    Limit the requests and the tokens used per minute of an API
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int | None,
+        tokens_per_minute: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        A None limit is not enforced
+
+        * clock, sleep: source of the time and how to wait, replaced by the tests
+        """
+        self._sleep = sleep
+        self.requests = (
+            TokenBucket(requests_per_minute, requests_per_minute / 60, clock, sleep)
+            if requests_per_minute is not None
+            else None
+        )
+        self.tokens = (
+            TokenBucket(tokens_per_minute, tokens_per_minute / 60, clock, sleep)
+            if tokens_per_minute is not None
+            else None
+        )
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Wait until a request using the estimated tokens can be sent. Return the
+        seconds waited.
+        """
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None and tokens > 0:
+            waited += self.tokens.acquire(tokens)
+        return waited
+
+    def record_usage(self, estimated_tokens: int, used_tokens: int) -> None:
+        """
+        Correct the token bucket with the real usage of a request
+        """
+        if self.tokens is not None:
+            self.tokens.adjust(used_tokens - estimated_tokens)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stop sending requests during the provided time, e.g. after a 429
+        """
+        if self.requests is None and self.tokens is None:
+            self._sleep(seconds)
+            return
+
+        if self.requests is not None:
+            self.requests.block_for(seconds)
+        if self.tokens is not None:
+            self.tokens.block_for(seconds)
@@ -0,0 +1,21 @@
+import pytest
+
+from src.db.database import Database
+from src.telegram import bot
+
+
+@pytest.fixture
+def telegram_env(monkeypatch):
+    """
+    Credentials of the fake Bot API, two chats and short waits between retries
+    """
+    monkeypatch.setenv("TELEGRAM_BOT_API_KEY", "1:test")
+    monkeypatch.setenv("TELEGRAM_USER_CHAT_ID", "100,200")
+    monkeypatch.setattr(bot, "DEFAULT_RETRY_AFTER_SECONDS", 0.01)
+
+
+@pytest.fixture
+def database(tmp_path):
+    db = Database(str(tmp_path / "news.db"))
+    yield db
+    db.close()
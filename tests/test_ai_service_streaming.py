@@ -0,0 +1,82 @@
+import pytest
+
+from src.ai.batcher import TokenBudgetBatcher
+from src.ai.provider.openai import OpenAIModel
+from src.services.ai_service import AiService
+from src.testing.fakes import FakeOpenAIServer
+from src.utils.rate_limiter import RateLimiter
+
+HEADLINES = [f"Headline number {i} about the news of the day" for i in range(12)]
+
+
+def classify(
+    server: FakeOpenAIServer, stream_output: bool, compact_output: bool = True
+) -> list[list[str]]:
+    """
+    Titles of the articles of every group yielded by the service
+    """
+    service = AiService(
+        OpenAIModel(api_key="test", base_url=server.url + "/v1"),
+        compact_output=compact_output,
+        stream_output=stream_output,
+        rate_limiter=RateLimiter(1000, 10**9),
+        batcher=TokenBudgetBatcher(max_batch_size=len(HEADLINES)),
+    )
+    return [
+        [x.title for x in articles]
+        for articles in service.classify_news_stream(HEADLINES)
+    ]
+
+
+@pytest.mark.parametrize("stream_output", [True, False])
+def test_every_headline_is_classified_once(stream_output):
+    with FakeOpenAIServer(0, 10**6) as server:
+        groups = classify(server, stream_output)
+
+    titles = [x for group in groups for x in group]
+    assert sorted(titles) == sorted(HEADLINES)
+    assert server.requests == 1
+
+
+def test_streamed_articles_are_yielded_before_the_response_finishes():
+    with FakeOpenAIServer(0, 10**6) as server:
+        groups = classify(server, stream_output=True)
+
+    assert len(groups) > 1
+
+
+@pytest.mark.parametrize("stream_output", [True, False])
+def test_truncated_response_classifies_the_missing_headlines(stream_output):
+    # Room for the first articles of the response only
+    with FakeOpenAIServer(0, 10**6, max_response_characters=600) as server:
+        groups = classify(server, stream_output)
+
+    titles = [x for group in groups for x in group]
+    assert sorted(titles) == sorted(HEADLINES)
+    assert server.requests > 1
+
+
+@pytest.mark.parametrize("stream_output", [True, False])
+def test_rate_limited_requests_are_sent_again(stream_output):
+    # The OpenAI client retries twice by itself, the service handles the rest
+    with FakeOpenAIServer(0, 10**6, rate_limited_requests=4) as server:
+        groups = classify(server, stream_output)
+
+    titles = [x for group in groups for x in group]
+    assert sorted(titles) == sorted(HEADLINES)
+    assert server.rate_limited_requests == 0
+
+
+def test_truncated_stream_does_not_emit_articles_with_echoed_titles_again():
+    # The model repeats the headlines with quotes and extra whitespace
+    with FakeOpenAIServer(
+        0, 10**6, max_response_characters=1200, title_format='"  {} "'
+    ) as server:
+        groups = classify(server, stream_output=True, compact_output=False)
+
+    # The articles classified again keep the title of the model
+    titles = [x.strip('" ') for group in groups for x in group]
+    assert sorted(titles) == sorted(HEADLINES)
+    # Only the headlines missing in the first response are sent again
+    assert server.requests > 1
+    assert server.headlines < 2 * len(HEADLINES)
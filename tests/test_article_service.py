@@ -0,0 +1,118 @@
+from src.db.database import Database
+from src.db.entity.newspaper import Newspaper
+from src.db.repository.newspaper_repository import NewspaperRepository
+from src.domain.article import Article
+from src.services.article_service import ArticleService
+from src.services.category_service import CategoryService
+
+
+def store(db: Database, titles: list[str], newspaper: str = "Paper") -> int:
+    """
+    Save the headlines for the newspaper and return its id
+    """
+    newspaper_id = NewspaperRepository(db).get_or_create_id(
+        Newspaper(name=newspaper, url=f"https://{newspaper.lower()}.example")
+    )
+    category_ids = CategoryService(db).save_categories(["sport"])
+    ArticleService(db).save_articles(
+        [
+            Article(
+                title=x,
+                description="Text",
+                category="sport",
+                english_translation=f"Translation of {x}",
+            )
+            for x in titles
+        ],
+        category_ids,
+        newspaper_id,
+    )
+    return newspaper_id
+
+
+def test_new_articles_keep_their_order_without_the_stored_ones(database):
+    store(database, ["Stored one", "Stored two"])
+    service = ArticleService(database)
+
+    titles = ["New one", "Stored two", "New two", "Stored one", "New three"]
+
+    assert service.filter_new_articles(titles) == ["New one", "New two", "New three"]
+
+
+def test_repeated_headlines_of_the_list_are_kept_once(database):
+    service = ArticleService(database)
+
+    titles = ["Same headline", "Other", "  same   HEADLINE ", "Other"]
+
+    assert service.filter_new_articles(titles) == ["Same headline", "Other"]
+
+
+def test_only_the_articles_of_the_newspaper_are_compared(database):
+    other_id = store(database, ["Shared headline"], newspaper="Other")
+    paper_id = store(database, ["Own headline"], newspaper="Paper")
+    service = ArticleService(database)
+
+    titles = ["Shared headline", "Own headline"]
+
+    assert service.filter_new_articles(titles) == []
+    assert service.filter_new_articles(titles, paper_id) == ["Shared headline"]
+    assert service.filter_new_articles(titles, other_id) == ["Own headline"]
+
+
+def test_many_headlines_are_filtered_in_chunks(database):
+    stored = [f"Stored headline {i}" for i in range(1500)]
+    store(database, stored)
+    service = ArticleService(database)
+
+    titles = stored + [f"New headline {i}" for i in range(1500)]
+
+    assert service.filter_new_articles(titles) == titles[1500:]
+
+
+def test_near_duplicate_of_a_stored_headline_is_removed(database):
+    store(database, ["Feuerwehr löscht Großbrand in einer Lagerhalle in Fürth"])
+    service = ArticleService(database)
+
+    titles = [
+        "Feuerwehr löscht Großbrand in einer Lagerhalle in Fürth!",
+        "Feuerwehr löscht Großbrand in der Lagerhalle in Fürth",
+        "Stadtrat beschließt neuen Haushalt für das kommende Jahr",
+    ]
+
+    assert service.filter_near_duplicates(titles, 0.8) == [titles[2]]
+
+
+def test_near_duplicates_within_the_list_are_kept_once(database):
+    service = ArticleService(database)
+
+    titles = [
+        "Der Club gewinnt das Derby gegen Fürth mit 2:1",
+        "Der Club gewinnt das Derby gegen Fürth mit 2:1 - Video",
+        "Unwetterwarnung für ganz Mittelfranken am Wochenende",
+    ]
+
+    assert service.filter_near_duplicates(titles, 0.7) == [titles[0], titles[2]]
+
+
+def test_different_headlines_sharing_words_are_kept(database):
+    store(database, ["Der Club gewinnt das Derby gegen Fürth"])
+    service = ArticleService(database)
+
+    titles = [
+        "Der Club verliert das Pokalspiel gegen Bayern",
+        "Fürth gewinnt das Derby der Frauen gegen den Club",
+    ]
+
+    assert service.filter_near_duplicates(titles, 0.8) == titles
+
+
+def test_only_the_near_duplicates_of_the_newspaper_are_compared(database):
+    other_id = store(database, ["Neue Straßenbahnlinie fährt ab Montag"], "Other")
+    paper_id = store(database, ["Ein anderer Artikel"], "Paper")
+    service = ArticleService(database)
+
+    titles = ["Neue Straßenbahnlinie fährt ab Montag."]
+
+    assert service.filter_near_duplicates(titles, 0.8) == []
+    assert service.filter_near_duplicates(titles, 0.8, paper_id) == titles
+    assert service.filter_near_duplicates(titles, 0.8, other_id) == []
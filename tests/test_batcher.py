@@ -0,0 +1,85 @@
+import pytest
+
+from src.ai.batcher import TokenBudgetBatcher
+from src.ai.tokens import estimate_tokens
+
+# 10 input tokens each
+HEADLINES = [f"Headline {i:02} about the news of the day" for i in range(20)]
+
+
+def batch_tokens(batcher: TokenBudgetBatcher, batch: list[str]) -> tuple[int, int]:
+    """
+    Input and expected output tokens of a batch
+    """
+    input_tokens = sum(estimate_tokens(x) for x in batch)
+    return input_tokens, batcher.estimate_output_tokens(input_tokens, len(batch))
+
+
+def test_batches_keep_the_order_within_the_budget():
+    batcher = TokenBudgetBatcher(
+        max_batch_tokens=300, initial_output_ratio=2.0, output_overhead_tokens=5
+    )
+
+    batches = batcher.create_batches(HEADLINES)
+
+    assert [x for batch in batches for x in batch] == HEADLINES
+    for batch in batches:
+        input_tokens, output_tokens = batch_tokens(batcher, batch)
+        assert input_tokens + output_tokens <= 300
+
+
+def test_batch_is_split_at_the_token_budget():
+    # Every headline takes 10 + 10 * 2 + 5 = 35 tokens
+    batcher = TokenBudgetBatcher(
+        max_batch_tokens=100, initial_output_ratio=2.0, output_overhead_tokens=5
+    )
+
+    batches = batcher.create_batches(HEADLINES[:7])
+
+    assert [len(x) for x in batches] == [2, 2, 2, 1]
+
+
+@pytest.mark.parametrize(
+    "options, sizes",
+    [
+        ({"max_output_tokens": 50}, [2, 2, 2, 1]),
+        ({"max_batch_size": 4}, [4, 3]),
+    ],
+)
+def test_output_tokens_and_size_limit_the_batches(options, sizes):
+    batcher = TokenBudgetBatcher(
+        max_batch_tokens=10**6,
+        initial_output_ratio=2.0,
+        output_overhead_tokens=5,
+        **options,
+    )
+
+    assert [len(x) for x in batcher.create_batches(HEADLINES[:7])] == sizes
+
+
+def test_headline_over_the_budget_gets_its_own_batch():
+    batcher = TokenBudgetBatcher(max_batch_tokens=100, initial_output_ratio=2.0)
+    long_headline = "x" * 1000
+
+    batches = batcher.create_batches(["short", long_headline, "short"])
+
+    assert batches == [["short"], [long_headline], ["short"]]
+
+
+def test_output_ratio_is_learnt_from_the_usage():
+    batcher = TokenBudgetBatcher(
+        max_batch_tokens=300,
+        initial_output_ratio=4.0,
+        output_overhead_tokens=0,
+        smoothing=0.5,
+    )
+    input_tokens = sum(estimate_tokens(x) for x in HEADLINES[:10])
+
+    batcher.record_usage(HEADLINES[:10], completion_tokens=input_tokens * 2)
+
+    assert batcher.output_ratio == pytest.approx(3.0)
+    # A smaller ratio fits more headlines in the same budget
+    before = TokenBudgetBatcher(max_batch_tokens=300, output_overhead_tokens=0)
+    assert len(batcher.create_batches(HEADLINES)) < len(
+        before.create_batches(HEADLINES)
+    )
@@ -0,0 +1,125 @@
+import time
+from typing import Optional
+
+import pytest
+
+from src.ai.provider.base import ModelResponse
+from src.ai.provider.cached import CachedAIModel
+from src.domain.news import CompactExtractedNews, ExtractedNews
+
+
+class CountingModel:
+    """
+    Model answering every prompt with its text and counting the calls
+    """
+
+    def __init__(self, finish_reason: str = "stop"):
+        self.used_tokens = 0
+        self.calls = 0
+        self.finish_reason = finish_reason
+
+    def generate(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> ModelResponse:
+        self.calls += 1
+        return ModelResponse(
+            content=f"Answer to {prompt}",
+            raw_response=None,
+            metadata={
+                "finish_reason": self.finish_reason,
+                "usage": {"total_tokens": 10},
+            },
+        )
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "cache" / "ai_cache.db")
+
+
+def test_same_prompt_is_answered_from_the_cache(cache_path):
+    model = CountingModel()
+    cached = CachedAIModel(model, cache_path)
+
+    first = cached.generate("prompt", system_prompt="system")
+    second = cached.generate("prompt", system_prompt="system")
+
+    assert model.calls == 1
+    assert second.content == first.content
+    assert second.metadata["cached"]
+    assert cached.stats() == {"hits": 1, "misses": 1, "saved_tokens": 10}
+    cached.close()
+
+    # The responses are kept on disk
+    reopened = CachedAIModel(model, cache_path)
+    reopened.generate("prompt", system_prompt="system")
+    assert model.calls == 1
+    reopened.close()
+
+
+def test_every_part_of_the_request_is_part_of_the_key(cache_path):
+    model = CountingModel()
+    cached = CachedAIModel(model, cache_path)
+
+    cached.generate("prompt", response_format=ExtractedNews)
+    cached.generate("other prompt", response_format=ExtractedNews)
+    cached.generate("prompt", system_prompt="system", response_format=ExtractedNews)
+    cached.generate("prompt", response_format=CompactExtractedNews)
+    cached.generate("prompt", response_format=ExtractedNews)
+
+    assert model.calls == 4
+    cached.close()
+
+
+def test_expired_responses_are_requested_again(cache_path):
+    model = CountingModel()
+    cached = CachedAIModel(model, cache_path, ttl_seconds=0.05)
+
+    cached.generate("prompt")
+    time.sleep(0.1)
+    cached.generate("prompt")
+
+    assert model.calls == 2
+    cached.close()
+
+
+def test_least_recently_used_responses_are_removed_over_the_size(cache_path):
+    model = CountingModel()
+    # Room for about two responses
+    cached = CachedAIModel(model, cache_path, max_size_mb=200 / 1024 / 1024)
+
+    cached.generate("first")
+    cached.generate("second")
+    # Reading the first one makes the second the least recently used
+    cached.generate("first")
+    cached.generate("third")
+    assert model.calls == 3
+
+    cached.generate("first")
+    assert model.calls == 3
+    cached.generate("second")
+    assert model.calls == 4
+    cached.close()
+
+
+def test_truncated_responses_are_not_cached(cache_path):
+    model = CountingModel(finish_reason="length")
+    cached = CachedAIModel(model, cache_path)
+
+    cached.generate("prompt")
+    cached.generate("prompt")
+
+    assert model.calls == 2
+    cached.close()
+
+
+def test_streamed_response_is_cached_when_it_is_complete(cache_path):
+    model = CountingModel()
+    cached = CachedAIModel(model, cache_path)
+
+    first = "".join(cached.generate_stream("prompt"))
+    second = "".join(cached.generate_stream("prompt"))
+
+    assert first == second == "Answer to prompt"
+    assert model.calls == 1
+    cached.close()
@@ -0,0 +1,76 @@
+from src.services.clustering_service import ClusteringService
+
+NORD_BAYERN = [
+    "Bundestag beschließt neues Heizungsgesetz nach langer Debatte",
+    "Club gewinnt Derby gegen Fürth in letzter Minute",
+    "Neue Straßenbahnlinie in Nürnberg fährt ab Montag",
+]
+NUERNBERGER_NACHRICHTEN = [
+    "Heizungsgesetz: Bundestag beschließt Reform nach Debatte",
+    "Großbrand in Fürther Lagerhalle: Feuerwehr im Großeinsatz",
+]
+
+
+def test_same_story_of_another_newspaper_is_grouped_with_the_first_one():
+    service = ClusteringService(min_similarity=0.5)
+    service.add("Nord Bayern", NORD_BAYERN)
+
+    stories = service.add("Nürnberger Nachrichten", NUERNBERGER_NACHRICHTEN)
+
+    assert stories[0].representative.title == NORD_BAYERN[0]
+    assert [x.title for x in stories[0].linked] == [NUERNBERGER_NACHRICHTEN[0]]
+    assert stories[1].representative.title == NUERNBERGER_NACHRICHTEN[1]
+    assert stories[1].linked == []
+    assert len(service.clusters) == 4
+
+
+def test_unrelated_headlines_are_not_grouped():
+    service = ClusteringService(min_similarity=0.5)
+
+    first = service.add("Nord Bayern", NORD_BAYERN)
+    second = service.add("Nürnberger Nachrichten", NUERNBERGER_NACHRICHTEN[1:])
+
+    assert all(len(x.headlines) == 1 for x in first + second)
+
+
+def test_a_story_has_at_most_one_headline_of_every_newspaper():
+    # Both headlines are similar enough to the story
+    service = ClusteringService(min_similarity=0.3)
+    service.add("Nord Bayern", [NORD_BAYERN[1]])
+
+    stories = service.add(
+        "Nürnberger Nachrichten",
+        [
+            "Derby: Club gewinnt gegen Fürth in letzter Minute",
+            "Club gewinnt Derby gegen Fürth in der Nachspielzeit",
+        ],
+    )
+
+    assert stories[0].representative.newspaper == "Nord Bayern"
+    assert stories[1].representative.newspaper == "Nürnberger Nachrichten"
+    assert len(stories[0].headlines) == 2
+
+
+def test_related_headlines_of_the_stories_reported_first():
+    service = ClusteringService(min_similarity=0.5)
+    stories = service.add("Nord Bayern", NORD_BAYERN)
+    assert service.related_headlines("Nord Bayern", stories) == {}
+
+    service.add("Nürnberger Nachrichten", NUERNBERGER_NACHRICHTEN)
+
+    related = service.related_headlines("Nord Bayern", stories)
+    assert list(related) == [NORD_BAYERN[0]]
+    assert related[NORD_BAYERN[0]][0].newspaper == "Nürnberger Nachrichten"
+
+
+def test_batches_do_not_change_the_stories():
+    headlines = [f"Meldung Nummer {i} über das Wetter in der Stadt" for i in range(9)]
+
+    small = ClusteringService(min_similarity=0.9, batch_size=2)
+    large = ClusteringService(min_similarity=0.9, batch_size=512)
+    for service in (small, large):
+        service.add("Nord Bayern", NORD_BAYERN)
+
+    assert small.add("Nürnberger Nachrichten", headlines) == large.add(
+        "Nürnberger Nachrichten", headlines
+    )
@@ -0,0 +1,113 @@
+import json
+
+from src.ai.batcher import TokenBudgetBatcher
+from src.ai.provider.base import ModelResponse
+from src.domain.news import CompactExtractedNews
+from src.services.ai_service import AiService
+from src.utils.rate_limiter import RateLimiter
+
+HEADLINES = ["Der Club gewinnt", "Neue Brücke in Fürth", "Regen am Wochenende"]
+CATEGORIES = ["sport", "local", "weather"]
+
+
+class CompactModel:
+    """
+    Model answering every request with the provided compact articles
+    """
+
+    def __init__(self, news: list[dict]):
+        self.news = news
+        self.used_tokens = 0
+        self.prompts: list[str] = []
+        self.response_formats: list[type] = []
+
+    def generate(self, prompt: str, system_prompt=None, **kwargs) -> ModelResponse:
+        self.prompts.append(prompt)
+        self.response_formats.append(kwargs["response_format"])
+        return ModelResponse(json.dumps({"news": self.news}), None)
+
+
+def compact(index: int, category_id: int = 0) -> dict:
+    return {
+        "index": index,
+        "category_id": category_id,
+        "translation": f"Translation {index}",
+        "description": f"Description {index}",
+    }
+
+
+def classify(model: CompactModel) -> list:
+    service = AiService(
+        model,
+        compact_output=True,
+        categories=CATEGORIES,
+        rate_limiter=RateLimiter(None),
+        batcher=TokenBudgetBatcher(max_batch_size=len(HEADLINES)),
+    )
+    return [x for batch in service.classify_news_stream(HEADLINES) for x in batch]
+
+
+def test_compact_articles_are_rebuilt_from_the_scraped_headlines():
+    model = CompactModel([compact(2, 2), compact(0, 0), compact(1, 1)])
+
+    articles = classify(model)
+
+    assert model.prompts == [
+        "0. Der Club gewinnt\n1. Neue Brücke in Fürth\n2. Regen am Wochenende"
+    ]
+    assert model.response_formats == [CompactExtractedNews]
+    assert [x.model_dump() for x in articles] == [
+        {
+            "title": "Regen am Wochenende",
+            "description": "Description 2",
+            "category": "weather",
+            "english_translation": "Translation 2",
+        },
+        {
+            "title": "Der Club gewinnt",
+            "description": "Description 0",
+            "category": "sport",
+            "english_translation": "Translation 0",
+        },
+        {
+            "title": "Neue Brücke in Fürth",
+            "description": "Description 1",
+            "category": "local",
+            "english_translation": "Translation 1",
+        },
+    ]
+
+
+def test_repeated_indices_keep_their_first_article():
+    model = CompactModel([compact(0, 0), compact(1, 1), compact(0, 2)])
+
+    articles = classify(model)
+
+    assert [(x.title, x.category) for x in articles] == [
+        ("Der Club gewinnt", "sport"),
+        ("Neue Brücke in Fürth", "local"),
+    ]
+
+
+def test_indices_out_of_the_batch_are_ignored():
+    model = CompactModel([compact(-1), compact(3), compact(1), compact(100)])
+
+    articles = classify(model)
+
+    assert [x.title for x in articles] == ["Neue Brücke in Fürth"]
+
+
+def test_an_out_of_range_index_does_not_hide_a_valid_repetition():
+    model = CompactModel([compact(5), compact(2), compact(2)])
+
+    articles = classify(model)
+
+    assert [x.title for x in articles] == ["Regen am Wochenende"]
+
+
+def test_unknown_categories_are_other():
+    model = CompactModel([compact(0, 3), compact(1, -1)])
+
+    articles = classify(model)
+
+    assert [x.category for x in articles] == ["other", "other"]
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+import src.services.concurrent_scraper_service as concurrent_scraper_service
+from src.domain.newspaper import Newspaper
+from src.scraper.custom.twenty_minutes import TWENTY_MINUTES_HEADLINES
+from src.services.concurrent_scraper_service import ConcurrentScraperService
+
+HUNG = "Hung"
+
+
+class HangingScraper:
+    """
+    Browser scraper of the workers that never finishes the newspaper named Hung
+    until it is released
+    """
+
+    release = threading.Event()
+
+    def __init__(self, browser_pool, **kwargs):
+        pass
+
+    def extract_news(self, newspaper: Newspaper) -> list[str]:
+        if newspaper.name == HUNG:
+            HangingScraper.release.wait(10)
+        return [f"Headline of {newspaper.name}"]
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def hanging_browser(monkeypatch):
+    HangingScraper.release = threading.Event()
+    monkeypatch.setattr(concurrent_scraper_service, "ScraperService", HangingScraper)
+    yield HangingScraper
+    HangingScraper.release.set()
+
+
+def newspaper(name: str) -> Newspaper:
+    return Newspaper(
+        name=name,
+        url=f"https://example.com/{name}",
+        extraction=TWENTY_MINUTES_HEADLINES,
+        persist_storage_state=False,
+    )
+
+
+def test_a_hung_site_yields_none_without_delaying_the_rest(hanging_browser):
+    service = ConcurrentScraperService(
+        max_concurrency=2, timeout_seconds=1, block_resources=False
+    )
+    finished_at: dict[str, float] = {}
+    start = time.monotonic()
+    try:
+        results = {}
+        for paper, headlines in service.scrape_iter(
+            [newspaper(HUNG), newspaper("First"), newspaper("Second")]
+        ):
+            results[paper.name] = headlines
+            finished_at[paper.name] = time.monotonic() - start
+    finally:
+        service.close()
+
+    assert results == {
+        HUNG: None,
+        "First": ["Headline of First"],
+        "Second": ["Headline of Second"],
+    }
+    assert finished_at["First"] < 0.9
+    assert finished_at["Second"] < 0.9
+    assert 1 <= finished_at[HUNG] < 3
+
+
+def test_stop_event_abandons_the_running_sites(hanging_browser):
+    service = ConcurrentScraperService(
+        max_concurrency=1, timeout_seconds=30, block_resources=False
+    )
+    stop_event = threading.Event()
+    stop_event.set()
+    start = time.monotonic()
+    try:
+        results = list(
+            service.scrape_iter([newspaper(HUNG), newspaper("Queued")], stop_event)
+        )
+        workers = list(service._workers)
+    finally:
+        service.close()
+
+    assert results == []
+    # The hung worker is left behind instead of being waited for by `close`
+    assert workers == []
+    assert time.monotonic() - start < 5
+
+
+def test_close_stops_the_live_workers_when_others_were_abandoned(hanging_browser):
+    for _ in range(5):
+        service = ConcurrentScraperService(
+            max_concurrency=1, timeout_seconds=1, block_resources=False
+        )
+        service.start()
+        abandoned = service._workers[0]
+        # Abandoned while waiting for a task, it must not take the stop signal of
+        # the live worker
+        service._abandon_worker(abandoned)
+        live = service._workers[0]
+
+        service.close()
+
+        assert not live.is_alive()
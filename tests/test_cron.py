@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.utils.cron import CronExpression
+
+
+def brute_force_next(expression: CronExpression, moment: datetime) -> datetime:
+    """
+    First matching minute found by checking every minute after the moment
+    """
+    candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    while True:
+        weekday = (candidate.weekday() + 1) % 7
+        day = candidate.day in expression.days
+        if expression._any_day or expression._any_weekday:
+            matches_day = day and weekday in expression.weekdays
+        else:
+            matches_day = day or weekday in expression.weekdays
+        if (
+            candidate.minute in expression.minutes
+            and candidate.hour in expression.hours
+            and candidate.month in expression.months
+            and matches_day
+        ):
+            return candidate
+        candidate += timedelta(minutes=1)
+
+
+@pytest.mark.parametrize(
+    "expression, moment, expected",
+    [
+        ("0 * * * *", datetime(2024, 5, 1, 10, 0), datetime(2024, 5, 1, 11, 0)),
+        ("*/15 * * * *", datetime(2024, 5, 1, 10, 7, 30), datetime(2024, 5, 1, 10, 15)),
+        ("30 6 * * *", datetime(2024, 5, 1, 7, 0), datetime(2024, 5, 2, 6, 30)),
+        ("0 6-22 * * 1-5", datetime(2024, 5, 3, 23, 0), datetime(2024, 5, 6, 6, 0)),
+        ("0 8 * * 0", datetime(2024, 5, 1, 0, 0), datetime(2024, 5, 5, 8, 0)),
+        ("0 8 * * 7", datetime(2024, 5, 1, 0, 0), datetime(2024, 5, 5, 8, 0)),
+        ("0 0 29 2 *", datetime(2024, 3, 1, 0, 0), datetime(2028, 2, 29, 0, 0)),
+        ("0 0 31 12 *", datetime(2024, 12, 31, 0, 0), datetime(2025, 12, 31, 0, 0)),
+        ("5,10 0 1 * *", datetime(2024, 1, 1, 0, 5), datetime(2024, 1, 1, 0, 10)),
+        ("0 12 10/5 * *", datetime(2024, 1, 26, 0, 0), datetime(2024, 1, 30, 12, 0)),
+    ],
+)
+def test_next_after(expression, moment, expected):
+    assert CronExpression(expression).next_after(moment) == expected
+
+
+def test_day_of_month_or_day_of_week_when_both_are_restricted():
+    # The 13th or any friday
+    expression = CronExpression("0 0 13 * 5")
+
+    assert expression.next_after(datetime(2024, 5, 1)) == datetime(2024, 5, 3)
+    assert expression.next_after(datetime(2024, 5, 10)) == datetime(2024, 5, 13)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ["*/7 * * * *", "0 */5 * * 2-4", "15 3 1,15 * *", "0 0 * 2 1", "0 9 1-7 * 1"],
+)
+def test_matches_the_brute_force_search(expression):
+    cron = CronExpression(expression)
+    moment = datetime(2024, 1, 30, 22, 45)
+    for _ in range(50):
+        expected = brute_force_next(cron, moment)
+        assert cron.next_after(moment) == expected
+        moment = expected + timedelta(seconds=30)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    ["* * * *", "60 * * * *", "* 24 * * *", "* * 0 * *", "*/0 * * * *", "5-1 * * * *"],
+)
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronExpression(expression)
+
+
+def test_expression_that_never_matches():
+    with pytest.raises(ValueError):
+        CronExpression("0 0 31 2 *").next_after(datetime(2024, 1, 1))
@@ -0,0 +1,203 @@
+import sqlite3
+import threading
+
+import pytest
+
+from src.db.database import Database
+from src.db.entity.category import Category
+from src.db.entity.news import News
+from src.db.entity.newspaper import Newspaper
+from src.db.repository.category_repository import CategoryRepository
+from src.db.repository.news_repository import NewsRepository
+from src.db.repository.newspaper_repository import NewspaperRepository
+
+# Schema of the database before the migrations existed
+PRE_MIGRATION_SCHEMA = """
+CREATE TABLE newspaper (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL
+);
+CREATE TABLE category (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE news (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    newspaper_id INTEGER NOT NULL,
+    article TEXT NOT NULL,
+    description TEXT,
+    translation TEXT,
+    category_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (newspaper_id) REFERENCES newspaper (id),
+    FOREIGN KEY (category_id) REFERENCES category (id)
+);
+INSERT INTO newspaper (name, url) VALUES ('Paper', 'https://paper.example');
+INSERT INTO category (name) VALUES ('sport');
+INSERT INTO news (newspaper_id, article, category_id) VALUES
+    (1, 'Old headline', 1),
+    (1, 'old  HEADLINE', 1),
+    (1, 'Another headline', 1);
+"""
+
+
+def create_pre_migration_database(path: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.executescript(PRE_MIGRATION_SCHEMA)
+    conn.close()
+
+
+def test_migrations_are_applied_to_a_database_created_before_them(tmp_path):
+    path = str(tmp_path / "news.db")
+    create_pre_migration_database(path)
+
+    db = Database(path)
+    try:
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == 3
+            hashes = [
+                row[0]
+                for row in conn.execute("SELECT article_hash FROM news ORDER BY id")
+            ]
+            indexes = {row["name"] for row in conn.execute("PRAGMA index_list(news)")}
+        news = NewsRepository(db)
+
+        # The first of the duplicates keeps the fingerprint, the rest none
+        assert hashes[0] is not None and hashes[1] is None
+        assert hashes[2] is not None
+        assert "idx_news_article_hash" in indexes
+        assert len(news.get_all()) == 3
+        assert news.get_by_name("OLD headline").article == "Old headline"
+    finally:
+        db.close()
+
+    # Opening it again does not apply them twice
+    Database(path).close()
+
+
+def test_same_headline_of_a_newspaper_is_stored_once(database):
+    newspaper_id = NewspaperRepository(database).get_or_create_id(
+        Newspaper(name="Paper", url="https://paper.example")
+    )
+    category = CategoryRepository(database).create(Category(name="sport"))
+    assert category.id is not None
+    news = NewsRepository(database)
+
+    first = news.create(
+        News(newspaper_id=newspaper_id, category_id=category.id, article="Headline")
+    )
+    second = news.create(
+        News(newspaper_id=newspaper_id, category_id=category.id, article=" HEADLINE")
+    )
+
+    assert first.id == second.id
+    assert len(news.get_all()) == 1
+
+
+def test_repository_writes_are_part_of_the_outer_transaction(database):
+    newspapers = NewspaperRepository(database)
+    categories = CategoryRepository(database)
+    news = NewsRepository(database)
+
+    with pytest.raises(RuntimeError):
+        with database.transaction():
+            newspaper = newspapers.create(Newspaper(name="Paper", url="https://x"))
+            category = categories.create(Category(name="sport"))
+            assert newspaper.id is not None and category.id is not None
+            news.create(
+                News(
+                    newspaper_id=newspaper.id,
+                    category_id=category.id,
+                    article="Headline",
+                )
+            )
+            raise RuntimeError("The save failed")
+
+    assert newspapers.get_all() == []
+    assert categories.get_all() == []
+    assert news.get_all() == []
+    # The ids cached in the rolled back transaction are forgotten
+    assert newspapers.cache.get("Paper") is None
+    assert categories.cache.get("sport") is None
+
+
+def test_every_thread_reuses_its_own_connection(database):
+    with database.get_connection() as first, database.get_connection() as second:
+        assert first is second
+        assert first.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    connections = []
+
+    def connect() -> None:
+        with database.get_connection() as conn:
+            connections.append(conn)
+
+    thread = threading.Thread(target=connect)
+    thread.start()
+    thread.join()
+
+    assert connections[0] is not first
+    assert database.connections_opened == 2
+    # The connection of a finished thread is closed
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute("SELECT 1")
+
+
+def test_rolled_back_nested_transaction_rolls_back_the_outer_one(database):
+    categories = CategoryRepository(database)
+
+    with pytest.raises(RuntimeError):
+        with database.transaction():
+            categories.create_many(["sport"])
+            with database.transaction():
+                categories.create_many(["economy"])
+                raise RuntimeError("The nested write failed")
+
+    assert categories.get_all() == []
+
+    with database.transaction():
+        categories.create_many(["sport"])
+        with database.transaction():
+            categories.create_many(["economy"])
+
+    assert sorted(x.name for x in categories.get_all()) == ["economy", "sport"]
+
+
+def test_nested_transactions_commit_once_at_the_outermost_level(database):
+    categories = CategoryRepository(database)
+
+    with database.transaction():
+        with database.transaction():
+            categories.create_many(["sport"])
+        # Another connection does not see the write before the outer commit
+        other = sqlite3.connect(database.db_path)
+        assert other.execute("SELECT COUNT(*) FROM category").fetchone()[0] == 0
+
+    assert other.execute("SELECT COUNT(*) FROM category").fetchone()[0] == 1
+    other.close()
+
+
+def test_create_many_returns_the_ids_in_order(database):
+    newspaper_id = NewspaperRepository(database).get_or_create_id(
+        Newspaper(name="Paper", url="https://paper.example")
+    )
+    category_id = CategoryRepository(database).create_many(["sport"])["sport"]
+    news = NewsRepository(database)
+    stored = news.create(
+        News(newspaper_id=newspaper_id, category_id=category_id, article="Stored")
+    )
+
+    ids = news.create_many(
+        [
+            News(newspaper_id=newspaper_id, category_id=category_id, article=x)
+            for x in ["First", "stored ", "Second", "FIRST"]
+        ]
+    )
+
+    # Headlines already stored, also earlier in the same list, keep their id
+    assert ids[1] == stored.id
+    assert ids[3] == ids[0]
+    assert len(set(ids)) == 3
+    assert [news.get(x).article for x in ids] == ["First", "Stored", "Second", "First"]
+    assert len(news.get_all()) == 3
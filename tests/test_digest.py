@@ -0,0 +1,82 @@
+from src.domain.article import Article
+from src.domain.story_cluster import ClusteredHeadline
+from src.telegram.digest import DigestRenderer, message_length
+
+
+def article(title: str, category: str = "sport", description: str = "Text") -> Article:
+    return Article(
+        title=title,
+        description=description,
+        category=category,
+        english_translation=f"Translation of {title}",
+    )
+
+
+def test_small_digest_is_a_single_message():
+    renderer = DigestRenderer()
+    news = [article("B", "sport"), article("A", "sport"), article("C", "economy")]
+
+    messages = renderer.render("Paper", news)
+
+    assert len(messages) == 1
+    message = messages[0]
+    assert message.startswith("**News from Paper (")
+    # Categories and the articles of every category are sorted
+    assert message.index("### Economy") < message.index("### Sport")
+    assert "1. *Translation of A*" in message
+    assert "2. *Translation of B*" in message
+    assert message.index("Translation of A") < message.index("Translation of B")
+
+
+def test_messages_are_split_between_articles_under_the_limit():
+    renderer = DigestRenderer(max_length=500)
+    news = [article(f"Headline {i:02}", description="x" * 80) for i in range(30)]
+
+    messages = renderer.render("Paper", news)
+
+    assert len(messages) > 1
+    assert all(message_length(x) <= 500 for x in messages)
+    for item in news:
+        entry = renderer.render_article(1, item, []).split("\n", 1)[1]
+        # Every article is complete in exactly one message
+        assert sum(entry in x for x in messages) == 1
+    # The category continues with its heading in the next messages
+    assert all(x.startswith("### Sport") for x in messages[1:])
+
+
+def test_length_is_counted_in_utf16_units():
+    renderer = DigestRenderer(max_length=300)
+    news = [article(f"Emoji {i}", description="😀" * 40) for i in range(6)]
+
+    messages = renderer.render("Paper", news)
+
+    assert all(message_length(x) <= 300 for x in messages)
+    assert any(len(x) < message_length(x) for x in messages)
+
+
+def test_article_longer_than_a_message_is_split():
+    renderer = DigestRenderer(max_length=200)
+    news = [article("Long", description="x" * 1000)]
+
+    messages = renderer.render("Paper", news)
+
+    assert len(messages) > 2
+    assert all(message_length(x) <= 200 for x in messages)
+    # Nothing is lost, even where a line is cut
+    assert "".join(messages).count("x") == 1000
+
+
+def test_related_headlines_are_listed_in_the_entry():
+    renderer = DigestRenderer()
+    related = {
+        "A": [
+            ClusteredHeadline(newspaper="Other paper", title="A in other words"),
+            ClusteredHeadline(newspaper="Third paper", title="Again A"),
+        ]
+    }
+
+    message = renderer.render("Paper", [article("A"), article("B")], related)[0]
+
+    assert "- *Also in Other paper:* A in other words" in message
+    assert "- *Also in Third paper:* Again A" in message
+    assert message.count("Also in") == 2
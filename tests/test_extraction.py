@@ -0,0 +1,114 @@
+import re
+from pathlib import Path
+
+import lxml.html
+import pytest
+from lxml import etree
+from pydantic import ValidationError
+
+import main
+from src.domain.headline_extraction import HeadlineExtractionSpec
+from src.scraper.custom.nord_bayern import NORD_BAYERN_HEADLINES
+from src.scraper.custom.twenty_minutes import TWENTY_MINUTES_HEADLINES
+from src.scraper.extraction import EXTRACT_SCRIPT, HeadlineExtractor
+
+PAGES_DIR = Path("benchmarks") / "pages"
+
+
+class FakePage:
+    """
+    Page recording the scripts evaluated in the browser
+    """
+
+    def __init__(self):
+        self.calls: list[tuple[str, dict]] = []
+
+    def evaluate(self, script: str, arguments: dict) -> list[str]:
+        self.calls.append((script, arguments))
+        return ["Headline"]
+
+
+def test_a_spec_needs_a_locator():
+    with pytest.raises(ValidationError):
+        HeadlineExtractionSpec()
+
+    assert HeadlineExtractionSpec(selector="h1 a").xpath is None
+
+
+def test_specs_are_immutable():
+    with pytest.raises(ValidationError):
+        NORD_BAYERN_HEADLINES.xpath = "//h1"  # type: ignore[misc]
+
+
+@pytest.mark.parametrize("newspaper", main.NEWSPAPERS, ids=lambda x: x.name)
+def test_the_specs_of_the_newspapers_are_valid(newspaper):
+    spec = newspaper.extraction
+    assert spec is not None
+
+    HeadlineExtractionSpec.model_validate(spec.model_dump())
+    if spec.xpath is not None:
+        etree.XPath(spec.xpath)
+    for pattern in spec.exclude_patterns:
+        re.compile(pattern)
+
+
+def test_compile_reuses_the_extractor_of_equal_specs():
+    first = HeadlineExtractor.compile(HeadlineExtractionSpec(xpath="//h1"))
+    second = HeadlineExtractor.compile(HeadlineExtractionSpec(xpath="//h1"))
+
+    assert first is second
+
+
+def test_the_page_is_evaluated_once_with_the_arguments_of_the_script():
+    spec = HeadlineExtractionSpec(
+        selector="h1 a", exclude_texts=("Anzeige",), exclude_patterns=("^Live",)
+    )
+    page = FakePage()
+
+    result = HeadlineExtractor.compile(spec).extract(page)  # type: ignore[arg-type]
+
+    assert result == ["Headline"]
+    assert len(page.calls) == 1
+    script, arguments = page.calls[0]
+    assert script == EXTRACT_SCRIPT
+    assert set(re.findall(r"spec\.(\w+)", EXTRACT_SCRIPT)) <= set(arguments)
+    assert arguments["selector"] == "h1 a"
+    assert arguments["exclude_texts"] == ("Anzeige",)
+    assert arguments["exclude_patterns"] == ("^Live",)
+
+
+def teaser_texts(tree, xpath: str, suffix: str) -> list[str]:
+    """
+    Headlines repeated by the teasers of the benchmark pages, without their suffix
+    """
+    texts = [x.text_content().removesuffix(suffix) for x in tree.xpath(xpath)]
+    return list(dict.fromkeys(texts))
+
+
+@pytest.mark.parametrize(
+    "file_name, spec, teaser_xpath, suffix",
+    [
+        (
+            "nord_bayern.html",
+            NORD_BAYERN_HEADLINES,
+            "//p[@class='teaser__text']",
+            ". Mehr dazu im Artikel.",
+        ),
+        (
+            "20_minutos.html",
+            TWENTY_MINUTES_HEADLINES,
+            "//p[@class='media-subtitle']",
+            ": las claves.",
+        ),
+    ],
+)
+def test_extracts_the_headlines_of_the_benchmark_pages(
+    file_name, spec, teaser_xpath, suffix
+):
+    tree = lxml.html.parse(str(PAGES_DIR / file_name)).getroot()
+
+    headlines = HeadlineExtractor.compile(spec).extract_from_tree(tree)
+
+    # The ads and links to other sites of the pages have no teaser text
+    assert headlines == teaser_texts(tree, teaser_xpath, suffix)
+    assert len(headlines) == 90
@@ -0,0 +1,27 @@
+import pytest
+
+from src.db.fingerprint import headline_fingerprint, normalize_headline
+
+
+@pytest.mark.parametrize(
+    "headline, expected",
+    [
+        ("Breaking News", "breaking news"),
+        ("  Breaking \t News\n", "breaking news"),
+        ("STRASSE in Nürnberg", "strasse in nürnberg"),
+        # Compatibility forms and full width characters are unified
+        ("ﬁnal ＮＥＷＳ", "final news"),
+        ("Straße", "strasse"),
+    ],
+)
+def test_normalize_headline(headline, expected):
+    assert normalize_headline(headline) == expected
+
+
+def test_fingerprint_ignores_case_and_whitespace_only():
+    assert headline_fingerprint("Breaking  News") == headline_fingerprint(
+        "breaking news "
+    )
+    assert headline_fingerprint("Breaking News") != headline_fingerprint(
+        "Breaking News!"
+    )
@@ -0,0 +1,68 @@
+import json
+import random
+
+from src.ai.json_stream import JsonListItemParser
+
+RESPONSE = {
+    "comment": 'a {fake} [list] with "quotes" and \\ backslashes',
+    "other": [{"ignored": True}],
+    "news": [
+        {"index": 0, "translation": "Braces { and } in a string"},
+        {"index": 1, "translation": 'Escaped "quote" and [brackets]'},
+        {"index": 2, "nested": {"values": [1, 2, {"deep": "]}"}]}},
+    ],
+    "after": {"news": [{"not": "the root key"}]},
+}
+
+
+def feed_in_chunks(text: str, sizes: list[int]) -> list:
+    parser = JsonListItemParser("news")
+    items = []
+    position = 0
+    for size in sizes:
+        items.extend(parser.feed(text[position : position + size]))
+        position += size
+    items.extend(parser.feed(text[position:]))
+    return items
+
+
+def test_returns_the_items_of_the_key_in_any_chunking():
+    text = json.dumps(RESPONSE)
+    generator = random.Random(0)
+
+    assert feed_in_chunks(text, [len(text)]) == RESPONSE["news"]
+    assert feed_in_chunks(text, [1] * len(text)) == RESPONSE["news"]
+    for _ in range(20):
+        sizes = [generator.randint(1, 12) for _ in range(len(text))]
+        assert feed_in_chunks(text, sizes) == RESPONSE["news"]
+
+
+def test_returns_every_item_as_soon_as_it_is_closed():
+    parser = JsonListItemParser("news")
+
+    assert parser.feed('{"news": [{"index": 0}, {"ind') == [{"index": 0}]
+    assert parser.feed('ex": 1}') == [{"index": 1}]
+    assert parser.feed("]}") == []
+
+
+def test_truncated_response_returns_only_the_complete_items():
+    text = json.dumps(RESPONSE)
+    cut = text.index('{"index": 2')
+
+    assert feed_in_chunks(text[: cut + 10], [5] * cut) == RESPONSE["news"][:2]
+
+
+def test_string_values_equal_to_the_key_are_not_keys():
+    text = json.dumps({"comment": "news", "other": [{"index": 0}], "news": []})
+    assert JsonListItemParser("news").feed(text) == []
+
+    # A root list has values but no keys
+    text = json.dumps(["news", [{"index": 0}]])
+    assert JsonListItemParser("news").feed(text) == []
+
+
+def test_unicode_and_escapes_are_decoded():
+    parser = JsonListItemParser("news")
+    text = json.dumps({"news": [{"title": "Schüsse in Nürnberg\né"}]})
+
+    assert parser.feed(text) == [{"title": "Schüsse in Nürnberg\né"}]
@@ -0,0 +1,157 @@
+import json
+import time
+
+import pytest
+
+from src.utils.metrics import SPAN_BUCKETS, Metrics
+
+
+def lines_of(text: str, metric: str) -> list[str]:
+    return [x for x in text.splitlines() if x.startswith(metric)]
+
+
+def test_spans_are_exported_as_cumulative_histograms():
+    metrics = Metrics()
+    metrics.observe("scrape", 0.05, newspaper="Nord Bayern")
+    metrics.observe("scrape", 0.3, newspaper="Nord Bayern")
+    metrics.observe("scrape", 500, newspaper="Nord Bayern")
+
+    text = metrics.to_prometheus()
+
+    assert "# TYPE news_summarizer_scrape_seconds histogram" in text
+    lines = lines_of(text, "news_summarizer_scrape_seconds")
+    labels = 'newspaper="Nord Bayern"'
+    buckets = {
+        x.split('le="')[1].split('"')[0]: int(x.rsplit(" ", 1)[1])
+        for x in lines
+        if x.startswith(f"news_summarizer_scrape_seconds_bucket{{{labels},")
+    }
+    # The bounds are inclusive and every bucket counts the smaller ones
+    assert buckets["0.01"] == 0
+    assert buckets["0.05"] == 1
+    assert buckets["0.5"] == 2
+    assert buckets["120"] == 2
+    assert buckets["+Inf"] == 3
+    assert len(buckets) == len(SPAN_BUCKETS) + 1
+    assert f"news_summarizer_scrape_seconds_sum{{{labels}}} 500.35" in lines
+    assert f"news_summarizer_scrape_seconds_count{{{labels}}} 3" in lines
+
+
+def test_counters_are_exported_by_labels():
+    metrics = Metrics()
+    metrics.increment("articles_saved", 3, newspaper="20 Minutos")
+    metrics.increment("articles_saved", 2, newspaper="20 Minutos")
+    metrics.increment("articles_saved", newspaper="Nord Bayern")
+    metrics.increment("telegram_retries")
+    metrics.increment("ignored", 0)
+
+    text = metrics.to_prometheus()
+
+    assert "# TYPE news_summarizer_articles_saved_total counter" in text
+    assert lines_of(text, "news_summarizer_articles_saved_total") == [
+        'news_summarizer_articles_saved_total{newspaper="20 Minutos"} 5',
+        'news_summarizer_articles_saved_total{newspaper="Nord Bayern"} 1',
+    ]
+    assert lines_of(text, "news_summarizer_telegram_retries_total") == [
+        "news_summarizer_telegram_retries_total 1"
+    ]
+    assert "ignored" not in text
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.increment("errors", newspaper='The "Daily"\\News\nToday')
+
+    assert lines_of(metrics.to_prometheus(), "news_summarizer_errors_total") == [
+        'news_summarizer_errors_total{newspaper="The \\"Daily\\"\\\\News\\nToday"} 1'
+    ]
+
+
+def test_labels_are_sorted_by_name():
+    metrics = Metrics()
+    metrics.increment("retries", reason=429, newspaper="Paper")
+
+    assert lines_of(metrics.to_prometheus(), "news_summarizer_retries_total") == [
+        'news_summarizer_retries_total{newspaper="Paper",reason="429"} 1'
+    ]
+
+
+def test_span_records_the_time_when_the_block_raises():
+    metrics = Metrics()
+
+    with pytest.raises(ValueError):
+        with metrics.span("classify", newspaper="Paper"):
+            time.sleep(0.01)
+            raise ValueError("The model failed")
+
+    spans = metrics.summary()["spans"]["classify"]
+    assert len(spans) == 1
+    assert spans[0]["labels"] == {"newspaper": "Paper"}
+    assert spans[0]["count"] == 1
+    assert spans[0]["total_seconds"] >= 0.01
+    assert 'news_summarizer_classify_seconds_count{newspaper="Paper"} 1' in (
+        metrics.to_prometheus()
+    )
+
+
+def test_summary_covers_the_current_run_and_prometheus_the_process():
+    metrics = Metrics()
+    metrics.observe("scrape", 1, newspaper="Paper")
+    metrics.increment("articles_saved", 4, newspaper="Paper")
+
+    metrics.start_run()
+    metrics.annotate_run(newspapers=["Paper"])
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        metrics.observe("scrape", seconds, newspaper="Paper")
+    metrics.increment("articles_saved", 2, newspaper="Paper")
+
+    summary = metrics.summary()
+
+    assert summary["newspapers"] == ["Paper"]
+    assert summary["duration_seconds"] >= 0
+    assert summary["spans"] == {
+        "scrape": [
+            {
+                "labels": {"newspaper": "Paper"},
+                "count": 4,
+                "total_seconds": 1.0,
+                "p50_seconds": 0.3,
+                "p95_seconds": 0.4,
+                "max_seconds": 0.4,
+            }
+        ]
+    }
+    assert summary["counters"] == {
+        "articles_saved": [{"labels": {"newspaper": "Paper"}, "value": 2}]
+    }
+    text = metrics.to_prometheus()
+    assert 'news_summarizer_scrape_seconds_count{newspaper="Paper"} 5' in text
+    assert 'news_summarizer_articles_saved_total{newspaper="Paper"} 6' in text
+
+
+def test_start_run_resets_the_summary():
+    metrics = Metrics()
+    metrics.annotate_run(newspapers=["Paper"])
+    metrics.observe("scrape", 1)
+    metrics.increment("articles_saved")
+
+    metrics.start_run()
+
+    summary = metrics.summary()
+    assert "newspapers" not in summary
+    assert summary["spans"] == {}
+    assert summary["counters"] == {}
+
+
+def test_export_writes_both_files(tmp_path):
+    metrics = Metrics()
+    metrics.observe("persist", 0.2, newspaper="Paper")
+    prometheus_path = tmp_path / "metrics" / "metrics.prom"
+    summary_path = tmp_path / "run_summary.json"
+
+    metrics.export(str(prometheus_path), str(summary_path))
+
+    assert prometheus_path.read_text(encoding="utf8") == metrics.to_prometheus()
+    summary = json.loads(summary_path.read_text(encoding="utf8"))
+    assert summary["spans"]["persist"][0]["count"] == 1
+    assert list(tmp_path.rglob("*.tmp")) == []
@@ -0,0 +1,55 @@
+from src.db.minhash import (
+    MINHASH_BANDS,
+    headline_minhashes,
+    headline_shingles,
+    minhash_bands,
+    minhash_similarity,
+)
+
+
+def jaccard(first: str, second: str) -> float:
+    a, b = headline_shingles(first), headline_shingles(second)
+    return len(a & b) / len(a | b)
+
+
+def test_punctuation_case_and_whitespace_do_not_change_the_signature():
+    first, second = headline_minhashes(
+        ["Der Club gewinnt das Derby!", "  der CLUB gewinnt, das Derby"]
+    )
+
+    assert minhash_similarity(first, second) == 1
+    assert minhash_bands(first) == minhash_bands(second)
+
+
+def test_similarity_estimates_the_jaccard_similarity_of_the_shingles():
+    pairs = [
+        (
+            "Feuerwehr löscht Großbrand in Fürth",
+            "Feuerwehr löscht Großbrand in Erlangen",
+        ),
+        ("Der Club gewinnt das Derby gegen Fürth", "Fürth verliert das Derby"),
+        ("Neuer Haushalt beschlossen", "Unwetterwarnung für Mittelfranken"),
+    ]
+
+    for first, second in pairs:
+        signatures = headline_minhashes([first, second])
+        estimate = minhash_similarity(*signatures)
+        assert abs(estimate - jaccard(first, second)) < 0.3
+
+
+def test_every_band_has_its_own_values():
+    signature = headline_minhashes(["Der Club gewinnt das Derby"])[0]
+
+    bands = minhash_bands(signature)
+
+    assert len(bands) == MINHASH_BANDS
+    assert len(set(bands)) == MINHASH_BANDS
+    assert all(-(1 << 63) <= x < (1 << 63) for x in bands)
+
+
+def test_signatures_of_a_batch_match_the_ones_of_single_headlines():
+    headlines = [f"Schlagzeile Nummer {i} des Tages" for i in range(50)]
+
+    batch = headline_minhashes(headlines)
+
+    assert batch == [headline_minhashes([x])[0] for x in headlines]
@@ -0,0 +1,54 @@
+import pytest
+
+from src.db.cache import NameIdCache
+from src.db.entity.newspaper import Newspaper
+from src.db.repository.category_repository import CategoryRepository
+from src.db.repository.newspaper_repository import NewspaperRepository
+
+
+def test_cache_counts_hits_and_misses():
+    cache = NameIdCache()
+    cache.set_many({"sport": 1})
+
+    assert cache.get("sport") == 1
+    assert cache.get("economy") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_warm_replaces_the_content_and_clear_forgets_it():
+    cache = NameIdCache()
+    cache.set_many({"old": 1})
+
+    cache.warm({"sport": 2})
+    assert cache.warmed
+    assert cache.get("old") is None and cache.get("sport") == 2
+
+    cache.clear()
+    assert not cache.warmed
+    assert cache.get("sport") is None
+
+
+def test_known_ids_are_read_from_the_cache(database):
+    categories = CategoryRepository(database)
+    ids = categories.get_or_create_ids(["sport", "economy"])
+
+    # Another repository of the same database shares the cache
+    other = CategoryRepository(database)
+    hits = other.cache.hits
+    assert other.get_or_create_ids(["sport", "economy"]) == ids
+    assert other.cache.hits == hits + 2
+
+
+def test_cache_is_cleared_when_a_transaction_is_rolled_back(database):
+    newspapers = NewspaperRepository(database)
+    newspaper = Newspaper(name="Paper", url="https://paper.example")
+
+    with pytest.raises(RuntimeError):
+        with database.transaction():
+            newspapers.get_or_create_id(newspaper)
+            raise RuntimeError("The save failed")
+
+    assert not newspapers.cache.warmed
+    # The id is inserted again instead of returning the rolled back one
+    newspaper_id = newspapers.get_or_create_id(newspaper)
+    assert newspapers.get(newspaper_id) is not None
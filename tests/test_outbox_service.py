@@ -0,0 +1,120 @@
+import time
+
+import pytest
+
+from src.db.database import Database
+from src.services.outbox_service import OutboxService
+from src.telegram.bot import TelegramBot
+from src.testing.fakes import PROXY_ERROR, FakeTelegramServer
+
+
+def outbox(db: Database, server: FakeTelegramServer, **kwargs) -> OutboxService:
+    bot = TelegramBot(
+        api_url=server.api_url,
+        messages_per_second=1000,
+        messages_per_chat_per_second=1000,
+        max_retries=0,
+    )
+    return OutboxService(db, bot, **kwargs)
+
+
+def enqueue(db: Database, service: OutboxService, messages: list[str]) -> None:
+    with db.transaction():
+        service.enqueue(messages)
+
+
+def test_messages_are_delivered_in_order_to_every_chat(telegram_env, database):
+    with FakeTelegramServer(0) as server:
+        service = outbox(database, server)
+        enqueue(database, service, ["first", "second"])
+        enqueue(database, service, ["third"])
+        service.drain()
+
+    assert server.messages == {
+        "100": ["first", "second", "third"],
+        "200": ["first", "second", "third"],
+    }
+    assert service.outbox_repository.count_by_status() == {"sent": 6}
+
+
+def test_failed_message_waits_for_its_backoff_and_keeps_the_order(
+    telegram_env, database
+):
+    with FakeTelegramServer(0, errors={"100": [500]}) as server:
+        service = outbox(database, server, base_backoff_seconds=0.3)
+        enqueue(database, service, ["first", "second"])
+        service.drain()
+
+        # The other chat is not delayed, the failed one waits with the rest behind
+        assert server.messages == {"200": ["first", "second"]}
+        failed = service.outbox_repository.get_all()[0]
+        assert failed.chat_id == "100" and failed.attempts == 1
+        assert failed.last_error is not None
+        assert failed.next_attempt_at == pytest.approx(time.time() + 0.3, abs=0.2)
+
+        service.drain()
+        assert "100" not in server.messages
+
+        time.sleep(0.35)
+        service.drain()
+
+    assert server.messages["100"] == ["first", "second"]
+    assert service.outbox_repository.count_by_status() == {"sent": 4}
+
+
+def test_backoff_doubles_until_the_message_is_given_up(telegram_env, database):
+    errors = {"100": [PROXY_ERROR] * 3}
+    with FakeTelegramServer(0, errors=errors) as server:
+        service = outbox(database, server, max_attempts=3, base_backoff_seconds=0.05)
+        enqueue(database, service, ["only"])
+
+        delays = []
+        for _ in range(3):
+            start = time.time()
+            service.drain()
+            message = service.outbox_repository.get_all()[0]
+            delays.append(message.next_attempt_at - start)
+            time.sleep(max(message.next_attempt_at - time.time(), 0) + 0.01)
+
+    assert delays[0] == pytest.approx(0.05, abs=0.04)
+    assert delays[1] == pytest.approx(0.1, abs=0.04)
+    assert message.status == "failed" and message.attempts == 3
+    assert server.messages == {"200": ["only"]}
+
+
+def test_unexpected_exceptions_are_recorded_as_failed_attempts(
+    telegram_env, database, monkeypatch
+):
+    with FakeTelegramServer(0) as server:
+        service = outbox(database, server, base_backoff_seconds=60)
+
+        def fail(chat_id: str, message: str) -> str | None:
+            raise ValueError("unexpected")
+
+        monkeypatch.setattr(service.telegram_bot, "send_message", fail)
+        enqueue(database, service, ["first"])
+        service.drain()
+
+    messages = service.outbox_repository.get_all()
+    assert all(x.status == "pending" and x.attempts == 1 for x in messages)
+    assert all("unexpected" in x.last_error for x in messages)
+    assert all(x.next_attempt_at > time.time() + 50 for x in messages)
+
+
+def test_drain_with_a_timeout_leaves_the_rest_pending(telegram_env, database):
+    with FakeTelegramServer(0.05) as server:
+        service = outbox(database, server)
+        messages = [f"message {i}" for i in range(20)]
+        enqueue(database, service, messages)
+
+        start = time.monotonic()
+        service.stop(drain=True, drain_timeout_seconds=0.2)
+        elapsed = time.monotonic() - start
+
+        pending = service.outbox_repository.count_by_status()["pending"]
+        assert elapsed < 0.5
+        assert 0 < pending < 40
+
+        service.drain()
+
+    assert server.messages == {"100": messages, "200": messages}
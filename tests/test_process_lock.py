@@ -0,0 +1,20 @@
+import pytest
+
+from src.utils.process_lock import LockHeldError, process_lock
+
+
+def test_second_holder_of_the_lock_is_rejected(tmp_path):
+    path = str(tmp_path / "run.lock")
+    with process_lock(path):
+        with pytest.raises(LockHeldError):
+            with process_lock(path):
+                pass
+
+
+def test_lock_is_released_on_exit(tmp_path):
+    path = str(tmp_path / "run.lock")
+    with process_lock(path):
+        pass
+
+    with process_lock(path):
+        pass
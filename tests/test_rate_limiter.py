@@ -0,0 +1,193 @@
+import json
+import threading
+import time
+
+import pytest
+
+from src.ai.batcher import TokenBudgetBatcher
+from src.ai.provider.base import ModelResponse, RateLimitError
+from src.services.ai_service import AiService
+from src.utils.rate_limiter import RateLimiter, TokenBucket
+
+
+class FakeClock:
+    """
+    Time that only advances when somebody sleeps
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_full_bucket_does_not_wait(clock):
+    bucket = TokenBucket(10, 1, clock, clock.sleep)
+
+    waited = [bucket.acquire(5), bucket.acquire(5)]
+
+    assert waited == [0, 0]
+    assert clock.now == 0
+
+
+def test_drained_bucket_waits_for_the_refill(clock):
+    bucket = TokenBucket(10, 2, clock, clock.sleep)
+    bucket.acquire(10)
+
+    waited = bucket.acquire(4)
+
+    assert waited == pytest.approx(2)
+    assert clock.now == pytest.approx(2)
+    # The refilled tokens were taken
+    assert bucket.acquire(1) == pytest.approx(0.5)
+
+
+def test_bucket_refills_up_to_its_capacity(clock):
+    bucket = TokenBucket(10, 1, clock, clock.sleep)
+    bucket.acquire(10)
+    clock.now += 100
+
+    bucket.acquire(10)
+
+    assert bucket.acquire(1) == pytest.approx(1)
+
+
+def test_cost_larger_than_the_capacity_waits_for_a_full_bucket(clock):
+    bucket = TokenBucket(10, 1, clock, clock.sleep)
+    bucket.acquire(3)
+
+    waited = bucket.acquire(1000)
+
+    assert waited == pytest.approx(3)
+    assert len(clock.sleeps) < 5
+
+
+def test_adjust_corrects_the_tokens_with_the_real_cost(clock):
+    bucket = TokenBucket(10, 1, clock, clock.sleep)
+    bucket.acquire(8)
+
+    # The operation used 4 tokens less than estimated
+    bucket.adjust(-4)
+
+    assert bucket.acquire(6) == 0
+    bucket.adjust(5)
+    assert bucket.acquire(1) == pytest.approx(6)
+
+
+def test_limiter_enforces_requests_and_tokens_per_minute(clock):
+    limiter = RateLimiter(2, 600, clock, clock.sleep)
+
+    assert limiter.acquire(100) == 0
+    assert limiter.acquire(100) == 0
+    # The third request waits for the request bucket
+    assert limiter.acquire(100) == pytest.approx(30)
+
+    # 300 tokens left after the refill, 500 have to be waited for
+    assert limiter.acquire(800) == pytest.approx(30)
+    assert clock.now == pytest.approx(60)
+
+
+def test_record_usage_returns_the_tokens_that_were_not_used(clock):
+    limiter = RateLimiter(None, 600, clock, clock.sleep)
+    limiter.acquire(600)
+
+    limiter.record_usage(estimated_tokens=600, used_tokens=100)
+
+    assert limiter.acquire(500) == 0
+
+
+def test_pause_blocks_every_caller_until_it_ends(clock):
+    limiter = RateLimiter(60, 6000, clock, clock.sleep)
+    limiter.acquire(10)
+
+    limiter.pause(5)
+
+    waited = [limiter.acquire(10), limiter.acquire(10), limiter.acquire(0)]
+    assert waited[0] == pytest.approx(5)
+    assert waited[1:] == [0, 0]
+    assert clock.now == pytest.approx(5)
+
+
+def test_pause_without_limits_sleeps(clock):
+    limiter = RateLimiter(None, None, clock, clock.sleep)
+
+    limiter.pause(3)
+
+    assert clock.sleeps == [3]
+
+
+def test_pause_blocks_the_threads_waiting_for_tokens():
+    limiter = RateLimiter(6000)
+    limiter.pause(0.3)
+    returned_after: list[float] = []
+    start = time.monotonic()
+
+    def call() -> None:
+        limiter.acquire()
+        returned_after.append(time.monotonic() - start)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(returned_after) == 4
+    assert min(returned_after) >= 0.3
+
+
+class SlowModel:
+    """
+    Model answering the first batches last, rejecting the first request with a
+    429
+    """
+
+    def __init__(self):
+        self.used_tokens = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, system_prompt=None, **kwargs) -> ModelResponse:
+        with self._lock:
+            self.requests += 1
+            if self.requests == 1:
+                raise RateLimitError("Too many requests", retry_after=0.05)
+
+        index = int(prompt.split()[-1])
+        time.sleep(0.02 * (10 - index))
+        news = [
+            {
+                "title": prompt,
+                "description": f"Description {index}",
+                "category": "sport",
+                "english_translation": prompt,
+            }
+        ]
+        return ModelResponse(json.dumps({"news": news}), None)
+
+
+def test_concurrent_batches_are_yielded_in_the_order_of_the_input():
+    headlines = [f"Headline {i}" for i in range(10)]
+    model = SlowModel()
+    service = AiService(
+        model,
+        max_concurrency=5,
+        rate_limiter=RateLimiter(6000, 10**9),
+        batcher=TokenBudgetBatcher(max_batch_size=1),
+    )
+
+    batches = list(service.classify_news_stream(headlines))
+
+    assert [x.title for batch in batches for x in batch] == headlines
+    assert model.requests == len(headlines) + 1
@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+
+import pytest
+
+from src.domain.newspaper import Newspaper
+from src.scraper.custom.twenty_minutes import TWENTY_MINUTES_HEADLINES
+from src.scraper.resource_filter import ResourceFilter
+
+
+@dataclass
+class FakeRequest:
+    url: str
+    resource_type: str
+
+
+class FakeRoute:
+    """
+    Route of playwright recording if the request was aborted or continued
+    """
+
+    def __init__(self, url: str, resource_type: str):
+        self.request = FakeRequest(url, resource_type)
+        self.action: str | None = None
+
+    def abort(self) -> None:
+        self.action = "abort"
+
+    def continue_(self) -> None:
+        self.action = "continue"
+
+
+@pytest.mark.parametrize(
+    "url, resource_type, blocked",
+    [
+        ("https://www.nordbayern.de/", "document", False),
+        ("https://www.nordbayern.de/app.js", "script", False),
+        ("https://www.nordbayern.de/logo.png", "image", True),
+        ("https://www.nordbayern.de/font.woff2", "font", True),
+        ("https://www.nordbayern.de/video.mp4", "media", True),
+        ("https://www.nordbayern.de/main.css", "stylesheet", False),
+        ("https://doubleclick.net/ad.js", "script", True),
+        ("https://securepubads.g.doubleclick.net/tag.js", "script", True),
+        ("https://STATS.DOUBLECLICK.NET/ping", "xhr", True),
+        # Ends with a blocked host but is not one of its subdomains
+        ("https://notdoubleclick.net/app.js", "script", False),
+        ("https://doubleclick.net.example.com/app.js", "script", False),
+        ("https://consent.nordbayern.de/cmp.js", "script", False),
+        ("not a url", "other", False),
+    ],
+)
+def test_requests_are_classified(url, resource_type, blocked):
+    resource_filter = ResourceFilter()
+
+    assert resource_filter.is_blocked(url, resource_type) is blocked
+
+
+def test_allowed_hosts_are_never_blocked_by_host():
+    resource_filter = ResourceFilter(
+        blocked_hosts=["cmp.example.com", "example.com"],
+        allowed_hosts=["cmp.example.com"],
+    )
+
+    assert not resource_filter.is_blocked("https://cmp.example.com/ui.js", "script")
+    assert not resource_filter.is_blocked("https://a.cmp.example.com/x.js", "script")
+    assert resource_filter.is_blocked("https://ads.example.com/ad.js", "script")
+    # The resource types are blocked even for the allowed hosts
+    assert resource_filter.is_blocked("https://cmp.example.com/logo.png", "image")
+
+
+def test_newspaper_overrides_are_applied():
+    newspaper = Newspaper(
+        name="Paper",
+        url="https://paper.example.com",
+        extraction=TWENTY_MINUTES_HEADLINES,
+        blocked_resource_types=["stylesheet"],
+        blocked_hosts=["tracker.example.com"],
+        allowed_hosts=["googletagmanager.com"],
+    )
+    resource_filter = ResourceFilter.for_newspaper(newspaper)
+
+    assert resource_filter.is_blocked("https://paper.example.com/a.css", "stylesheet")
+    assert not resource_filter.is_blocked("https://paper.example.com/a.png", "image")
+    assert resource_filter.is_blocked("https://tracker.example.com/t.js", "script")
+    assert resource_filter.is_blocked("https://criteo.com/t.js", "script")
+    assert not resource_filter.is_blocked(
+        "https://www.googletagmanager.com/gtm.js", "script"
+    )
+
+
+def test_route_handler_aborts_and_counts_the_blocked_requests():
+    resource_filter = ResourceFilter()
+    routes = [
+        FakeRoute("https://www.nordbayern.de/", "document"),
+        FakeRoute("https://www.nordbayern.de/logo.png", "image"),
+        FakeRoute("https://www.nordbayern.de/photo.jpg", "image"),
+        FakeRoute("https://ib.adnxs.com/bid", "xhr"),
+    ]
+
+    for route in routes:
+        resource_filter.handle_route(route)  # type: ignore[arg-type]
+
+    assert [x.action for x in routes] == ["continue", "abort", "abort", "abort"]
+    assert resource_filter.blocked_requests == 3
+    assert resource_filter.allowed_requests == 1
+    assert resource_filter.blocked_by_type == {"image": 2, "xhr": 1}
+
+    resource_filter.reset_stats()
+
+    assert resource_filter.blocked_requests == 0
+    assert resource_filter.blocked_by_type == {}
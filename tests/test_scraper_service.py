@@ -0,0 +1,193 @@
+import json
+
+import pytest
+
+import src.services.concurrent_scraper_service as concurrent_scraper_service
+from src.domain.newspaper import Newspaper
+from src.scraper.custom.twenty_minutes import TWENTY_MINUTES_HEADLINES
+from src.services.concurrent_scraper_service import (
+    ConcurrentScraperService,
+    _ScraperWorker,
+)
+from src.services.scraper_service import BrowserPool, ScraperService
+
+
+class FakePage:
+    """
+    Page of the fake browser, reporting a configurable JS heap
+    """
+
+    def __init__(self, memory_bytes: int | None):
+        self.memory_bytes = memory_bytes
+        self.urls: list[str] = []
+        self.closed = False
+
+    def goto(self, url: str, wait_until: str) -> None:
+        self.urls.append(url)
+
+    def evaluate(self, script: str):
+        return self.memory_bytes
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class FakeContext:
+    """
+    Context of the fake browser, storing the state as playwright does
+    """
+
+    def __init__(self, memory_bytes: int | None, **kwargs):
+        self.kwargs = kwargs
+        self.memory_bytes = memory_bytes
+        self.pages: list[FakePage] = []
+        self.cookies = [{"name": "consent", "value": "yes"}]
+
+    def set_default_timeout(self, timeout: float) -> None:
+        pass
+
+    def route(self, pattern: str, handler) -> None:
+        pass
+
+    def new_page(self) -> FakePage:
+        self.pages.append(FakePage(self.memory_bytes))
+        return self.pages[-1]
+
+    def storage_state(self, path) -> None:
+        path.write_text(json.dumps({"cookies": self.cookies}), encoding="utf8")
+
+    def close(self) -> None:
+        pass
+
+
+class FakeBrowserPool(BrowserPool):
+    """
+    Pool handing out fake contexts, Chromium is not needed by the tests
+    """
+
+    def __init__(self, memory_bytes: int | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.memory_bytes = memory_bytes
+        self.contexts: list[FakeContext] = []
+
+    def new_context(self, **kwargs) -> FakeContext:  # type: ignore[override]
+        self.contexts.append(FakeContext(self.memory_bytes, **kwargs))
+        return self.contexts[-1]
+
+    def close_context(self, context) -> None:
+        context.close()
+
+
+def newspaper(name: str = "Paper") -> Newspaper:
+    return Newspaper(
+        name=name, url="https://example.com", extraction=TWENTY_MINUTES_HEADLINES
+    )
+
+
+@pytest.mark.parametrize(
+    "navigations, memory_mb, expected",
+    [
+        (0, None, False),
+        (2, None, False),
+        (3, None, True),
+        (4, None, True),
+        (1, 99.0, False),
+        (1, 100.0, True),
+        # A new page is never measured
+        (0, 1000.0, False),
+    ],
+)
+def test_pages_are_recycled_by_navigations_and_memory(navigations, memory_mb, expected):
+    pool = BrowserPool(max_navigations_per_page=3, max_page_memory_mb=100)
+
+    assert pool.should_recycle_page(navigations, lambda: memory_mb) is expected
+
+
+def test_memory_is_not_measured_when_the_navigations_decide():
+    pool = BrowserPool(max_navigations_per_page=3, max_page_memory_mb=100)
+
+    def get_memory_mb() -> float:
+        raise AssertionError("The memory should not be measured")
+
+    assert pool.should_recycle_page(3, get_memory_mb)
+
+
+def test_limits_can_be_disabled():
+    pool = BrowserPool(max_navigations_per_page=None, max_page_memory_mb=None)
+
+    assert not pool.should_recycle_page(1000, lambda: 10000.0)
+
+
+def test_page_is_replaced_after_the_maximum_navigations():
+    pool = FakeBrowserPool(max_navigations_per_page=2, max_page_memory_mb=None)
+    scraper = ScraperService(pool)
+
+    for i in range(5):
+        scraper.access_page(f"https://example.com/{i}")
+
+    pages = pool.contexts[0].pages
+    assert len(pool.contexts) == 1
+    assert [x.urls for x in pages] == [
+        ["https://example.com/0", "https://example.com/1"],
+        ["https://example.com/2", "https://example.com/3"],
+        ["https://example.com/4"],
+    ]
+    assert [x.closed for x in pages] == [True, True, False]
+
+
+def test_page_is_replaced_when_its_heap_is_too_large():
+    pool = FakeBrowserPool(
+        memory_bytes=200 * 1024 * 1024,
+        max_navigations_per_page=None,
+        max_page_memory_mb=100,
+    )
+    scraper = ScraperService(pool)
+
+    scraper.access_page("https://example.com/0")
+    scraper.access_page("https://example.com/1")
+
+    assert [x.urls for x in pool.contexts[0].pages] == [
+        ["https://example.com/0"],
+        ["https://example.com/1"],
+    ]
+
+
+def test_storage_state_is_saved_and_restored(tmp_path):
+    path = tmp_path / "state" / "paper.json"
+    pool = FakeBrowserPool()
+
+    first = ScraperService(pool, storage_state_path=path)
+    assert "storage_state" not in pool.contexts[0].kwargs
+    first.save_storage_state()
+    first.close()
+
+    ScraperService(pool, storage_state_path=path)
+
+    assert json.loads(path.read_text(encoding="utf8"))["cookies"][0]["name"] == (
+        "consent"
+    )
+    assert pool.contexts[1].kwargs == {"storage_state": path}
+
+
+def test_the_context_of_a_newspaper_is_kept_between_runs(monkeypatch):
+    opened: list[str] = []
+
+    class FakeScraper:
+        """
+        Browser scraper of the workers, counting the contexts that are opened
+        """
+
+        def __init__(self, browser_pool, **kwargs):
+            opened.append("context")
+
+    monkeypatch.setattr(concurrent_scraper_service, "ScraperService", FakeScraper)
+    service = ConcurrentScraperService(max_concurrency=1, block_resources=False)
+    worker = _ScraperWorker(service._tasks, service)
+
+    first = worker._get_scraper(newspaper())
+    second = worker._get_scraper(newspaper())
+    other = worker._get_scraper(newspaper("Other"))
+
+    assert first is second
+    assert other is not first
+    assert len(opened) == 2
@@ -0,0 +1,158 @@
+from pathlib import Path
+
+import pytest
+
+import src.services.concurrent_scraper_service as concurrent_scraper_service
+from src.domain.newspaper import Newspaper
+from src.scraper.custom.nord_bayern import NORD_BAYERN_HEADLINES
+from src.scraper.custom.twenty_minutes import TWENTY_MINUTES_HEADLINES
+from src.services.concurrent_scraper_service import ConcurrentScraperService
+from src.services.static_scraper_service import StaticScraperService
+from src.testing.fakes import NewspaperSiteServer
+
+NORD_BAYERN_PAGE = """
+<html><body>
+<h2 class="teaser__headline">Neue Brücke in Fürth   eröffnet</h2>
+<h5 class="headline">Club gewinnt in Nürnberg</h5>
+<div><p>anzeige</p><h5 class="headline">Sponsored content</h5><p>anzeige</p></div>
+<h6 class="headline small">Wetter: Sonne am Wochenende</h6>
+<h3 class="headline">Not a headline level</h3>
+<h2 class="teaser__headline">Neue Brücke in Fürth eröffnet</h2>
+</body></html>
+"""
+TWENTY_MINUTES_PAGE = """
+<html><body>
+<h1><a href="https://www.20minutos.es/noticia/1">Llega el calor a Madrid</a></h1>
+<h1><a href="https://otro.es/noticia/2">Enlace de otro sitio</a></h1>
+<h1><a href="/noticia/3">Enlace relativo</a></h1>
+</body></html>
+"""
+# Page rendered with JavaScript, the headlines are not in the html
+EMPTY_PAGE = "<html><body><div id='app'></div></body></html>"
+
+
+@pytest.fixture(scope="module")
+def site(tmp_path_factory):
+    folder: Path = tmp_path_factory.mktemp("pages")
+    (folder / "nord_bayern.html").write_text(NORD_BAYERN_PAGE, encoding="utf8")
+    (folder / "twenty_minutes.html").write_text(TWENTY_MINUTES_PAGE, encoding="utf8")
+    (folder / "empty.html").write_text(EMPTY_PAGE, encoding="utf8")
+    (folder / "latin.html").write_text(
+        '<html><head><meta charset="iso-8859-1"></head>'
+        + TWENTY_MINUTES_PAGE.replace("calor", "calor a Cádiz"),
+        encoding="latin-1",
+    )
+    with NewspaperSiteServer(str(folder)) as server:
+        yield server
+
+
+def newspaper(name: str, url: str, extraction=TWENTY_MINUTES_HEADLINES) -> Newspaper:
+    return Newspaper(
+        name=name,
+        url=url,
+        extraction=extraction,
+        static_mode=True,
+        persist_storage_state=False,
+    )
+
+
+class FakeBrowserScraper:
+    """
+    Browser scraper of the workers, Chromium is not needed by the tests
+    """
+
+    newspapers: list[str] = []
+
+    def __init__(self, browser_pool, **kwargs):
+        pass
+
+    def extract_news(self, newspaper: Newspaper) -> list[str]:
+        FakeBrowserScraper.newspapers.append(newspaper.name)
+        return ["Headline rendered by the browser"]
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def browser(monkeypatch):
+    FakeBrowserScraper.newspapers = []
+    monkeypatch.setattr(
+        concurrent_scraper_service, "ScraperService", FakeBrowserScraper
+    )
+    return FakeBrowserScraper
+
+
+def test_extracts_the_headlines_with_the_specs_of_the_newspapers(site):
+    service = StaticScraperService()
+    try:
+        nord_bayern = service.extract_news(
+            newspaper(
+                "Nord Bayern", site.url + "/nord_bayern.html", NORD_BAYERN_HEADLINES
+            )
+        )
+        twenty_minutes = service.extract_news(
+            newspaper("20 Minutos", site.url + "/twenty_minutes.html")
+        )
+    finally:
+        service.close()
+
+    assert nord_bayern == [
+        "Neue Brücke in Fürth eröffnet",
+        "Club gewinnt in Nürnberg",
+        "Wetter: Sonne am Wochenende",
+    ]
+    assert twenty_minutes == ["Llega el calor a Madrid"]
+
+
+def test_pages_are_decoded_with_their_charset(site):
+    service = StaticScraperService()
+    try:
+        result = service.extract_news(newspaper("Paper", site.url + "/latin.html"))
+    finally:
+        service.close()
+
+    assert result == ["Llega el calor a Cádiz a Madrid"]
+
+
+@pytest.mark.parametrize("page", ["empty.html", "missing.html"])
+def test_returns_none_when_nothing_is_found(site, page):
+    service = StaticScraperService()
+    try:
+        assert service.extract_news(newspaper("Paper", f"{site.url}/{page}")) is None
+    finally:
+        service.close()
+
+
+def test_falls_back_to_the_browser_only_when_nothing_is_found(site, browser):
+    newspapers = [
+        newspaper("Static", site.url + "/twenty_minutes.html"),
+        newspaper("Rendered", site.url + "/empty.html"),
+        newspaper("Offline", site.url + "/missing.html"),
+    ]
+    service = ConcurrentScraperService(max_concurrency=2, block_resources=False)
+    try:
+        results = service.scrape(newspapers)
+    finally:
+        service.close()
+
+    assert results == {
+        "Static": ["Llega el calor a Madrid"],
+        "Rendered": ["Headline rendered by the browser"],
+        "Offline": ["Headline rendered by the browser"],
+    }
+    assert sorted(browser.newspapers) == ["Offline", "Rendered"]
+
+
+def test_newspapers_without_static_mode_use_the_browser(site, browser):
+    paper = newspaper("Static", site.url + "/twenty_minutes.html").model_copy(
+        update={"static_mode": False}
+    )
+    service = ConcurrentScraperService(max_concurrency=1, block_resources=False)
+    try:
+        results = service.scrape([paper])
+    finally:
+        service.close()
+
+    assert results == {"Static": ["Headline rendered by the browser"]}
+    assert browser.newspapers == ["Static"]
@@ -0,0 +1,88 @@
+import pytest
+import telebot
+
+from src.telegram.bot import TelegramBot
+from src.testing.fakes import PROXY_ERROR, FakeTelegramServer
+
+
+def send(
+    errors: list, max_retries: int = 3
+) -> tuple[str | None, dict, FakeTelegramServer]:
+    with FakeTelegramServer(0, errors={"100": errors}) as server:
+        bot = TelegramBot(
+            api_url=server.api_url,
+            messages_per_second=1000,
+            messages_per_chat_per_second=1000,
+            max_retries=max_retries,
+        )
+        error = bot.send_message("100", "Hello")
+    return error, bot.get_stats(), server
+
+
+@pytest.mark.parametrize("failure", [429, 500, 503, PROXY_ERROR])
+def test_transient_errors_are_retried(telegram_env, failure):
+    error, stats, server = send([failure, failure])
+
+    assert error is None
+    assert server.messages == {"100": ["Hello"]}
+    assert server.requests == 3
+    assert stats["sent"] == 1
+    assert stats["retries"] == 2
+
+
+@pytest.mark.parametrize("failure", [400, 403])
+def test_client_errors_are_not_retried(telegram_env, failure):
+    error, stats, server = send([failure])
+
+    assert error is not None
+    assert server.requests == 1
+    assert server.messages == {}
+    assert stats["failed"] == 1
+
+
+def test_error_is_returned_when_the_retries_are_exhausted(telegram_env):
+    error, stats, server = send([PROXY_ERROR] * 3, max_retries=2)
+
+    assert error is not None and "502" in error
+    assert server.requests == 3
+    assert stats["failed"] == 1
+
+
+def test_broadcast_keeps_the_order_of_every_chat(telegram_env):
+    with FakeTelegramServer(0, errors={"200": [429]}) as server:
+        bot = TelegramBot(
+            api_url=server.api_url,
+            messages_per_second=1000,
+            messages_per_chat_per_second=1000,
+        )
+        bot.broadcast_messages(["first", "second", "third"])
+
+    assert server.messages == {
+        "100": ["first", "second", "third"],
+        "200": ["first", "second", "third"],
+    }
+
+
+def test_bots_with_different_urls_send_to_their_own_server(telegram_env):
+    with FakeTelegramServer(0) as first, FakeTelegramServer(0) as second:
+        bots = [
+            TelegramBot(
+                api_url=x.api_url,
+                messages_per_second=1000,
+                messages_per_chat_per_second=1000,
+            )
+            for x in (first, second)
+        ]
+        bots[0].send_message("100", "To the first")
+        bots[1].send_message("100", "To the second")
+        bots[0].send_message("100", "Again to the first")
+
+    assert first.messages == {"100": ["To the first", "Again to the first"]}
+    assert second.messages == {"100": ["To the second"]}
+
+
+def test_the_global_configuration_of_telebot_is_not_changed(telegram_env):
+    with FakeTelegramServer(0) as server:
+        TelegramBot(api_url=server.api_url).send_message("100", "Hello")
+
+    assert telebot.apihelper.API_URL is None